@@ -10,7 +10,12 @@ class AccountsConfig(AppConfig):
     name = 'muckrock.accounts'
 
     def ready(self):
-        """Registers users with the activity streams plugin"""
+        """
+        Registers users with the activity streams plugin, and connects the
+        live counter signals
+        """
         from actstream import registry
         registry.register(apps.get_model('auth.User'))
         registry.register(self.get_model('Profile'))
+        # pylint: disable=unused-variable
+        import muckrock.accounts.signals
@@ -0,0 +1,227 @@
+"""
+Live counters of activity on the site
+
+The nightly statistics are a day old and take a full recount to produce.
+Counters are updated as things happen instead, by the signal handlers in
+muckrock.accounts.signals, once the transaction making the change commits.
+Waiting for the commit keeps long transactions, such as submitting a multi
+request, from holding the lock on a busy counter row until they finish.
+There are two kinds of metric:
+
+* levels, such as requests by status, where each day's row holds the change
+  on that day, and the current value is the sum over all days
+* flows, such as communications sent, where each day's row holds that
+  day's total
+
+Changes which do not send signals, such as bulk updates, are not counted, and
+an increment is lost if the process dies between the commit and applying
+it, so a nightly job recounts from the source tables and corrects any drift.
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+from datetime import date, timedelta
+import logging
+
+from muckrock.accounts.models import Counter
+from muckrock.communication.models import (
+        EmailCommunication,
+        FaxCommunication,
+        MailCommunication,
+        )
+from muckrock.crowdfund.models import CrowdfundPayment
+from muckrock.foia.models import FOIARequest, FOIACommunication
+from muckrock.models import count_if
+from muckrock.task.models import Task
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ['requests', 'tasks', 'unresolved_tasks']
+FLOWS = ['communications', 'sent_communications', 'crowdfund_payments']
+
+
+def increment(metric, dimension='', value=1, day=None):
+    """Add to a counter once the current transaction commits"""
+    if day is None:
+        day = date.today()
+    transaction.on_commit(
+            lambda: apply_increment(metric, dimension, value, day))
+
+
+def apply_increment(metric, dimension, value, day):
+    """Add to a counter straight away"""
+    counter = Counter.objects.filter(
+            metric=metric, dimension=dimension, date=day)
+    if counter.update(value=F('value') + value):
+        return
+    try:
+        with transaction.atomic():
+            Counter.objects.create(
+                    metric=metric, dimension=dimension, date=day, value=value)
+    except IntegrityError:
+        # another transaction created it first
+        counter.update(value=F('value') + value)
+
+
+def get_levels(metric):
+    """The current value of a level, by dimension"""
+    return dict(Counter.objects
+            .filter(metric=metric)
+            .order_by()
+            .values_list('dimension')
+            .annotate(Sum('value')))
+
+
+def get_totals(metric, start, end=None):
+    """The total of a flow from the start day up to the end day, by dimension"""
+    counters = Counter.objects.filter(metric=metric, date__gte=start)
+    if end is not None:
+        counters = counters.filter(date__lt=end)
+    return dict(counters
+            .order_by()
+            .values_list('dimension')
+            .annotate(Sum('value')))
+
+
+def task_type(task):
+    """The dimension a task is counted under"""
+    return task._meta.model_name
+
+
+def task_models():
+    """All of the kinds of task"""
+    return [
+            model for model in apps.get_app_config('task').get_models()
+            if issubclass(model, Task)
+            and model is not Task
+            and not model._meta.proxy
+            ]
+
+
+def count_levels():
+    """Count the current value of each level from the source tables"""
+    tasks = {}
+    for model in task_models():
+        name = model._meta.model_name
+        tasks[name] = count_if(**{'%s__isnull' % name: False})
+        tasks['unresolved:%s' % name] = count_if(
+                resolved=False, **{'%s__isnull' % name: False})
+    task_counts = Task.objects.aggregate(**tasks)
+    return {
+            'requests': dict(FOIARequest.objects
+                .order_by()
+                .values_list('status')
+                .annotate(Count('pk'))),
+            'tasks': {
+                name: count for name, count in task_counts.iteritems()
+                if not name.startswith('unresolved:')
+                },
+            'unresolved_tasks': {
+                name.split(':', 1)[1]: count
+                for name, count in task_counts.iteritems()
+                if name.startswith('unresolved:')
+                },
+            }
+
+
+def count_flows(start):
+    """Count each flow by dimension and day since the start day"""
+    flows = {
+            'communications': {
+                ('received' if response else 'sent', day): count
+                for day, response, count in FOIACommunication.objects
+                .filter(date__gte=start)
+                .annotate(day=TruncDate('date'))
+                .order_by()
+                .values_list('day', 'response')
+                .annotate(Count('pk'))
+                },
+            'sent_communications': {},
+            'crowdfund_payments': {
+                (kind, day): count
+                for day, kind, count in CrowdfundPayment.objects
+                .filter(date__gte=start)
+                .annotate(
+                    day=TruncDate('date'),
+                    kind=Case(
+                        When(user=None, then=Value('loggedout')),
+                        default=Value('loggedin'),
+                        output_field=CharField(),
+                        ))
+                .order_by()
+                .values_list('day', 'kind')
+                .annotate(Count('pk'))
+                },
+            }
+    for name, model in [
+            ('email', EmailCommunication),
+            ('fax', FaxCommunication),
+            ('mail', MailCommunication)]:
+        for day, count in (model.objects
+                .filter(
+                    communication__date__gte=start,
+                    communication__response=False,
+                    )
+                .annotate(day=TruncDate('communication__date'))
+                .order_by()
+                .values_list('day')
+                .annotate(Count('pk'))):
+            flows['sent_communications'][(name, day)] = count
+    return flows
+
+
+def correct(metric, actual, counted):
+    """Correct any drift between the counters and the source, by dimension"""
+    corrections = 0
+    for key in set(actual) | set(counted):
+        drift = actual.get(key, 0) - counted.get(key, 0)
+        if not drift:
+            continue
+        if isinstance(key, tuple):
+            dimension, day = key
+        else:
+            dimension, day = key, None
+        logger.warning('Counter %s %s on %s drifted by %d',
+                metric, dimension, day or 'today', drift)
+        increment(metric, dimension, drift, day)
+        corrections += 1
+    return corrections
+
+
+def reconcile(days=None):
+    """
+    Recount every level, and the flows over the last few days, correcting
+    the counters to match.  Returns the number of corrections made.
+    """
+    if days is None:
+        days = settings.COUNTER_RECONCILE_DAYS
+    start = date.today() - timedelta(days)
+    corrections = 0
+    # changes made while recounting may show up as drift, which will be
+    # corrected back on the next run
+    with transaction.atomic():
+        for metric, actual in count_levels().iteritems():
+            corrections += correct(metric, actual, get_levels(metric))
+        for metric, actual in count_flows(start).iteritems():
+            counted = {
+                    (dimension, day): value
+                    for dimension, day, value in Counter.objects
+                    .filter(metric=metric, date__gte=start)
+                    .values_list('dimension', 'date', 'value')
+                    }
+            corrections += correct(metric, actual, counted)
+    logger.info('Reconciled counters, %d corrections', corrections)
+    return corrections
+
+
+def live_stats():
+    """The current levels and today's flows"""
+    stats = {metric: get_levels(metric) for metric in LEVELS}
+    today = date.today()
+    for metric in FLOWS:
+        stats['%s_today' % metric] = get_totals(metric, today)
+    return stats
@@ -627,3 +627,22 @@ class Statistics(models.Model):
         # pylint: disable=too-few-public-methods
         ordering = ['-date']
         verbose_name_plural = 'statistics'
+
+
+class Counter(models.Model):
+    """
+    A live count of something on the site, kept up to date as it changes.
+    Each row holds the change to a metric, broken down by a dimension
+    (a status, task type, delivery method...), on one day.
+    """
+    metric = models.CharField(max_length=40)
+    dimension = models.CharField(max_length=40, blank=True)
+    date = models.DateField()
+    value = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return u'%s %s on %s: %d' % (
+                self.metric, self.dimension, self.date, self.value)
+
+    class Meta:
+        unique_together = ('metric', 'dimension', 'date')
@@ -0,0 +1,162 @@
+"""Signal handlers which keep the live counters up to date"""
+
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from muckrock.accounts.counters import increment, task_models, task_type
+from muckrock.communication.models import (
+        EmailCommunication,
+        FaxCommunication,
+        MailCommunication,
+        )
+from muckrock.crowdfund.models import CrowdfundPayment
+from muckrock.foia.models import FOIARequest, FOIACommunication
+
+# pylint: disable=unused-argument
+
+DELIVERY_TYPES = {
+        EmailCommunication: 'email',
+        FaxCommunication: 'fax',
+        MailCommunication: 'mail',
+        }
+
+
+def saved_value(sender, instance, field):
+    """The value of a field as it is in the database, before this save"""
+    if instance.pk is None:
+        return None
+    return (sender.objects
+            .filter(pk=instance.pk)
+            .values_list(field, flat=True)
+            .first())
+
+
+def count_status(sender, instance, created, raw=False, **kwargs):
+    """Move a request from its old status's count to its new one"""
+    if raw:
+        return
+    saved_request = getattr(instance, 'saved_request', None)
+    old_status = saved_request.status if saved_request is not None else None
+    if old_status == instance.status:
+        return
+    if old_status is not None:
+        increment('requests', old_status, -1)
+    increment('requests', instance.status)
+
+
+def uncount_request(sender, instance, **kwargs):
+    """Remove a deleted request from its status's count"""
+    increment('requests', instance.status, -1)
+
+
+def track_resolved(sender, instance, raw=False, **kwargs):
+    """Remember whether a task was resolved before it is saved"""
+    if not raw:
+        instance._saved_resolved = saved_value(sender, instance, 'resolved')
+
+
+def count_task(sender, instance, created, raw=False, **kwargs):
+    """Count new tasks, and tasks being resolved or unresolved"""
+    if raw:
+        return
+    name = task_type(instance)
+    if created:
+        increment('tasks', name)
+        if not instance.resolved:
+            increment('unresolved_tasks', name)
+    elif getattr(instance, '_saved_resolved', None) is not None:
+        if instance._saved_resolved != instance.resolved:
+            increment('unresolved_tasks', name, -1 if instance.resolved else 1)
+    instance._saved_resolved = instance.resolved
+
+
+def uncount_task(sender, instance, **kwargs):
+    """Remove a deleted task from the counts"""
+    name = task_type(instance)
+    increment('tasks', name, -1)
+    if not instance.resolved:
+        increment('unresolved_tasks', name, -1)
+
+
+def count_communication(sender, instance, created, raw=False, **kwargs):
+    """Count communications sent and received, by the day they are dated"""
+    if created and not raw:
+        increment(
+                'communications',
+                'received' if instance.response else 'sent',
+                day=instance.date.date(),
+                )
+
+
+def count_delivery(sender, instance, created, raw=False, **kwargs):
+    """Count how sent communications were delivered"""
+    if not created or raw:
+        return
+    comm = instance.communication
+    if not comm.response:
+        increment(
+                'sent_communications',
+                DELIVERY_TYPES[sender],
+                day=comm.date.date(),
+                )
+
+
+def count_payment(sender, instance, created, raw=False, **kwargs):
+    """Count crowdfund payments"""
+    if created and not raw:
+        increment(
+                'crowdfund_payments',
+                'loggedin' if instance.user_id else 'loggedout',
+                day=instance.date.date(),
+                )
+
+
+post_save.connect(
+        count_status,
+        sender=FOIARequest,
+        dispatch_uid='muckrock.accounts.signals.count_status',
+        )
+post_delete.connect(
+        uncount_request,
+        sender=FOIARequest,
+        dispatch_uid='muckrock.accounts.signals.uncount_request',
+        )
+
+# tasks are saved as their subclasses, so the handlers are connected to
+# each kind of task
+for task_model in task_models():
+    pre_save.connect(
+            track_resolved,
+            sender=task_model,
+            dispatch_uid='muckrock.accounts.signals.track_resolved_%s'
+                % task_type(task_model),
+            )
+    post_save.connect(
+            count_task,
+            sender=task_model,
+            dispatch_uid='muckrock.accounts.signals.count_task_%s'
+                % task_type(task_model),
+            )
+    post_delete.connect(
+            uncount_task,
+            sender=task_model,
+            dispatch_uid='muckrock.accounts.signals.uncount_task_%s'
+                % task_type(task_model),
+            )
+
+post_save.connect(
+        count_communication,
+        sender=FOIACommunication,
+        dispatch_uid='muckrock.accounts.signals.count_communication',
+        )
+for delivery_model in DELIVERY_TYPES:
+    post_save.connect(
+            count_delivery,
+            sender=delivery_model,
+            dispatch_uid='muckrock.accounts.signals.count_delivery_%s'
+                % DELIVERY_TYPES[delivery_model],
+            )
+post_save.connect(
+        count_payment,
+        sender=CrowdfundPayment,
+        dispatch_uid='muckrock.accounts.signals.count_payment',
+        )
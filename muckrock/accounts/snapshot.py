@@ -0,0 +1,341 @@
+"""
+A snapshot of the site's statistics, for the daily Statistics row
+
+Instead of a separate count for every statistic, each group below reads its
+table once and counts all of its statistics in the same pass, using
+conditional aggregation.  The groups do not depend on each other, so they
+are run at the same time, each on its own database connection.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import (
+        Case,
+        Count,
+        F,
+        DurationField,
+        IntegerField,
+        Q,
+        Sum,
+        When,
+        )
+
+from datetime import date, timedelta
+from multiprocessing.dummy import Pool as ThreadPool
+import logging
+import time
+
+from muckrock.accounts.models import Profile
+from muckrock.agency.models import Agency
+from muckrock.crowdfund.models import Crowdfund, CrowdfundPayment
+from muckrock.foia.models import FOIARequest, FOIAFile, FOIACommunication
+from muckrock.foiamachine.models import FoiaMachineRequest
+from muckrock.jurisdiction.models import (
+        Exemption,
+        InvokedExemption,
+        ExampleAppeal,
+        )
+from muckrock.models import ExtractDay, Now, count_distinct_if, count_if
+from muckrock.news.models import Article
+from muckrock.organization.models import Organization
+from muckrock.project.models import Project
+from muckrock.task.models import Task
+
+logger = logging.getLogger(__name__)
+
+# statistic name suffix -> request status
+STATUSES = [
+        ('success', 'done'),
+        ('denied', 'rejected'),
+        ('draft', 'started'),
+        ('submitted', 'submitted'),
+        ('awaiting_ack', 'ack'),
+        ('awaiting_response', 'processed'),
+        ('awaiting_appeal', 'appealing'),
+        ('fix_required', 'fix'),
+        ('payment_required', 'payment'),
+        ('no_docs', 'no_docs'),
+        ('partial', 'partial'),
+        ('abandoned', 'abandoned'),
+        ('lawsuit', 'lawsuit'),
+        ]
+
+# the account types broken out in the statistics
+ACCT_TYPES = ['pro', 'basic', 'beta', 'proxy', 'admin']
+
+# statistic name -> task subclass
+TASK_TYPES = [
+        ('generic', 'generictask'),
+        ('orphan', 'orphantask'),
+        ('snailmail', 'snailmailtask'),
+        ('rejected', 'rejectedemailtask'),
+        ('staleagency', 'staleagencytask'),
+        ('flagged', 'flaggedtask'),
+        ('newagency', 'newagencytask'),
+        ('response', 'responsetask'),
+        ('faxfail', 'failedfaxtask'),
+        ('crowdfundpayment', 'crowdfundtask'),
+        ]
+
+# statistic name suffix -> (lower, upper] bounds on the percent raised
+CROWDFUND_BUCKETS = [
+        ('0_25', 0, 0.25),
+        ('25_50', 0.25, 0.50),
+        ('50_75', 0.50, 0.75),
+        ('75_100', 0.75, 1.00),
+        ('100_125', 1.00, 1.25),
+        ('125_150', 1.25, 1.50),
+        ('150_175', 1.50, 1.75),
+        ('175_200', 1.75, 2.00),
+        ]
+
+
+def foia_stats(day):
+    """Requests by status, fees and the day's requests by account type"""
+    org = Q(
+            user__profile__organization__active=True,
+            user__profile__organization__monthly_cost__gt=0,
+            )
+    no_org = (
+            Q(user__profile__organization=None) |
+            Q(user__profile__organization__active=False) |
+            Q(user__profile__organization__monthly_cost__lte=0)
+            )
+    aggregates = {
+            'total_requests': Count('pk'),
+            'total_users_filed': Count('user', distinct=True),
+            'total_fees': Sum('price'),
+            'requests_processing_days': Sum(Case(
+                When(
+                    status='submitted',
+                    date_processing__isnull=False,
+                    then=date.today() - F('date_processing'),
+                    ),
+                output_field=IntegerField(),
+                )),
+            'daily_requests_org': count_if(org, date_submitted=day),
+            }
+    for name, status in STATUSES:
+        aggregates['total_requests_%s' % name] = count_if(status=status)
+    for acct_type in ACCT_TYPES:
+        aggregates['daily_requests_%s' % acct_type] = count_if(
+                no_org,
+                user__profile__acct_type=acct_type,
+                date_submitted=day,
+                )
+    return FOIARequest.objects.aggregate(**aggregates)
+
+
+def machine_request_stats(day):
+    """FOIA Machine requests by status"""
+    # pylint: disable=unused-argument
+    aggregates = {'machine_requests': Count('pk')}
+    for name, status in STATUSES:
+        aggregates['machine_requests_%s' % name] = count_if(status=status)
+    return FoiaMachineRequest.objects.aggregate(**aggregates)
+
+
+def communication_stats(day):
+    """The day's sent communications by method, and orphans"""
+    sent = Q(date__range=(day, date.today()), response=False)
+    return (FOIACommunication.objects
+            .filter(sent | Q(foia=None))
+            .aggregate(
+                orphaned_communications=count_distinct_if(foia=None),
+                sent_communications_email=Count(
+                    Case(When(sent, then=F('emails__pk'))), distinct=True),
+                sent_communications_fax=Count(
+                    Case(When(sent, then=F('faxes__pk'))), distinct=True),
+                sent_communications_mail=Count(
+                    Case(When(sent, then=F('mails__pk'))), distinct=True),
+                ))
+
+
+def file_stats(day):
+    """Pages of files"""
+    # pylint: disable=unused-argument
+    return FOIAFile.objects.aggregate(total_pages=Sum('pages'))
+
+
+def user_stats(day):
+    """Users by account type and organization, and project members"""
+    # pylint: disable=unused-argument
+    active_org = Q(
+            profile__organization__active=True,
+            profile__organization__monthly_cost__gt=0,
+            )
+    aggregates = {
+            'total_users': Count('pk', distinct=True),
+            'total_users_excluding_agencies': count_distinct_if(
+                Q(profile=None) | ~Q(profile__acct_type='agency')),
+            'pro_users': count_distinct_if(profile__acct_type='pro'),
+            'total_active_org_members': count_distinct_if(active_org),
+            'project_users': count_distinct_if(projects__isnull=False),
+            }
+    for acct_type in ACCT_TYPES:
+        aggregates['project_users_%s' % acct_type] = count_distinct_if(
+                projects__isnull=False,
+                profile__acct_type=acct_type,
+                )
+    stats = User.objects.aggregate(**aggregates)
+    stats['pro_user_names'] = ';'.join(Profile.objects
+            .filter(acct_type='pro')
+            .values_list('user__username', flat=True))
+    return stats
+
+
+def agency_stats(day):
+    """Agencies, stale and unapproved"""
+    # pylint: disable=unused-argument
+    return Agency.objects.aggregate(
+            total_agencies=Count('pk'),
+            stale_agencies=count_if(stale=True),
+            unapproved_agencies=count_if(status='pending'),
+            )
+
+
+def task_stats(day):
+    """Tasks of each type, resolved and unresolved"""
+    aggregates = {
+            'total_tasks': Count('pk'),
+            'total_unresolved_tasks': count_if(resolved=False),
+            'daily_robot_response_tasks': count_if(
+                responsetask__isnull=False,
+                date_done__gte=day,
+                date_done__lt=date.today(),
+                resolved_by__profile__acct_type='robot',
+                ),
+            'unresolved_snailmail_appeals': count_if(
+                snailmailtask__category='a',
+                resolved=False,
+                ),
+            'flag_processing_days': ExtractDay(Sum(Case(
+                When(
+                    flaggedtask__isnull=False,
+                    resolved=False,
+                    then=Now() - F('date_created'),
+                    ),
+                output_field=DurationField(),
+                ))),
+            }
+    for name, subclass in TASK_TYPES:
+        is_type = Q(**{'%s__isnull' % subclass: False})
+        aggregates['total_%s_tasks' % name] = count_if(is_type)
+        aggregates['total_unresolved_%s_tasks' % name] = count_if(
+                is_type, resolved=False)
+    return Task.objects.aggregate(**aggregates)
+
+
+def crowdfund_stats(day):
+    """Crowdfunds by account type, how much closed crowdfunds raised, and payments"""
+    # pylint: disable=unused-argument
+    aggregates = {
+            'total_crowdfunds': Count('pk', distinct=True),
+            'open_crowdfunds': count_distinct_if(closed=False),
+            }
+    for acct_type in ACCT_TYPES:
+        owner = (
+                Q(foia__user__profile__acct_type=acct_type) |
+                Q(projects__contributors__profile__acct_type=acct_type)
+                )
+        aggregates['total_crowdfunds_%s' % acct_type] = count_distinct_if(owner)
+        aggregates['open_crowdfunds_%s' % acct_type] = count_distinct_if(
+                owner, closed=False)
+    stats = Crowdfund.objects.aggregate(**aggregates)
+
+    buckets = {
+            'closed_crowdfunds_0': count_if(percent=0),
+            'closed_crowdfunds_200': count_if(percent__gt=2.00),
+            }
+    for name, lower, upper in CROWDFUND_BUCKETS:
+        buckets['closed_crowdfunds_%s' % name] = count_if(
+                percent__gt=lower, percent__lte=upper)
+    stats.update(Crowdfund.objects
+            .filter(closed=True)
+            .annotate(percent=F('payment_received') / F('payment_required'))
+            .aggregate(**buckets))
+
+    stats.update(CrowdfundPayment.objects.aggregate(
+            total_crowdfund_payments=Count('pk'),
+            total_crowdfund_payments_loggedin=count_if(user__isnull=False),
+            total_crowdfund_payments_loggedout=count_if(user=None),
+            ))
+    return stats
+
+
+def project_stats(day):
+    """Projects by visibility"""
+    # pylint: disable=unused-argument
+    return Project.objects.aggregate(
+            public_projects=count_distinct_if(private=False, approved=True),
+            private_projects=count_distinct_if(private=True, approved=True),
+            unapproved_projects=count_distinct_if(approved=False),
+            crowdfund_projects=count_distinct_if(crowdfunds__isnull=False),
+            )
+
+
+def other_stats(day):
+    """Small tables which are cheap to count on their own"""
+    return {
+            'daily_articles': Article.objects
+                .filter(pub_date__gte=day, pub_date__lt=day + timedelta(1))
+                .count(),
+            'total_active_orgs': Organization.objects
+                .filter(active=True, monthly_cost__gt=0)
+                .count(),
+            'total_exemptions': Exemption.objects.count(),
+            'total_invoked_exemptions': InvokedExemption.objects.count(),
+            'total_example_appeals': ExampleAppeal.objects.count(),
+            }
+
+
+GROUPS = [
+        foia_stats,
+        task_stats,
+        communication_stats,
+        user_stats,
+        crowdfund_stats,
+        machine_request_stats,
+        file_stats,
+        agency_stats,
+        project_stats,
+        other_stats,
+        ]
+
+
+def run_group(group, day, close=False):
+    """Run one group of statistics, logging how long it took"""
+    start = time.time()
+    try:
+        return group(day)
+    finally:
+        if close:
+            # each thread has its own connection, which would be left open
+            connection.close()
+        logger.info('Statistics: %s took %.2f seconds',
+                group.__name__, time.time() - start)
+
+
+def take_snapshot(day, concurrency=None):
+    """
+    Calculate the statistics for a day, returning a dictionary of
+    Statistics field values
+    """
+    if concurrency is None:
+        concurrency = settings.STATISTICS_CONCURRENCY
+    start = time.time()
+    if concurrency > 1:
+        pool = ThreadPool(min(concurrency, len(GROUPS)))
+        try:
+            results = pool.map(
+                    lambda group: run_group(group, day, close=True), GROUPS)
+        finally:
+            pool.close()
+    else:
+        results = [run_group(group, day) for group in GROUPS]
+    stats = {}
+    for result in results:
+        stats.update(result)
+    logger.info('Statistics: snapshot took %.2f seconds', time.time() - start)
+    return stats
@@ -0,0 +1,95 @@
+"""
+Tests for the live counters
+"""
+
+from django.template.loader import get_template
+from django.test import TestCase
+
+from datetime import date
+from mock import patch
+from nose.tools import eq_
+
+from muckrock.accounts.counters import (
+        get_levels,
+        get_totals,
+        increment,
+        live_stats,
+        reconcile,
+        )
+from muckrock.accounts.models import Counter
+from muckrock.factories import (
+        AgencyFactory,
+        FOIACommunicationFactory,
+        FOIAMultiRequestFactory,
+        FOIARequestFactory,
+        )
+from muckrock.foia.models import FOIARequest
+from muckrock.foia.tasks import create_multi_request_chunk
+from muckrock.task.models import FlaggedTask
+
+
+# counters are updated once the transaction commits, which a TestCase never does
+@patch('django.db.transaction.on_commit', lambda func: func())
+class TestCounters(TestCase):
+    """Counters should follow changes as they happen"""
+
+    def test_increment(self):
+        """Increments to the same counter are added together"""
+        increment('test', 'a')
+        increment('test', 'a', 2)
+        increment('test', 'b', -1)
+        eq_(Counter.objects.filter(metric='test').count(), 2)
+        eq_(get_levels('test'), {'a': 3, 'b': -1})
+
+    def test_status(self):
+        """Requests are counted by status"""
+        foia = FOIARequestFactory(status='started')
+        eq_(get_levels('requests'), {'started': 1})
+        foia.status = 'submitted'
+        foia.save()
+        eq_(get_levels('requests'), {'started': 0, 'submitted': 1})
+        foia.delete()
+        eq_(get_levels('requests'), {'started': 0, 'submitted': 0})
+
+    def test_tasks(self):
+        """Tasks are counted by type, with the unresolved ones"""
+        task = FlaggedTask.objects.create(text='flag')
+        FlaggedTask.objects.create(text='flag')
+        eq_(get_levels('tasks'), {'flaggedtask': 2})
+        eq_(get_levels('unresolved_tasks'), {'flaggedtask': 2})
+        task.resolve()
+        eq_(get_levels('tasks'), {'flaggedtask': 2})
+        eq_(get_levels('unresolved_tasks'), {'flaggedtask': 1})
+
+    def test_multi_request(self):
+        """Multi request copies created in bulk are counted"""
+        agencies = [AgencyFactory(), AgencyFactory()]
+        multi = FOIAMultiRequestFactory(agencies=agencies)
+        create_multi_request_chunk(
+                multi,
+                get_template('text/foia/request.txt'),
+                [a.pk for a in agencies],
+                )
+        eq_(get_levels('requests'), {'started': 2})
+        eq_(get_totals('communications', date.today()), {'sent': 2})
+
+    def test_communications(self):
+        """Communications are counted by the day they are dated"""
+        FOIACommunicationFactory(response=False)
+        FOIACommunicationFactory(response=True)
+        eq_(get_totals('communications', date.today()),
+                {'sent': 1, 'received': 1})
+        eq_(get_totals('sent_communications', date.today()), {'email': 1})
+        eq_(live_stats()['sent_communications_today'], {'email': 1})
+
+    def test_reconcile(self):
+        """Changes which were not counted are corrected by reconciling"""
+        foia = FOIARequestFactory(status='started')
+        FOIACommunicationFactory(foia=foia)
+        FOIARequest.objects.filter(pk=foia.pk).update(status='done')
+        Counter.objects.filter(metric='sent_communications').delete()
+        corrections = reconcile(days=1)
+        eq_(get_levels('requests'), {'started': 0, 'done': 1})
+        eq_(get_totals('sent_communications', date.today()), {'email': 1})
+        eq_(corrections, 3)
+        eq_(reconcile(days=1), 0)
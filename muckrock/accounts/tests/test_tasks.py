@@ -4,9 +4,18 @@ Tests tasks for the Accounts application
 
 from django.test import TestCase
 
+from datetime import date, timedelta
 from nose.tools import eq_
 
 from muckrock.accounts import models, tasks
+from muckrock.accounts.snapshot import take_snapshot
+from muckrock.factories import (
+        CrowdfundFactory,
+        FOIARequestFactory,
+        ProjectFactory,
+        UserFactory,
+        )
+from muckrock.task.models import FlaggedTask
 
 
 class TestStatisticsTask(TestCase):
@@ -18,3 +27,40 @@ class TestStatisticsTask(TestCase):
         tasks.store_statistics()
         new_stat_count = models.Statistics.objects.count()
         eq_(new_stat_count, stat_count + 1, 'A new Statistics object should be created.')
+
+    def test_snapshot(self):
+        """Statistics counted together should match counting them separately"""
+        # pylint: disable=no-self-use
+        yesterday = date.today() - timedelta(1)
+        pro_user = UserFactory(profile__acct_type='pro')
+        FOIARequestFactory(status='done', user=pro_user, date_submitted=yesterday)
+        FOIARequestFactory(status='done', user=pro_user)
+        FOIARequestFactory(status='ack', price='10.00')
+        project = ProjectFactory()
+        project.contributors.add(pro_user, UserFactory())
+        crowdfund = CrowdfundFactory(closed=True, payment_received=30)
+        project.crowdfunds.add(crowdfund)
+        FlaggedTask.objects.create(text='flag')
+        FlaggedTask.objects.create(text='flag', resolved=True)
+
+        stats = take_snapshot(yesterday)
+        eq_(stats['total_requests'], 3)
+        eq_(stats['total_requests_success'], 2)
+        eq_(stats['total_requests_awaiting_ack'], 1)
+        eq_(stats['total_requests_lawsuit'], 0)
+        eq_(stats['total_fees'], 10)
+        eq_(stats['total_users_filed'], 2)
+        eq_(stats['daily_requests_pro'], 1)
+        eq_(stats['daily_requests_basic'], 0)
+        eq_(stats['pro_users'], 1)
+        eq_(stats['pro_user_names'], pro_user.username)
+        eq_(stats['project_users'], 2)
+        eq_(stats['project_users_pro'], 1)
+        eq_(stats['total_crowdfunds'], 1)
+        eq_(stats['total_crowdfunds_pro'], 1)
+        eq_(stats['closed_crowdfunds_25_50'], 1)
+        eq_(stats['crowdfund_projects'], 1)
+        eq_(stats['total_flagged_tasks'], 2)
+        eq_(stats['total_unresolved_flagged_tasks'], 1)
+        eq_(stats['total_tasks'], 2)
+        eq_(stats['total_generic_tasks'], 0)
@@ -25,15 +25,18 @@ from django.views.generic import TemplateView, FormView, ListView
 
 from datetime import date
 from rest_framework import viewsets
+from rest_framework.decorators import list_route
 from rest_framework.permissions import (
         DjangoModelPermissionsOrAnonReadOnly,
         IsAdminUser,
         )
+from rest_framework.response import Response
 import json
 import logging
 import stripe
 import sys
 
+from muckrock.accounts.counters import live_stats
 from muckrock.accounts.filters import ProxyFilterSet
 from muckrock.accounts.forms import (
         ProfileSettingsForm,
@@ -560,6 +563,13 @@ class StatisticsViewSet(viewsets.ModelViewSet):
     permission_classes = (DjangoModelPermissionsOrAnonReadOnly,)
     filter_fields = ('date',)
 
+    @list_route()
+    def live(self, request):
+        """The live counters - current levels and today's flows"""
+        # pylint: disable=no-self-use
+        # pylint: disable=unused-argument
+        return Response(live_stats())
+
 
 @method_decorator(login_required, name='dispatch')
 class NotificationList(ListView):
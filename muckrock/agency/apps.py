@@ -11,9 +11,12 @@ class AgencyConfig(AppConfig):
     name = 'muckrock.agency'
 
     def ready(self):
-        """Registers agencies with the activity streams plugin"""
+        """Registers agencies with the activity streams plugin,
+        and connects the signals"""
         from actstream import registry as action
         from watson import search
+        # pylint: disable=unused-variable
+        import muckrock.agency.signals
         Agency = self.get_model('Agency')
         action.register(Agency)
         search.register(Agency.objects.get_approved())
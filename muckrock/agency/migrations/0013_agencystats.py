@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-29 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0012_auto_20171004_1403'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgencyStats',
+            fields=[
+                ('agency', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='agency.Agency')),
+                ('date_refreshed', models.DateField(blank=True, null=True)),
+                ('average_response_time', models.IntegerField(default=0)),
+                ('average_fee', models.FloatField(default=0)),
+                ('fee_rate', models.FloatField(default=0)),
+                ('success_rate', models.FloatField(default=0)),
+                ('total_pages', models.IntegerField(default=0)),
+                ('num_submitted', models.IntegerField(default=0)),
+                ('num_overdue', models.IntegerField(default=0)),
+                ('num_rejected', models.IntegerField(default=0)),
+                ('num_ack', models.IntegerField(default=0)),
+                ('num_processed', models.IntegerField(default=0)),
+                ('num_fix', models.IntegerField(default=0)),
+                ('num_no_docs', models.IntegerField(default=0)),
+                ('num_done', models.IntegerField(default=0)),
+                ('num_appealing', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'agency stats',
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-30 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agency', '0013_agencystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgencyResponseTimes',
+            fields=[
+                ('agency', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='response_times', serialize=False, to='agency.Agency')),
+                ('date_calculated', models.DateField()),
+                ('response_count', models.IntegerField(default=0)),
+                ('completion_count', models.IntegerField(default=0)),
+                ('response_percentiles', models.BinaryField()),
+                ('completion_percentiles', models.BinaryField()),
+                ('response_histogram', models.BinaryField()),
+                ('completion_histogram', models.BinaryField()),
+                ('yearly', models.BinaryField()),
+            ],
+            options={
+                'verbose_name_plural': 'agency response times',
+                'abstract': False,
+            },
+        ),
+    ]
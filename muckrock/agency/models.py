@@ -5,18 +5,25 @@ Models for the Agency application
 from django.contrib.auth.models import User
 from django.core.exceptions import MultipleObjectsReturned
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Max, Min, Q, When
 from django.template.defaultfilters import slugify
 from django.utils.safestring import mark_safe
 
-from datetime import date
+from datetime import date, datetime, timedelta
 from djgeojson.fields import PointField
 from easy_thumbnails.fields import ThumbnailerImageField
 import logging
 
 from muckrock.accounts.models import Profile
 from muckrock.accounts.utils import unique_username
-from muckrock.jurisdiction.models import Jurisdiction, RequestHelper
+from muckrock.foia.models import FOIARequest
+from muckrock.jurisdiction.models import (
+        Jurisdiction,
+        RequestHelper,
+        RequestStats,
+        ResponseTimes,
+        )
 from muckrock.task.models import StaleAgencyTask
 from muckrock import fields
 
@@ -52,6 +59,70 @@ class AgencyQuerySet(models.QuerySet):
                    .filter(status='approved')\
                    .order_by('name')
 
+    def get_stale(self):
+        """Get agencies which should be marked as stale, in one query
+
+        See Agency.is_stale for the rules.  The latest response and the
+        oldest submission of each agency's open requests are found with a
+        single grouped subquery."""
+        cutoff = date.today() - timedelta(STALE_DURATION)
+        # responses on or before the cutoff day
+        response_cutoff = datetime.combine(cutoff + timedelta(1), datetime.min.time())
+        stale_agencies = (FOIARequest.objects
+                .get_open()
+                .order_by()
+                .values('agency')
+                .annotate(
+                    latest_response=Max(Case(When(
+                        communications__response=True,
+                        then='communications__date',
+                        ))),
+                    oldest_submitted=Min('date_submitted'),
+                    )
+                .filter(
+                    Q(latest_response__lt=response_cutoff) |
+                    Q(latest_response=None, oldest_submitted__lte=cutoff))
+                .values('agency'))
+        return self.filter(Q(manual_stale=True) | Q(pk__in=stale_agencies))
+
+    def unmark_stale(self):
+        """Unmark these agencies as stale and resolve their StaleAgencyTasks,
+        in bulk.  Returns the number of agencies unmarked."""
+        agency_ids = list(self.filter(stale=True).values_list('pk', flat=True))
+        if not agency_ids:
+            return 0
+        with transaction.atomic():
+            (Agency.objects
+                    .filter(pk__in=agency_ids)
+                    .update(stale=False, manual_stale=False))
+            (StaleAgencyTask.objects
+                    .filter(resolved=False, agency__in=agency_ids)
+                    .update(resolved=True, date_done=datetime.now()))
+        return len(agency_ids)
+
+    def update_stale(self):
+        """Mark the agencies which have gone stale and unmark the ones which
+        are no longer stale, in bulk.  Returns the number marked and unmarked."""
+        with transaction.atomic():
+            stale_ids = set(self.get_stale().values_list('pk', flat=True))
+            marked = (self
+                    .filter(pk__in=stale_ids, stale=False)
+                    .update(stale=True))
+            unmarked = (self
+                    .filter(stale=True)
+                    .exclude(pk__in=stale_ids)
+                    .unmark_stale())
+            # tasks are created one at a time, as bulk_create does not
+            # support multi-table inheritance
+            tasked_ids = set(StaleAgencyTask.objects
+                    .filter(resolved=False, agency__in=stale_ids)
+                    .values_list('agency_id', flat=True))
+            for agency_id in stale_ids - tasked_ids:
+                task = StaleAgencyTask.objects.create(agency_id=agency_id)
+                logger.info('Created new StaleAgencyTask <%d> for Agency <%d>',
+                        task.pk, agency_id)
+        return marked, unmarked
+
 
 class Agency(models.Model, RequestHelper):
     """An agency for a particular jurisdiction that has at least one agency type"""
@@ -168,20 +239,7 @@ class Agency(models.Model, RequestHelper):
         # check if agency is manually marked as stale
         if self.manual_stale:
             return True
-        # find any open requests, if none, not stale
-        foias = self.foiarequest_set.get_open().order_by('date_submitted')
-        if not foias:
-            return False
-        # find the latest response to an open request
-        latest_responses = []
-        for foia in foias:
-            response = foia.latest_response()
-            if response:
-                latest_responses.append(response)
-        if latest_responses:
-            return min(latest_responses) >= STALE_DURATION
-        # no response to open requests, use oldest open request submit date
-        return (date.today() - foias[0].date_submitted).days >= STALE_DURATION
+        return Agency.objects.filter(pk=self.pk).get_stale().exists()
 
     def mark_stale(self, manual=False):
         """Mark this agency as stale and create a StaleAgencyTask if one doesn't already exist."""
@@ -281,6 +339,33 @@ EMAIL_TYPES = (
 
 # pylint: disable=model-missing-unicode
 
+class AgencyStats(RequestStats):
+    """Request statistics for an agency"""
+    agency = models.OneToOneField(
+            Agency,
+            related_name='stats',
+            primary_key=True,
+            )
+
+    def __unicode__(self):
+        return u'Stats for %s' % self.agency
+
+    class Meta(RequestStats.Meta):
+        verbose_name_plural = 'agency stats'
+
+
+class AgencyResponseTimes(ResponseTimes):
+    """Response times for an agency"""
+    agency = models.OneToOneField(
+            Agency,
+            related_name='response_times',
+            primary_key=True,
+            )
+
+    class Meta(ResponseTimes.Meta):
+        verbose_name_plural = 'agency response times'
+
+
 class AgencyAddress(models.Model):
     """Through model for agency to address M2M"""
 
@@ -0,0 +1,27 @@
+"""Signal handlers for the agency application"""
+
+from django.db.models.signals import post_save
+
+from datetime import date
+
+from muckrock.agency.models import STALE_DURATION, Agency
+from muckrock.foia.models import FOIACommunication
+
+# pylint: disable=unused-argument
+
+
+def response_received(sender, instance, created, raw=False, **kwargs):
+    """A recent response means its agency is no longer stale"""
+    if not created or raw or not instance.response or instance.foia is None:
+        return
+    if (date.today() - instance.date.date()).days >= STALE_DURATION:
+        return
+    if instance.foia.agency_id is not None:
+        Agency.objects.filter(pk=instance.foia.agency_id).unmark_stale()
+
+
+post_save.connect(
+        response_received,
+        sender=FOIACommunication,
+        dispatch_uid='muckrock.agency.signals.response_received',
+        )
@@ -1,14 +1,20 @@
 """Celery Tasks for the agency application"""
 
 from celery.schedules import crontab
-from celery.task import periodic_task
+from celery.task import periodic_task, task
+from django.core.cache import cache
+from django.db.models import Q
 
+import logging
 import os
 from raven import Client
 from raven.contrib.celery import register_logger_signal, register_signal
 
 from muckrock.agency.models import Agency
-from muckrock.task.models import StaleAgencyTask
+from muckrock.jurisdiction import response_times
+from muckrock.jurisdiction.models import Jurisdiction
+
+logger = logging.getLogger(__name__)
 
 client = Client(os.environ.get('SENTRY_DSN'))
 register_logger_signal(client)
@@ -18,11 +24,48 @@ register_signal(client)
                name='muckrock.agency.tasks.stale')
 def stale():
     """Record all stale agencies once a week"""
-    for agency in Agency.objects.all():
-        is_stale = agency.is_stale()
-        if is_stale and not agency.stale:
-            agency.mark_stale()
-        elif not is_stale and agency.stale:
-            agency.unmark_stale()
-            for task in StaleAgencyTask.objects.filter(resolved=False, agency=agency):
-                task.resolve()
+    marked, unmarked = Agency.objects.update_stale()
+    logger.info('Marked %d agencies as stale and unmarked %d', marked, unmarked)
+
+@periodic_task(run_every=crontab(hour=2, minute=0),
+               name='muckrock.agency.tasks.calculate_response_times')
+def calculate_response_times():
+    """Calculate the response time distributions for every agency and jurisdiction"""
+    response_times.calculate()
+
+def stats_refresh_key(kind, pk):
+    """The cache key marking a refresh of the request statistics as queued"""
+    return 'request_stats_refresh:%s:%d' % (kind, pk)
+
+
+@task(ignore_result=True, name='muckrock.agency.tasks.refresh_request_stats')
+def refresh_request_stats(agency_ids, jurisdiction_ids, **kwargs):
+    """
+    Refresh the request statistics for the agencies and jurisdictions,
+    including the states the jurisdictions are in
+    """
+    # pylint: disable=unused-argument
+    # changes from now on queue another refresh
+    cache.delete_many(
+            [stats_refresh_key('agency', pk) for pk in agency_ids] +
+            [stats_refresh_key('jurisdiction', pk) for pk in jurisdiction_ids])
+    for agency in Agency.objects.filter(pk__in=agency_ids):
+        agency.refresh_stats()
+    jurisdictions = (Jurisdiction.objects
+            .filter(Q(pk__in=jurisdiction_ids) | Q(children__in=jurisdiction_ids))
+            .distinct())
+    for jurisdiction in jurisdictions:
+        jurisdiction.refresh_stats()
+
+
+@periodic_task(run_every=crontab(hour=1, minute=30),
+               time_limit=60 * 60,
+               soft_time_limit=59 * 60,
+               name='muckrock.agency.tasks.refresh_all_request_stats')
+def refresh_all_request_stats():
+    """Refresh the request statistics for every agency and jurisdiction"""
+    for agency in Agency.objects.iterator():
+        agency.refresh_stats()
+    for jurisdiction in Jurisdiction.objects.iterator():
+        jurisdiction.refresh_stats()
+    logger.info('Refreshed the request statistics')
@@ -124,6 +124,38 @@ class TestAgencyUnit(TestCase):
         ok_(not self.agency1.manual_stale,
             'A manually stale agency should also be freed from staleness.')
 
+    def test_agency_update_stale(self):
+        """Staleness is updated for all agencies at once"""
+        stale_agency = factories.StaleAgencyFactory(stale=False)
+        fresh_agency = factories.AgencyFactory(stale=True)
+        fresh_task = StaleAgencyTaskFactory(agency=fresh_agency)
+        eq_(agency.models.Agency.objects.update_stale(), (1, 1))
+        stale_agency.refresh_from_db()
+        fresh_agency.refresh_from_db()
+        fresh_task.refresh_from_db()
+        ok_(stale_agency.stale, 'The agency should be marked as stale.')
+        ok_(StaleAgencyTask.objects.filter(
+            resolved=False, agency=stale_agency).exists(),
+            'A task should be created for the stale agency.')
+        ok_(not fresh_agency.stale, 'The agency should no longer be stale.')
+        ok_(fresh_task.resolved, 'The task should be resolved.')
+        eq_(agency.models.Agency.objects.update_stale(), (0, 0))
+        eq_(StaleAgencyTask.objects.filter(agency=stale_agency).count(), 1,
+            'Only one task should be created.')
+
+    def test_agency_response_unmarks_stale(self):
+        """A new response should unmark the agency as stale"""
+        task = StaleAgencyTaskFactory(agency=self.agency1)
+        self.agency1.mark_stale(manual=True)
+        factories.FOIACommunicationFactory(
+            response=True,
+            foia__agency=self.agency1,
+        )
+        self.agency1.refresh_from_db()
+        task.refresh_from_db()
+        ok_(not self.agency1.stale, 'The agency should no longer be stale.')
+        ok_(task.resolved, 'The task should be resolved.')
+
 
 class TestAgencyManager(TestCase):
     """Tests for the Agency object manager"""
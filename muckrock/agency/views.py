@@ -43,7 +43,9 @@ def detail(request, jurisdiction, jidx, slug, idx):
             Agency.objects.select_related(
                 'jurisdiction',
                 'jurisdiction__parent',
-                'jurisdiction__parent__parent'),
+                'jurisdiction__parent__parent',
+                'stats',
+                'response_times'),
             jurisdiction__slug=jurisdiction,
             jurisdiction__pk=jidx,
             slug=slug,
@@ -123,7 +125,7 @@ class AgencyViewSet(viewsets.ModelViewSet):
     # pylint: disable=too-many-public-methods
     queryset = (Agency.objects
             .order_by('id')
-            .select_related('jurisdiction', 'parent', 'appeal_agency')
+            .select_related('jurisdiction', 'parent', 'appeal_agency', 'stats')
             .prefetch_related('types')
             )
     serializer_class = AgencySerializer
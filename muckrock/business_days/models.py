@@ -4,12 +4,23 @@ Models for the Business Days application
 from django.db import models
 
 from calendar import monthrange
-from datetime import timedelta
+from collections import namedtuple
+from datetime import date, timedelta
 from pascha import computus, traditions
+import numpy as np
 
 JAN, FEB, MAR, APR, MAY, JUN, JUL, AUG, SEP, OCT, NOV, DEC = range(1, 13)
 MON, TUES, WEDS, THURS, FRI, SAT, SUN = range(0, 7)
 
+# easter only depends on the year, so only compute it once per year
+_EASTER_CACHE = {}
+
+def western_easter(year):
+    """Date of western easter for the given year"""
+    if year not in _EASTER_CACHE:
+        _EASTER_CACHE[year] = computus.western(None, year=year).date()
+    return _EASTER_CACHE[year]
+
 class Holiday(models.Model):
     """A holiday"""
 
@@ -74,8 +85,7 @@ class Holiday(models.Model):
 
     def match(self, date_, observe_sat):
         """Is the given date an instance of this Holiday?"""
-        table = dict((k, getattr(self, '_match_%s' % k)) for k, _ in self.kinds)
-        return table[self.kind](date_, observe_sat)
+        return getattr(self, '_match_%s' % self.kind)(date_, observe_sat)
 
     def _match_date(self, date_, observe_sat):
         """match for date type holidays"""
@@ -109,7 +119,7 @@ class Holiday(models.Model):
     def _match_easter(self, date_, _):
         """match for easter based dates"""
         return date_ == traditions.Western.offset[self.name] + \
-            computus.western(None, year=date_.year).date()
+            western_easter(date_.year)
 
     def _match_election(self, date_, _):
         """match for election day"""
@@ -117,59 +127,182 @@ class Holiday(models.Model):
         return date_.month == NOV and date_.weekday() == TUES and \
                date_.day >= 2 and date_.day <= 8
 
+    def observed_dates(self, year, observe_sat):
+        """
+        The dates this holiday is observed on for the given year.  These
+        are exactly the dates `match` returns true for, computed directly
+        instead of testing every day of the year.  Observation may move a
+        holiday into the previous or next year.
+        """
+        return getattr(self, '_dates_%s' % self.kind)(year, observe_sat)
+
+    def _dates_date(self, year, observe_sat):
+        """dates for date type holidays"""
+        try:
+            date_ = date(year, self.month, self.day)
+        except (TypeError, ValueError):
+            # no month or day set, or a day that does not exist this year
+            return []
+        weekday = date_.weekday()
+        if weekday == SUN:
+            return [date_ + timedelta(1)]
+        elif weekday == SAT and not observe_sat:
+            return [date_ - timedelta(1)]
+        else:
+            return [date_]
+
+    def _dates_ord_wd(self, year, _):
+        """dates for ord weekday type holidays"""
+        if not self.month or self.weekday is None or not self.num:
+            return []
+        first_weekday, days = monthrange(year, self.month)
+        if self.num > 0:
+            day = 1 + (self.weekday - first_weekday) % 7 + 7 * (self.num - 1)
+        else:
+            last_weekday = (first_weekday + days - 1) % 7
+            day = days - (last_weekday - self.weekday) % 7 - 7 * (-self.num - 1)
+        if 1 <= day <= days:
+            return [date(year, self.month, day)]
+        return []
+
+    def _dates_easter(self, year, _):
+        """dates for easter based holidays"""
+        return [traditions.Western.offset[self.name] + western_easter(year)]
+
+    def _dates_election(self, year, _):
+        """dates for election day"""
+        # pylint: disable=no-self-use
+        # first tuesday after the first monday
+        nov_first = date(year, NOV, 1)
+        return [nov_first + timedelta(1 + (TUES - nov_first.weekday() - 1) % 7)]
+
 
 class HolidayCalendar(object):
-    """A set of holidays"""
+    """
+    A set of holidays
+
+    Business days are precomputed into a bitmap covering whole years, along
+    with a running count of business days, so that counting and offsetting by
+    business days are array lookups instead of day by day walks.  The covered
+    years are extended as needed.  The precomputed table is replaced in a
+    single assignment, so one calendar may be shared between threads.
+    """
 
     def __init__(self, holidays, observe_sat):
         self.holidays = holidays
         self.observe_sat = observe_sat
+        self._table = None
+
+    def _build(self, start_year, end_year):
+        """Compute the business day table for the given range of years"""
+        start = date(start_year, 1, 1)
+        end = date(end_year + 1, 1, 1)
+        holiday_map = {}
+        # observed dates may spill over from the neighboring years
+        for holiday in self.holidays:
+            for year in xrange(start_year - 1, end_year + 2):
+                for date_ in holiday.observed_dates(year, self.observe_sat):
+                    if start <= date_ < end:
+                        holiday_map.setdefault(date_, holiday)
+
+        num_days = (end - start).days
+        weekdays = (np.arange(num_days) + start.weekday()) % 7
+        bitmap = weekdays < SAT
+        for date_ in holiday_map:
+            bitmap[(date_ - start).days] = False
+        # counts[i] is the number of business days before day i
+        counts = np.zeros(num_days + 1, dtype=np.int32)
+        counts[1:] = np.cumsum(bitmap)
+
+        return DayTable(start, end, holiday_map, bitmap, counts)
+
+    def _table_for(self, date_):
+        """Get a day table which covers the given date"""
+        date_ = _to_date(date_)
+        table = self._table
+        if table is None:
+            table = self._build(date_.year, date_.year)
+        elif date_ < table.start:
+            table = self._build(date_.year, table.end.year - 1)
+        elif date_ >= table.end:
+            table = self._build(table.start.year, date_.year)
+        else:
+            return table
+        self._table = table
+        return table
 
     def is_holiday(self, date_):
         """Is given date a holiday?"""
-
-        for holiday in self.holidays:
-            if holiday.match(date_, self.observe_sat):
-                return holiday
-        return None
+        return self._table_for(date_).holiday_map.get(_to_date(date_))
 
     def is_business_day(self, date_):
         """Is the given date a business day?"""
-
-        weekday = date_.weekday()
-        if weekday == SAT or weekday == SUN:
-            return False
-
-        return not self.is_holiday(date_)
+        table = self._table_for(date_)
+        return bool(table.bitmap[table.index(date_)])
 
     def business_days_from(self, date_, num):
         """Returns the date n business days from the given date"""
-
-        # could be optimized
-        delta = timedelta(1 if num >= 0 else -1)
-        num = abs(num)
-
-        while num:
-            date_ += delta
-            if self.is_business_day(date_):
-                num -= 1
-        return date_
+        if num == 0:
+            return date_
+        table = self._table_for(date_)
+        # extend the table (roughly a year at a time) until the answer is in range
+        while True:
+            index = table.index(date_)
+            if num > 0:
+                target = table.counts[index + 1] + num
+                if target <= table.counts[-1]:
+                    result = np.searchsorted(table.counts, target, side='left') - 1
+                    break
+                table = self._table_for(table.end + timedelta(2 * num))
+            else:
+                target = table.counts[index] + num
+                if target >= 0:
+                    result = np.searchsorted(table.counts, target, side='right') - 1
+                    break
+                table = self._table_for(table.start + timedelta(2 * num))
+        return date_ + timedelta(int(result) - index)
 
     def business_days_between(self, date_a, date_b):
         """How many business days are between the given dates?"""
-
-        # could be optimized
         sign = 1
         if date_a > date_b:
             date_a, date_b = date_b, date_a
             sign = -1
 
-        num = 0
-        while date_a < date_b:
-            date_a += timedelta(1)
-            if self.is_business_day(date_a):
-                num += 1
-        return num * sign
+        self._table_for(date_a)
+        table = self._table_for(date_b)
+        index_a = table.index(date_a)
+        index_b = table.index(date_b)
+        return int(table.counts[index_b + 1] - table.counts[index_a + 1]) * sign
+
+    def business_days_between_many(self, ordinals_a, ordinals_b):
+        """
+        How many business days are there from each of the first dates to
+        the matching second date?  The dates are given as arrays of
+        ordinals, and an array is returned.
+        """
+        if len(ordinals_a) == 0:
+            return np.zeros(0, dtype=np.int32)
+        self._table_for(date.fromordinal(int(min(ordinals_a.min(), ordinals_b.min()))))
+        table = self._table_for(
+                date.fromordinal(int(max(ordinals_a.max(), ordinals_b.max()))))
+        start = table.start.toordinal()
+        return (table.counts[ordinals_b - start + 1] -
+                table.counts[ordinals_a - start + 1])
+
+
+class DayTable(namedtuple('DayTable', 'start end holiday_map bitmap counts')):
+    """Precomputed business days for a range of years"""
+    # pylint: disable=too-few-public-methods
+
+    def index(self, date_):
+        """Index of the date into the table"""
+        return (_to_date(date_) - self.start).days
+
+
+def _to_date(date_):
+    """Strip the time from datetimes, so they can be used as dates"""
+    return date_.date() if hasattr(date_, 'date') else date_
 
 
 class Calendar(object):
@@ -191,3 +324,10 @@ class Calendar(object):
     def business_days_between(self, date_a, date_b):
         """How many business days are between the given dates?"""
         return abs((date_a - date_b).days)
+
+    def business_days_between_many(self, ordinals_a, ordinals_b):
+        """
+        How many days are there from each of the first dates to the
+        matching second date, given as arrays of ordinals?
+        """
+        return (ordinals_b - ordinals_a).astype(np.int32)
@@ -5,7 +5,7 @@ Tests using nose for the business_days application
 from django.test import TestCase
 
 import nose.tools
-from datetime import date
+from datetime import date, timedelta
 
 from muckrock.business_days.models import Holiday, Calendar
 from muckrock.jurisdiction.models import Jurisdiction
@@ -71,6 +71,29 @@ class TestBusinessDayUnit(TestCase):
         nose.tools.eq_(self.usa_cal.business_days_between(date(2010, 11, 1),
                                                           date(2010, 12, 15)), 30)
 
+    def test_business_days_from_negative(self):
+        """Test business_days_from going backwards"""
+
+        nose.tools.eq_(self.usa_cal.business_days_from(date(2010, 12, 15), -30),
+                       date(2010, 11, 1))
+
+    def test_business_days_across_years(self):
+        """Test business days spanning several years"""
+
+        end = self.usa_cal.business_days_from(date(2009, 12, 1), 600)
+        nose.tools.eq_(self.usa_cal.business_days_between(date(2009, 12, 1), end), 600)
+        nose.tools.eq_(self.usa_cal.business_days_between(end, date(2009, 12, 1)), -600)
+
+    def test_holiday_calendar_matches_holidays(self):
+        """The precomputed calendar should agree with matching each holiday"""
+
+        holidays = list(self.usa_cal.holidays)
+        date_ = date(2016, 12, 1)
+        while date_ < date(2018, 2, 1):
+            matched = any(h.match(date_, False) for h in holidays)
+            nose.tools.eq_(bool(self.usa_cal.is_holiday(date_)), matched)
+            date_ += timedelta(1)
+
     def test_calendar_days_from(self):
         """Test business_days_from for calendar days"""
 
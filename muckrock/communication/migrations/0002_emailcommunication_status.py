@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-26 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcommunication',
+            name='status',
+            field=models.CharField(blank=True, choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], editable=False, max_length=6),
+        ),
+    ]
@@ -158,10 +158,24 @@ class Address(models.Model):
 
 # Communication models
 
+EMAIL_STATUS = (
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        )
+
+
 class EmailCommunication(models.Model):
     """An email sent or received to deliver a communication"""
     communication = models.ForeignKey('foia.FOIACommunication', related_name='emails')
     sent_datetime = models.DateTimeField()
+    # outgoing emails are queued and sent by a worker
+    status = models.CharField(
+            max_length=6,
+            blank=True,
+            choices=EMAIL_STATUS,
+            editable=False,
+            )
     confirmed_datetime = models.DateTimeField(blank=True, null=True)
     from_email = models.ForeignKey(
             EmailAddress,
@@ -392,6 +392,19 @@ class FOIARequestAdmin(VersionAdmin):
         if not change:
             obj.save()
 
+    def changelist_view(self, request, extra_context=None):
+        """Show the document cloud queue depth"""
+        extra_context = extra_context or {}
+        doccloud_queue = dict(FOIAFile.objects
+                .filter(doccloud_status__in=['pending', 'uploading', 'failed'])
+                .order_by()
+                .values_list('doccloud_status')
+                .annotate(Count('pk')))
+        extra_context['doccloud_queue'] = doccloud_queue
+        extra_context['doccloud_due'] = FOIAFile.objects.doccloud_due().count()
+        return super(FOIARequestAdmin, self).changelist_view(
+                request, extra_context=extra_context)
+
     def save_formset(self, request, form, formset, change):
         """Actions to take while saving inline instances"""
         # pylint: disable=no-self-use
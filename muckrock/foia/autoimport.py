@@ -0,0 +1,480 @@
+"""
+Automatically import scanned documents from S3
+
+Scans are named with the requests they belong to and a status code.  A run
+first lists the scans folder and parses every name into a manifest.  The scans
+are then copied into the storage bucket by a pool of threads, the
+communications and files are created in the database, and finally the scans
+are deleted.  Each step is checkpointed in the database, so a run which is cut
+off by its time limit is picked up by the next run where it stopped.  Scans
+whose contents are already stored, going by the md5 S3 keeps for them, are
+not copied again.
+"""
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.crypto import get_random_string
+
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from multiprocessing.dummy import Pool as ThreadPool
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from muckrock.communication.models import MailCommunication
+from muckrock.foia.codes import CODES
+from muckrock.foia.models import (
+        AutoImportCheckpoint,
+        FOIACommunication,
+        FOIAFile,
+        FOIARequest,
+        )
+from muckrock.utils import generate_status_action
+
+logger = logging.getLogger(__name__)
+
+P_NAME = re.compile(
+        r'(?P<month>\d\d?)-(?P<day>\d\d?)-(?P<year>\d\d) '
+        r'(?P<docs>(?:mr\d+ )+)(?P<code>[a-z-]+)(?:\$(?P<arg>\S+))?'
+        r'(?: ID#(?P<id>\S+))?'
+        r'(?: EST(?P<estm>\d\d?)-(?P<estd>\d\d?)-(?P<esty>\d\d))?'
+        , re.I)
+
+ScanEntry = namedtuple(
+        'ScanEntry',
+        'key foia_pks file_date code title status body arg id_ est_date objects',
+        )
+
+
+class SizeError(Exception):
+    """Uploaded file is not the correct size"""
+
+
+def parse_name(name):
+    """Parse a file name"""
+    # strip off trailing / and file extension
+    name = os.path.normpath(name)
+    name = os.path.splitext(name)[0]
+
+    m_name = P_NAME.match(name)
+    if not m_name:
+        raise ValueError('ERROR: %s does not match the file name format' % name)
+    code = m_name.group('code').upper()
+    if code not in CODES:
+        raise ValueError('ERROR: %s uses an unknown code' % name)
+    foia_pks = [int(pk[2:]) for pk in m_name.group('docs').split()]
+    file_date = datetime(int(m_name.group('year')) + 2000,
+                         int(m_name.group('month')),
+                         int(m_name.group('day')))
+    title, status, body = CODES[code]
+    arg = m_name.group('arg')
+    id_ = m_name.group('id')
+    if m_name.group('esty'):
+        est_date = date(int(m_name.group('esty')) + 2000,
+                        int(m_name.group('estm')),
+                        int(m_name.group('estd')))
+    else:
+        est_date = None
+
+    return (foia_pks, file_date, code, title,
+            status, body, arg, id_, est_date)
+
+
+def s3_copy(bucket, key_or_pre, dest_name):
+    """Copy an s3 key or prefix"""
+
+    if key_or_pre.name.endswith('/'):
+        for key in bucket.list(prefix=key_or_pre.name, delimiter='/'):
+            if key.name == key_or_pre.name:
+                key.copy(bucket, dest_name)
+                continue
+            s3_copy(bucket, key, '%s/%s' % (
+                dest_name,
+                os.path.basename(os.path.normpath(key.name))
+            ))
+    else:
+        key_or_pre.copy(bucket, dest_name)
+
+
+def key_md5(key):
+    """The md5 of a key's contents, if S3 knows it"""
+    etag = (key.etag or '').strip('"')
+    # the etag of a multipart upload is not the md5 of its contents
+    return etag if '-' not in etag else ''
+
+
+def s3_delete(bucket, key_or_pre):
+    """Delete an s3 key or prefix"""
+
+    if key_or_pre.name.endswith('/'):
+        for key in bucket.list(prefix=key_or_pre.name, delimiter='/'):
+            if key.name == key_or_pre.name:
+                bucket.delete_key(key.name)
+                continue
+            s3_delete(bucket, key)
+    else:
+        bucket.delete_key(key_or_pre.name)
+
+
+class AutoImporter(object):
+    """Imports the scans folder of the autoimport bucket"""
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, connect, log, workers=8):
+        self.connect = connect
+        self.log = log
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reserved_names = set()
+        self.manifest = []
+        self.checkpoints = {}
+        self.foias = {}
+        self.failed = set()
+        self.copied_count = 0
+        self.copied_bytes = 0
+        self.deduped_count = 0
+        self.start_time = None
+
+    def _buckets(self):
+        """Boto connections are not thread safe, so each thread opens its
+        own connection to the autoimport and storage buckets"""
+        if not hasattr(self._local, 'buckets'):
+            self._local.buckets = self.connect()
+        return self._local.buckets
+
+    @property
+    def bucket(self):
+        """The autoimport bucket, for this thread"""
+        return self._buckets()[0]
+
+    @property
+    def storage_bucket(self):
+        """The storage bucket, for this thread"""
+        return self._buckets()[1]
+
+    def review(self, key):
+        """Move a scan to the review folder for a human to look at"""
+        s3_copy(self.bucket, key, 'review/%s' % key.name[6:])
+
+    def run(self):
+        """Import all of the scans"""
+        self.start_time = time.time()
+        try:
+            self.build_manifest()
+            self.load_checkpoints()
+            self.copy()
+            self.commit()
+            self.delete()
+        finally:
+            self.summarize()
+
+    def build_manifest(self):
+        """List and parse all of the scans"""
+        for key in self.bucket.list(prefix='scans/', delimiter='/'):
+            if key.name == 'scans/':
+                continue
+            # strip off 'scans/'
+            file_name = key.name[6:]
+            try:
+                parsed = parse_name(file_name)
+            except ValueError as exc:
+                self.review(key)
+                s3_delete(self.bucket, key)
+                self.log.append(unicode(exc))
+                continue
+
+            if key.name.endswith('/'):
+                objects = []
+                for sub_key in self.bucket.list(prefix=key.name, delimiter='/'):
+                    if sub_key.name == key.name:
+                        continue
+                    if sub_key.name.endswith('/'):
+                        self.log.append(
+                                'ERROR: nested directories not allowed: %s in %s'
+                                % (sub_key.name, key.name))
+                        continue
+                    objects.append(sub_key)
+            else:
+                objects = [key]
+            self.manifest.append(ScanEntry(key, *parsed, objects=objects))
+
+        foia_pks = set(pk for entry in self.manifest for pk in entry.foia_pks)
+        self.foias = (FOIARequest.objects
+                .select_related('agency')
+                .in_bulk(foia_pks))
+        for entry in self.manifest:
+            for foia_pk in entry.foia_pks:
+                if foia_pk not in self.foias:
+                    self.review(entry.key)
+                    self.fail(entry, foia_pk,
+                            'ERROR: %s references FOIA Request %s, but it does '
+                            'not exist' % (entry.key.name[6:], foia_pk))
+        logger.info('Autoimport manifest: %d scans', len(self.manifest))
+
+    def fail(self, entry, foia_pk, message):
+        """Do not import this scan into this request"""
+        self.failed.add((entry.key.name, foia_pk))
+        self.log.append(message)
+
+    def load_checkpoints(self):
+        """Load the progress from previous runs"""
+        scan_names = [entry.key.name for entry in self.manifest]
+        # the scans for any other checkpoints have already been deleted
+        (AutoImportCheckpoint.objects
+                .exclude(scan_name__in=scan_names)
+                .delete())
+        for checkpoint in AutoImportCheckpoint.objects.all():
+            self.checkpoints[(checkpoint.key_name, checkpoint.foia_id)] = (
+                    checkpoint)
+
+    def storage_name(self, key):
+        """Reserve a unique name in the storage bucket for a copy"""
+        file_name = os.path.split(key.name)[1]
+        field = FOIAFile._meta.get_field('ffile')
+        with self._lock:
+            name = default_storage.get_available_name(
+                    field.generate_filename(None, file_name))
+            while name in self._reserved_names:
+                root, ext = os.path.splitext(name)
+                name = default_storage.get_available_name(
+                        '%s_%s%s' % (root, get_random_string(7), ext))
+            self._reserved_names.add(name)
+        return name
+
+    def copy_key(self, unit):
+        """Copy a scan into the storage bucket - runs in the thread pool"""
+        entry, foia_pk, key = unit
+        try:
+            storage_name = self.storage_name(key)
+            # the key was listed on another thread's connection, so copy
+            # it by name using this thread's
+            new_key = self.storage_bucket.copy_key(
+                    storage_name, key.bucket.name, key.name)
+            new_key.set_acl('public-read')
+            copied = self.storage_bucket.get_key(storage_name)
+            if copied is None or copied.size != key.size:
+                raise SizeError(
+                        key.size, copied.size if copied is not None else 0)
+            return unit, storage_name, None
+        except Exception as exc: # pylint: disable=broad-except
+            return unit, None, exc
+
+    def copy(self):
+        """Copy all of the scans which have not been copied yet"""
+        units = [
+                (entry, foia_pk, key)
+                for entry in self.manifest
+                for foia_pk in entry.foia_pks
+                for key in entry.objects
+                if (entry.key.name, foia_pk) not in self.failed
+                and (key.name, foia_pk) not in self.checkpoints
+                ]
+        # scans which are already stored do not need to be copied
+        md5s = set(key_md5(key) for _, _, key in units) - set([''])
+        stored = dict(FOIAFile.objects
+                .filter(md5__in=md5s)
+                .exclude(ffile='')
+                .order_by('-pk')
+                .values_list('md5', 'ffile'))
+        to_copy = []
+        for entry, foia_pk, key in units:
+            if key_md5(key) in stored:
+                self.checkpoint(entry, foia_pk, key, stored[key_md5(key)])
+                self.deduped_count += 1
+            else:
+                to_copy.append((entry, foia_pk, key))
+        if not to_copy:
+            return
+        pool = ThreadPool(min(self.workers, len(to_copy)))
+        try:
+            for (entry, foia_pk, key), storage_name, exc in pool.imap_unordered(
+                    self.copy_key, to_copy):
+                if isinstance(exc, SizeError):
+                    self.review(key)
+                    self.fail(entry, foia_pk,
+                            'ERROR: %s was %s bytes and after uploaded was %s '
+                            'bytes - retry' % (key.name[6:], exc.args[0], exc.args[1]))
+                elif exc is not None:
+                    self.review(key)
+                    self.fail(entry, foia_pk,
+                            'ERROR: %s has caused an unknown error. %s'
+                            % (key.name[6:], exc))
+                    logger.error('Autoimport copy error: %s', exc)
+                else:
+                    self.checkpoint(entry, foia_pk, key, storage_name)
+                    self.copied_count += 1
+                    self.copied_bytes += key.size
+        finally:
+            pool.close()
+
+    def checkpoint(self, entry, foia_pk, key, storage_name):
+        """Record that a scan is in the storage bucket"""
+        self.checkpoints[(key.name, foia_pk)] = (
+                AutoImportCheckpoint.objects.create(
+                    scan_name=entry.key.name,
+                    key_name=key.name,
+                    foia_id=foia_pk,
+                    storage_name=storage_name,
+                    size=key.size,
+                    stage='copied',
+                    ))
+
+    def commit(self):
+        """Create the communications and files for the copied scans"""
+        for entry in self.manifest:
+            for foia_pk in entry.foia_pks:
+                if (entry.key.name, foia_pk) in self.failed:
+                    continue
+                checkpoints = [
+                        self.checkpoints.get((key.name, foia_pk))
+                        for key in entry.objects
+                        ]
+                if any(c is None for c in checkpoints):
+                    # not all of the scan was copied
+                    continue
+                if all(c.stage == 'committed' for c in checkpoints):
+                    continue
+                try:
+                    self.commit_entry(entry, self.foias[foia_pk], checkpoints)
+                except Exception as exc: # pylint: disable=broad-except
+                    self.review(entry.key)
+                    self.fail(entry, foia_pk,
+                            'ERROR: %s has caused an unknown error. %s'
+                            % (entry.key.name[6:], exc))
+                    logger.error('Autoimport error: %s', exc, exc_info=sys.exc_info())
+
+    def commit_entry(self, entry, foia, checkpoints):
+        """Import a scan into a request"""
+        with transaction.atomic():
+            from_user = foia.agency.get_user() if foia.agency else None
+            comm = FOIACommunication.objects.create(
+                foia=foia,
+                from_user=from_user,
+                to_user=foia.user,
+                response=True,
+                date=entry.file_date,
+                communication=entry.body,
+                status=entry.status,
+                )
+            MailCommunication.objects.create(
+                    communication=comm,
+                    sent_datetime=entry.file_date,
+                    )
+
+            foia.status = entry.status or foia.status
+            if foia.status in ['partial', 'done', 'rejected', 'no_docs']:
+                foia.date_done = entry.file_date.date()
+            if entry.code == 'FEE' and entry.arg:
+                foia.price = Decimal(entry.arg)
+            if entry.id_:
+                foia.tracking_id = entry.id_
+            if entry.est_date:
+                foia.date_estimate = entry.est_date
+            if entry.code == 'REJ-P':
+                foia.proxy_reject()
+
+            access = 'private' if foia.embargo else 'public'
+            source = comm.get_source()
+            files = []
+            for key, checkpoint in zip(entry.objects, checkpoints):
+                file_name = os.path.split(checkpoint.key_name)[1]
+                foia_file = FOIAFile(
+                        foia=foia,
+                        comm=comm,
+                        title=file_name if len(checkpoints) > 1 else entry.title,
+                        date=comm.date,
+                        source=source,
+                        access=access,
+                        )
+                foia_file.ffile.name = checkpoint.storage_name
+                foia_file.md5 = key_md5(key)
+                # reuse the document and text of the file this scan duplicates
+                original = foia_file.get_original()
+                shared = (original is not None and
+                        original.ffile.name == checkpoint.storage_name)
+                if shared:
+                    foia_file.dedupe(original)
+                foia_file.save()
+                if shared:
+                    foia_file.copy_text(original)
+                files.append(foia_file)
+                self.log.append(
+                        'SUCCESS: %s uploaded to FOIA Request %s with a status of %s'
+                        % (file_name, foia.pk, foia.status))
+
+            foia.save(comment='updated from autoimport files')
+            AutoImportCheckpoint.objects.filter(
+                    pk__in=[c.pk for c in checkpoints]).update(stage='committed')
+            for checkpoint in checkpoints:
+                checkpoint.stage = 'committed'
+
+            transaction.on_commit(lambda: self.notify(foia, comm, files))
+
+    def notify(self, foia, comm, files):
+        """Let the user know, and process the new files"""
+        # pylint: disable=no-self-use
+        # avoid circular imports
+        from muckrock.foia.tasks import extract_file_text, upload_document_cloud
+        action = generate_status_action(foia)
+        foia.notify(action)
+        foia.update(comm.anchor())
+        for foia_file in files:
+            if not foia_file.doc_id:
+                upload_document_cloud.apply_async(
+                        args=[foia_file.pk, False], countdown=3)
+        file_pks = [f.pk for f in files if f.get_text() is None]
+        if file_pks:
+            extract_file_text.apply_async(args=[file_pks], countdown=3)
+
+    def delete_entry(self, entry):
+        """Delete a scan - runs in the thread pool"""
+        try:
+            s3_delete(self.bucket, entry.key)
+            return entry, None
+        except Exception as exc: # pylint: disable=broad-except
+            return entry, exc
+
+    def delete(self):
+        """Delete the scans which have been fully processed"""
+        done = []
+        for entry in self.manifest:
+            if all(
+                    (entry.key.name, foia_pk) in self.failed or all(
+                        (key.name, foia_pk) in self.checkpoints and
+                        self.checkpoints[(key.name, foia_pk)].stage == 'committed'
+                        for key in entry.objects)
+                    for foia_pk in entry.foia_pks):
+                done.append(entry)
+        if not done:
+            return
+        pool = ThreadPool(min(self.workers, len(done)))
+        try:
+            for entry, exc in pool.imap_unordered(self.delete_entry, done):
+                if exc is not None:
+                    logger.error('Autoimport delete error: %s %s',
+                            entry.key.name, exc)
+                    continue
+                AutoImportCheckpoint.objects.filter(
+                        scan_name=entry.key.name).delete()
+        finally:
+            pool.close()
+
+    def summarize(self):
+        """Add the throughput of the run to the log"""
+        elapsed = time.time() - self.start_time
+        self.log.append(
+                'Copied %d files (%.1f MB) in %.1f seconds (%.2f MB/s), '
+                '%d files were already stored' % (
+                    self.copied_count,
+                    self.copied_bytes / 1024.0 / 1024.0,
+                    elapsed,
+                    self.copied_bytes / 1024.0 / 1024.0 / elapsed
+                    if elapsed else 0,
+                    self.deduped_count,
+                    ))
@@ -0,0 +1,127 @@
+"""
+Serving the machine learning status classifier
+
+Unpickling the vectorizer, selector and classifier takes far longer than
+making a prediction, so the model is loaded lazily once per process and only
+reloaded when the pickle file or the configured model version changes.
+"""
+
+from django.conf import settings
+
+import dill as pickle
+import hashlib
+import logging
+import numpy as np
+import os
+import threading
+import time
+from scipy.sparse import hstack
+
+logger = logging.getLogger(__name__)
+
+
+class StatusClassifier(object):
+    """Loads the pickled classifier once and uses it to predict statuses"""
+
+    def __init__(self, path=None, version=None):
+        self._path = path
+        self._version = version
+        self._lock = threading.Lock()
+        self._model = None
+        self._signature = None
+        self.model_hash = None
+        self.load_count = 0
+        self.load_time = 0.0
+        self.predict_count = 0
+        self.predict_time = 0.0
+
+    @property
+    def path(self):
+        """Path to the pickled model"""
+        return self._path or settings.CLASSIFIER_PATH
+
+    @property
+    def version(self):
+        """The configured model version"""
+        if self._version is not None:
+            return self._version
+        return settings.CLASSIFIER_VERSION
+
+    def _current_signature(self):
+        """Identifies the model on disk, changes when it should be reloaded"""
+        stat = os.stat(self.path)
+        return (stat.st_mtime, stat.st_size, self.version)
+
+    def _load(self, signature):
+        """Unpickle the model"""
+        start = time.time()
+        with open(self.path, 'rb') as pkl_fp:
+            data = pkl_fp.read()
+        self._model = pickle.loads(data)
+        self._signature = signature
+        self.model_hash = hashlib.md5(data).hexdigest()
+        self.load_count += 1
+        self.load_time = time.time() - start
+        logger.info(
+                'Loaded status classifier %s (version %s, md5 %s) in %.2fs',
+                self.path,
+                self.version,
+                self.model_hash,
+                self.load_time,
+                )
+
+    def get_model(self):
+        """Get the vectorizer, selector and classifier, loading them if needed"""
+        signature = self._current_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._load(signature)
+        return self._model
+
+    def predict(self, text, pages):
+        """Predict the status for a communication's text and page count"""
+        return self.predict_batch([text], [pages])[0]
+
+    def predict_batch(self, texts, pages):
+        """
+        Predict the statuses for many communications in a single vectorized
+        pass.  Returns a list of status and probability pairs.
+        """
+        vectorizer, selector, classifier = self.get_model()
+        start = time.time()
+        input_vect = vectorizer.transform(texts)
+        pages_vect = np.array([pages], dtype=np.float).transpose()
+        input_vect = hstack([input_vect, pages_vect])
+        input_vect = selector.transform(input_vect)
+        probs = classifier.predict_proba(input_vect)
+        best = probs.argmax(axis=1)
+        results = [
+                (classifier.classes_[col], probs[row, col])
+                for row, col in enumerate(best)
+                ]
+        elapsed = time.time() - start
+        self.predict_count += len(texts)
+        self.predict_time += elapsed
+        logger.info(
+                'Status prediction for %d communications took %.3fs',
+                len(texts),
+                elapsed,
+                )
+        return results
+
+    def stats(self):
+        """Load and prediction timings for monitoring"""
+        return {
+                'model_hash': self.model_hash,
+                'load_count': self.load_count,
+                'load_time': self.load_time,
+                'predict_count': self.predict_count,
+                'predict_time': self.predict_time,
+                'average_predict_time':
+                    self.predict_time / self.predict_count
+                    if self.predict_count else 0,
+                }
+
+
+status_classifier = StatusClassifier()
@@ -0,0 +1,150 @@
+"""
+Bulk recomputation of due dates and follow up dates for open requests
+
+When holidays or a jurisdiction's day rules change, the dates already set on
+open requests are out of date.  FOIARequest.update_dates would fix them one at
+a time, saving each request and creating a revision for it.  This computes the
+new dates for all open requests with a single calendar per jurisdiction and
+writes them back in chunked UPDATE statements.
+"""
+
+from django.db.models import DateField, Max, Q
+
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import groupby
+import logging
+
+from muckrock.foia.models import FOIARequest
+from muckrock.foia.models.request import followup_days
+from muckrock.jurisdiction.models import Jurisdiction
+from muckrock.models import bulk_update_values
+
+logger = logging.getLogger(__name__)
+
+# statuses where the due date is counting down
+OPEN_STATUS = ['ack', 'processed', 'appealing']
+# statuses where the count down is paused
+PAUSED_STATUS = ['fix', 'payment']
+# statuses which are followed up on
+FOLLOWUP_STATUS = ['ack', 'processed']
+
+DateChange = namedtuple(
+        'DateChange',
+        'pk jurisdiction_id old_due new_due old_followup new_followup',
+        )
+
+
+def compute_dates(row, calendar, days, level):
+    """
+    Compute the due date and follow up date for a request, following the
+    same rules as FOIARequest.update_dates
+    """
+    (_, _, status, date_submitted, date_due, date_followup,
+            date_estimate, last_comm_date, due_date_moved) = row
+    # due dates which were paused or set by hand can no longer be derived
+    # from the submit date, so they are kept
+    new_due = date_due
+    if (status in OPEN_STATUS and date_submitted and days and
+            not due_date_moved):
+        new_due = calendar.business_days_from(date_submitted, days)
+
+    if status not in FOLLOWUP_STATUS:
+        return new_due, None
+    # the follow up date only needs to move with the due date, and follow
+    # ups waiting on a future estimate do not depend on it
+    if (new_due == date_due or new_due is None or last_comm_date is None or
+            (date_estimate and date_estimate > date.today())):
+        return new_due, date_followup
+    new_followup = last_comm_date.date() + timedelta(followup_days(
+        status,
+        date_estimate,
+        days,
+        level,
+        ))
+    if new_due > new_followup:
+        new_followup = new_due
+    # like update_dates, never move the follow up date earlier
+    if date_followup and date_followup >= new_followup:
+        return new_due, date_followup
+    return new_due, new_followup
+
+
+def recompute_dates(jurisdiction_ids=None, dry_run=False, chunk_size=500):
+    """
+    Recompute the due and follow up dates for open requests, optionally only
+    in the given jurisdictions (and their local jurisdictions).
+    Returns a list of the changes, which are only saved if not a dry run.
+    """
+    foias = FOIARequest.objects.filter(status__in=OPEN_STATUS + PAUSED_STATUS)
+    if jurisdiction_ids is not None:
+        foias = foias.filter(
+                Q(jurisdiction__in=jurisdiction_ids) |
+                Q(jurisdiction__parent__in=jurisdiction_ids)
+                )
+    rows = (foias
+            .annotate(last_comm_date=Max('communications__date'))
+            .order_by('jurisdiction_id')
+            .values_list(
+                'pk',
+                'jurisdiction_id',
+                'status',
+                'date_submitted',
+                'date_due',
+                'date_followup',
+                'date_estimate',
+                'last_comm_date',
+                'due_date_moved',
+                ))
+
+    # the registry makes the calendars cheap, but get_days needs the parent
+    jurisdictions = (Jurisdiction.objects
+            .select_related('parent')
+            .filter(pk__in=foias.values('jurisdiction_id'))
+            .in_bulk())
+
+    changes = []
+    for jurisdiction_id, group in groupby(rows.iterator(), lambda r: r[1]):
+        jurisdiction = jurisdictions[jurisdiction_id]
+        calendar = jurisdiction.get_calendar()
+        days = jurisdiction.get_days()
+        level = jurisdiction.level
+        for row in group:
+            new_due, new_followup = compute_dates(row, calendar, days, level)
+            if new_due != row[4] or new_followup != row[5]:
+                changes.append(DateChange(
+                    row[0],
+                    jurisdiction_id,
+                    row[4],
+                    new_due,
+                    row[5],
+                    new_followup,
+                    ))
+
+    logger.info(
+            'Recomputed request dates, %d changes%s',
+            len(changes),
+            ' (dry run)' if dry_run else '',
+            )
+    if not dry_run:
+        for i in xrange(0, len(changes), chunk_size):
+            _update_chunk(changes[i:i + chunk_size])
+    return changes
+
+
+def _update_chunk(changes):
+    """Write a chunk of changes back in a single UPDATE statement"""
+    # this does not call save, so no revisions are created
+    foias = FOIARequest.objects.all()
+    bulk_update_values(
+            foias,
+            'date_due',
+            {c.pk: c.new_due for c in changes},
+            DateField(),
+            )
+    bulk_update_values(
+            foias,
+            'date_followup',
+            {c.pk: c.new_followup for c in changes},
+            DateField(),
+            )
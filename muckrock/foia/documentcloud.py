@@ -0,0 +1,209 @@
+"""
+A client for the DocumentCloud API, and bulk synchronization with it
+
+All DocumentCloud requests go through a single client, which keeps a pool of
+authenticated keep-alive connections, retries failed idempotent requests with
+backoff, and can run batches of requests with bounded concurrency.
+
+Instead of asking DocumentCloud about each uploaded document without a page
+count separately, page through our account's documents in large batches and
+update the page counts in bulk.  The current page is kept in the cache, so a
+run which is cut off by its time limit picks up where it left off.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import IntegerField
+
+from multiprocessing.dummy import Pool as ThreadPool
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+from urllib import quote_plus
+import logging
+import requests
+import threading
+
+from muckrock.foia.models import FOIAFile
+from muckrock.models import bulk_update_values
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = 'foia:document_cloud_pages_cursor'
+
+
+class DocumentCloudClient(object):
+    """Talks to the DocumentCloud API over a shared pool of connections"""
+
+    def __init__(self, api_url=None, concurrency=None, timeout=60):
+        self._api_url = api_url
+        self._concurrency = concurrency
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def api_url(self):
+        """The base url of the API"""
+        return self._api_url or settings.DOCUMENTCLOUD_API_URL
+
+    @property
+    def concurrency(self):
+        """The most requests to make at once in a batch"""
+        return self._concurrency or settings.DOCUMENTCLOUD_CONCURRENCY
+
+    @property
+    def session(self):
+        """The shared session, created the first time it is needed"""
+        with self._lock:
+            if self._session is None:
+                self._session = self.make_session()
+            return self._session
+
+    def make_session(self):
+        """An authenticated session which retries failed requests"""
+        session = requests.Session()
+        session.auth = (
+                settings.DOCUMENTCLOUD_USERNAME,
+                settings.DOCUMENTCLOUD_PASSWORD,
+                )
+        # uploads are not retried here, as a retry could upload the
+        # document twice - they have their own retry schedule
+        retry = Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=[500, 502, 503, 504],
+                method_whitelist=['GET', 'PUT'],
+                )
+        adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=self.concurrency,
+                max_retries=retry,
+                )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, path, **kwargs):
+        """Make a request to the API, raising an error on failure"""
+        kwargs.setdefault('timeout', self.timeout)
+        resp = self.session.request(
+                method, '%s%s' % (self.api_url, path), **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    def _document_path(self, doc_id):
+        """The path for a document"""
+        return '/documents/%s.json' % quote_plus(doc_id.encode('utf8'))
+
+    def upload(self, params):
+        """Upload a document, returning its new doc id"""
+        return self.request('POST', '/upload.json', data=params).json()['id']
+
+    def update(self, doc_id, params):
+        """Update a document's metadata"""
+        self.request('PUT', self._document_path(doc_id), data=params)
+
+    def get_document(self, doc_id):
+        """Get a document's information"""
+        return self.request('GET', self._document_path(doc_id)).json()['document']
+
+    def get_text(self, doc_id):
+        """Get a document's text and page count"""
+        document = self.get_document(doc_id)
+        resp = self.session.get(
+                document['resources']['text'], timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.content.decode('utf8'), document['pages']
+
+    def search(self, query, page=1, per_page=1000):
+        """Get a page of documents matching a search"""
+        return self.request(
+                'GET',
+                '/search.json',
+                params={'q': query, 'page': page, 'per_page': per_page},
+                ).json()['documents']
+
+    def batch(self, func, items):
+        """
+        Call func on each item, with at most `concurrency` requests in
+        flight.  Returns a list with the result for each item, or the
+        error if the request failed.
+        """
+        def call(item):
+            """Catch the errors, so one failure does not stop the batch"""
+            try:
+                return func(item)
+            except (requests.exceptions.RequestException, ValueError, KeyError) as exc:
+                logger.warn('Doc Cloud batch error for %s: %s', item, exc)
+                return exc
+        pool = ThreadPool(min(self.concurrency, len(items)) or 1)
+        try:
+            return pool.map(call, items)
+        finally:
+            pool.close()
+
+    def set_access(self, doc_ids, access):
+        """Set the access level on many documents at once"""
+        return self.batch(
+                lambda doc_id: self.update(doc_id, {'access': access}),
+                doc_ids,
+                )
+
+
+doccloud_client = DocumentCloudClient()
+
+
+def sync_pages(per_page=1000, client=None):
+    """
+    Set the page counts for all files which have been uploaded to
+    DocumentCloud but do not have one yet.  Returns the number of files
+    updated.
+    """
+    candidates = dict(FOIAFile.objects
+            .filter(doccloud_status='uploaded')
+            .exclude(doc_id='')
+            .values_list('doc_id', 'pk'))
+    logger.info('Syncing document cloud pages, %d documents without pages',
+            len(candidates))
+    if not candidates:
+        cache.delete(CURSOR_KEY)
+        return 0
+
+    if client is None:
+        client = doccloud_client
+    page = cache.get(CURSOR_KEY, 1)
+    updated = 0
+    while candidates:
+        documents = client.search(
+                'account:%s' % settings.DOCUMENTCLOUD_ACCOUNT,
+                page=page,
+                per_page=per_page,
+                )
+        if not documents:
+            break
+        pages = {}
+        for document in documents:
+            if document['id'] in candidates and document['pages']:
+                pages[candidates.pop(document['id'])] = document['pages']
+        updated += update_pages(pages, doccloud=True)
+        page += 1
+        cache.set(CURSOR_KEY, page, None)
+
+    cache.delete(CURSOR_KEY)
+    logger.info('Synced document cloud pages, %d documents updated', updated)
+    return updated
+
+
+def update_pages(pages, doccloud=False):
+    """
+    Set the page counts for a dictionary of file pks to page counts.
+    Page counts from document cloud replace any counted locally, while
+    local page counts only fill in missing ones.
+    """
+    files = FOIAFile.objects.all()
+    extra = {}
+    if doccloud:
+        extra['doccloud_status'] = 'pages_known'
+    else:
+        files = files.filter(pages=0)
+    return bulk_update_values(files, 'pages', pages, IntegerField(), **extra)
@@ -0,0 +1,178 @@
+"""
+Local page counting and text extraction for uploaded files
+
+Files used to have no page count or text until document cloud had processed
+them, which could take an hour or more.  PDFs and DOCX files are now read
+locally as soon as they are uploaded.  Parsing untrusted documents can be slow
+or use a lot of memory, so it is done in a pool of worker processes, with a
+memory cap on each worker and a timeout on each file.
+"""
+
+from django.conf import settings
+
+from billiard import Pool
+from billiard.exceptions import TimeoutError as PoolTimeoutError
+from cStringIO import StringIO
+from lxml import etree
+from PyPDF2 import PdfFileReader
+from PyPDF2.utils import PyPdfError
+import logging
+import os
+import resource
+import threading
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+WORD_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+APP_NS = ('http://schemas.openxmlformats.org/officeDocument/2006/'
+        'extended-properties')
+
+
+class ExtractionError(Exception):
+    """The file could not be read"""
+
+
+def extract_pdf(data):
+    """Get the text and page count from a PDF"""
+    try:
+        reader = PdfFileReader(StringIO(data), strict=False)
+        if reader.isEncrypted:
+            # most encrypted PDFs only restrict editing, with an empty password
+            reader.decrypt('')
+        pages = []
+        for page in reader.pages:
+            pages.append(page.extractText())
+    except (PyPdfError, NotImplementedError, KeyError, ValueError) as exc:
+        raise ExtractionError(unicode(exc))
+    return u'\n'.join(pages), len(pages)
+
+
+def extract_docx(data):
+    """Get the text and page count from a DOCX file"""
+    try:
+        docx = zipfile.ZipFile(StringIO(data))
+        document = etree.fromstring(docx.read('word/document.xml'))
+        paragraphs = []
+        for para in document.iter('{%s}p' % WORD_NS):
+            paragraphs.append(u''.join(
+                node.text or u'' for node in para.iter('{%s}t' % WORD_NS)))
+        # the page count is only known to word, which saves it here
+        try:
+            app = etree.fromstring(docx.read('docProps/app.xml'))
+            pages = int(app.findtext('{%s}Pages' % APP_NS) or 0)
+        except (KeyError, ValueError):
+            pages = 0
+    except (zipfile.BadZipfile, KeyError, etree.XMLSyntaxError) as exc:
+        raise ExtractionError(unicode(exc))
+    return u'\n'.join(paragraphs), pages
+
+
+EXTRACTORS = {
+        '.pdf': extract_pdf,
+        '.docx': extract_docx,
+        }
+
+
+def can_extract(file_name):
+    """Is this a file we can read locally"""
+    _, ext = os.path.splitext(file_name)
+    return ext.lower() in EXTRACTORS
+
+
+def extract(file_name, data):
+    """
+    Get the text and page count from a file's contents, or None if the file
+    could not be read.  Runs inside the pool's worker processes.
+    """
+    _, ext = os.path.splitext(file_name)
+    extractor = EXTRACTORS.get(ext.lower())
+    if extractor is None:
+        return None
+    try:
+        return extractor(data)
+    except MemoryError:
+        logger.warn('Extraction ran out of memory: %s', file_name)
+        return None
+    except ExtractionError as exc:
+        logger.warn('Extraction error: %s: %s', file_name, exc)
+        return None
+
+
+def limit_memory(max_bytes):
+    """Cap the address space of a worker process"""
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+
+class ExtractionPool(object):
+    """A lazily started pool of worker processes for extracting files"""
+
+    def __init__(self, processes=None, timeout=None, memory_limit=None):
+        self._processes = processes
+        self._timeout = timeout
+        self._memory_limit = memory_limit
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def processes(self):
+        """Number of worker processes"""
+        return self._processes or settings.EXTRACTION_PROCESSES
+
+    @property
+    def timeout(self):
+        """Seconds to wait on a single file"""
+        return self._timeout or settings.EXTRACTION_TIMEOUT
+
+    @property
+    def memory_limit(self):
+        """Maximum bytes of memory for each worker process"""
+        return self._memory_limit or settings.EXTRACTION_MEMORY_LIMIT
+
+    def get_pool(self):
+        """Get the pool, starting it if needed"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = Pool(
+                        self.processes,
+                        initializer=limit_memory,
+                        initargs=(self.memory_limit,),
+                        # recycle workers to return fragmented memory
+                        maxtasksperchild=100,
+                        )
+            return self._pool
+
+    def terminate(self):
+        """Stop the pool, killing any workers stuck on a file"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+    def extract_files(self, files):
+        """
+        Extract the text and page count for (file name, data) pairs.
+        Returns a list with a (text, pages) pair, or None if the file could
+        not be read, for each file.
+        """
+        pool = self.get_pool()
+        results = [
+                pool.apply_async(extract, (file_name, data))
+                for file_name, data in files
+                ]
+        extracted = []
+        timed_out = False
+        for (file_name, _), result in zip(files, results):
+            try:
+                extracted.append(result.get(self.timeout))
+            except PoolTimeoutError:
+                logger.warn('Extraction timed out: %s', file_name)
+                extracted.append(None)
+                timed_out = True
+        if timed_out:
+            # a worker may still be stuck on the file
+            self.terminate()
+        return extracted
+
+
+extraction_pool = ExtractionPool()
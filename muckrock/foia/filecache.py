@@ -0,0 +1,140 @@
+"""
+A local cache of stored files
+
+The same files are read from S3 over and over - attached to every follow up
+and resend, sent with every fax retry and read again for text extraction.
+Files read through this cache are kept on local disk, named by the hash of
+their contents, and the least recently used files are removed once the cache
+grows past its size limit.  The directory may be shared by all of the
+processes on a machine.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from hashlib import sha1
+import os
+import shutil
+import tempfile
+
+STATS_KEY = 'foia:file_cache:%s'
+
+
+class FileCache(object):
+    """A size bounded, least recently used cache of stored files on disk"""
+
+    def __init__(self, directory=None, max_size=None):
+        self._directory = directory
+        self._max_size = max_size
+
+    @property
+    def directory(self):
+        """The directory the files are kept in"""
+        return self._directory or settings.FILE_CACHE_DIR
+
+    @property
+    def max_size(self):
+        """The most bytes to keep in the cache"""
+        return self._max_size or settings.FILE_CACHE_SIZE
+
+    def key(self, file_):
+        """Files are named by their contents when they have been hashed"""
+        return file_.md5 or sha1(file_.ffile.name.encode('utf8')).hexdigest()
+
+    def path(self, file_):
+        """The local path for a file - keep the extension for file type detection"""
+        _, ext = os.path.splitext(file_.ffile.name)
+        return os.path.join(self.directory, self.key(file_) + ext.lower())
+
+    def get_path(self, file_):
+        """Get the local path to a file, fetching it from storage if needed"""
+        path = self.path(file_)
+        try:
+            # mark it as recently used
+            os.utime(path, None)
+        except OSError:
+            self.count('misses')
+            self.fetch(file_, path)
+        else:
+            self.count('hits')
+        return path
+
+    def open(self, file_):
+        """Open a local copy of a file"""
+        return open(self.get_path(file_), 'rb')
+
+    def read(self, file_):
+        """Read a file's contents"""
+        with self.open(file_) as local_file:
+            return local_file.read()
+
+    def fetch(self, file_, path):
+        """Copy a file from storage into the cache, a chunk at a time"""
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # another process made it first
+                pass
+        # write to a temporary file first, so other processes never see
+        # a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as local_file:
+                with file_.ffile.storage.open(file_.ffile.name, 'rb') as ffile:
+                    shutil.copyfileobj(ffile, local_file, 64 * 1024)
+            os.rename(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used files until under the size limit,
+        other than the file which is about to be used
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp') or path == keep:
+                # still being fetched, or about to be used
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # another process removed it first
+                pass
+            total -= size
+
+    def count(self, stat):
+        """Count a hit or a miss"""
+        cache.add(STATS_KEY % stat, 0, None)
+        try:
+            cache.incr(STATS_KEY % stat)
+        except ValueError:
+            # the cache could not count for us
+            pass
+
+    def stats(self):
+        """The hits, misses and hit ratio of the cache"""
+        hits = cache.get(STATS_KEY % 'hits', 0)
+        misses = cache.get(STATS_KEY % 'misses', 0)
+        total = hits + misses
+        return {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': float(hits) / total if total else 0.0,
+                }
+
+
+file_cache = FileCache()
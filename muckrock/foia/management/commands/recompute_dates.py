@@ -0,0 +1,43 @@
+"""
+Recompute the due dates and follow up dates of all open requests
+"""
+
+from django.core.management.base import BaseCommand
+
+from muckrock.foia.dates import recompute_dates
+
+
+class Command(BaseCommand):
+    """Recompute request dates after holidays or day rules have changed"""
+    help = 'Recompute the due and follow up dates of open requests'
+
+    def add_arguments(self, parser):
+        """Add command line options"""
+        parser.add_argument(
+                'jurisdiction_ids',
+                nargs='*',
+                type=int,
+                help='Only recompute requests in these jurisdictions',
+                )
+        parser.add_argument(
+                '--dry-run',
+                action='store_true',
+                dest='dry_run',
+                default=False,
+                help='Report the changes without saving them',
+                )
+
+    def handle(self, *args, **kwargs):
+        """Recompute the dates and report the changes"""
+        changes = recompute_dates(
+                kwargs['jurisdiction_ids'] or None,
+                dry_run=kwargs['dry_run'],
+                )
+        for change in changes:
+            self.stdout.write(
+                    'FOIA %d (jurisdiction %d): due %s -> %s, follow up %s -> %s' %
+                    change)
+        self.stdout.write('%d requests %s' % (
+            len(changes),
+            'would be updated' if kwargs['dry_run'] else 'updated',
+            ))
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-20 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0039_auto_20171017_1023'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FOIAFileText',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('compressed_text', models.BinaryField()),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('content_hash', models.CharField(editable=False, max_length=40)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='text', to='foia.FOIAFile')),
+            ],
+            options={
+                'verbose_name': 'FOIA Document File Text',
+            },
+        ),
+    ]
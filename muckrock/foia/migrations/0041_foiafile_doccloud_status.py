@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-23 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Q
+
+from datetime import datetime
+import operator
+
+
+def set_doccloud_status(apps, schema_editor):
+    """Initialize the doc cloud status from the doc id and page count"""
+    FOIAFile = apps.get_model('foia', 'FOIAFile')
+    FOIAFile.objects.exclude(doc_id='').filter(pages__gt=0).update(
+            doccloud_status='pages_known')
+    FOIAFile.objects.exclude(doc_id='').filter(pages=0).update(
+            doccloud_status='uploaded')
+    doccloud = reduce(operator.or_, [
+        Q(ffile__iendswith=ext) for ext in ['.pdf', '.doc', '.docx']])
+    (FOIAFile.objects
+            .filter(doccloud, doc_id='')
+            .exclude(foia=None)
+            .update(
+                doccloud_status='pending',
+                doccloud_next_attempt=datetime.now(),
+                ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0040_foiafiletext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiafile',
+            name='doccloud_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='foiafile',
+            name='doccloud_next_attempt',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='foiafile',
+            name='doccloud_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('uploading', 'Uploading'), ('uploaded', 'Uploaded'), ('pages_known', 'Pages Known'), ('failed', 'Failed')], editable=False, max_length=11),
+        ),
+        migrations.AddIndex(
+            model_name='foiafile',
+            index=models.Index(fields=['doccloud_status', 'doccloud_next_attempt'], name='foia_file_doccloud_queue_idx'),
+        ),
+        migrations.RunPython(set_doccloud_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-24 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0041_foiafile_doccloud_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiamultirequest',
+            name='num_agencies',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='foiamultirequest',
+            name='num_submitted',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-25 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0042_foiamultirequest_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutoImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scan_name', models.CharField(db_index=True, max_length=255)),
+                ('key_name', models.CharField(max_length=255)),
+                ('storage_name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('stage', models.CharField(choices=[('copied', 'Copied'), ('committed', 'Committed')], max_length=9)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('foia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foia.FOIARequest')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='autoimportcheckpoint',
+            unique_together=set([('key_name', 'foia')]),
+        ),
+    ]
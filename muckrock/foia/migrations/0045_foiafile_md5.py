@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-25 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0044_foiarequest_date_followup_attempted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiafile',
+            name='md5',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='foiafile',
+            index=models.Index(fields=['md5'], name='foia_file_md5_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-28 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def mark_paused(apps, schema_editor):
+    """Requests which had a fix or payment communication were most likely
+    paused, and those currently paused certainly are"""
+    FOIARequest = apps.get_model('foia', 'FOIARequest')
+    (FOIARequest.objects
+            .filter(communications__status__in=['fix', 'payment'])
+            .update(due_date_paused=True))
+    (FOIARequest.objects
+            .exclude(days_until_due=None)
+            .update(due_date_paused=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0046_storagedeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiarequest',
+            name='due_date_paused',
+            field=models.BooleanField(default=False, editable=False, help_text='The due date count down has been paused, so the due date can no longer be derived from the submit date'),
+        ),
+        migrations.RunPython(mark_paused, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-28 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foia', '0047_foiarequest_due_date_paused'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foiafile',
+            name='text_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='foiafile',
+            name='text_next_attempt',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
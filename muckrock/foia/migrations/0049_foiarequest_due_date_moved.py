@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2017-10-28 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+import json
+
+
+def mark_moved(apps, schema_editor):
+    """Mark the requests whose revision history shows their due date was
+    paused, or was changed from one date to another, which is only done by
+    unpausing or by hand"""
+    FOIARequest = apps.get_model('foia', 'FOIARequest')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Version = apps.get_model('reversion', 'Version')
+    # communications are not a reliable sign of a pause, so start over
+    FOIARequest.objects.update(due_date_moved=False)
+    (FOIARequest.objects
+            .exclude(days_until_due=None)
+            .update(due_date_moved=True))
+    content_type = ContentType.objects.filter(
+            app_label='foia', model='foiarequest').first()
+    if content_type is None:
+        return
+    versions = (Version.objects
+            .filter(content_type=content_type, format='json')
+            .order_by('object_id', 'pk')
+            .values_list('object_id', 'serialized_data'))
+    moved = set()
+    last_id = last_due = None
+    for object_id, serialized_data in versions.iterator():
+        if object_id != last_id:
+            last_id, last_due = object_id, None
+        fields = json.loads(serialized_data)[0]['fields']
+        date_due = fields.get('date_due')
+        if (fields.get('status') in ('fix', 'payment') or
+                fields.get('days_until_due') is not None or
+                (last_due and date_due and date_due != last_due)):
+            moved.add(int(object_id))
+        last_due = date_due
+    moved = list(moved)
+    for i in xrange(0, len(moved), 1000):
+        (FOIARequest.objects
+                .filter(pk__in=moved[i:i + 1000])
+                .update(due_date_moved=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reversion', '0001_initial'),
+        ('foia', '0048_foiafile_text_attempts'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='foiarequest',
+            old_name='due_date_paused',
+            new_name='due_date_moved',
+        ),
+        migrations.AlterField(
+            model_name='foiarequest',
+            name='due_date_moved',
+            field=models.BooleanField(default=False, editable=False, help_text='The due date has been moved, by pausing the count down or by hand, so it can no longer be derived from the submit date'),
+        ),
+        migrations.RunPython(mark_moved, migrations.RunPython.noop),
+    ]
@@ -3,7 +3,6 @@
 Models for the FOIA application
 """
 
-from django.core.files.base import ContentFile
 from django.db import models
 from django.shortcuts import get_object_or_404
 
@@ -96,12 +95,7 @@ class FOIACommunication(models.Model):
 
     def save(self, *args, **kwargs):
         """Remove controls characters from text before saving"""
-        remove_control = dict.fromkeys(range(0, 9) + range(11, 13) + range(14, 32))
-        self.communication = unicode(self.communication).translate(remove_control)
-        # limit communication length to 150k
-        self.communication = self.communication[:150000]
-        # special handling for certain agencies
-        self._presave_special_handling()
+        self.clean_communication()
         # update foia's date updated if this is the latest communication
         if (self.foia and
                 (self.foia.date_updated is None or
@@ -110,6 +104,15 @@ class FOIACommunication(models.Model):
             self.foia.save(comment='update date_updated due to new comm')
         super(FOIACommunication, self).save(*args, **kwargs)
 
+    def clean_communication(self):
+        """Normalize the communication's text"""
+        remove_control = dict.fromkeys(range(0, 9) + range(11, 13) + range(14, 32))
+        self.communication = unicode(self.communication).translate(remove_control)
+        # limit communication length to 150k
+        self.communication = self.communication[:150000]
+        # special handling for certain agencies
+        self._presave_special_handling()
+
     def anchor(self):
         """Anchor name"""
         return 'comm-%d' % self.pk
@@ -130,7 +133,7 @@ class FOIACommunication(models.Model):
         the requests. Returns the moved and cloned communications.
         """
         # avoid circular imports
-        from muckrock.foia.tasks import upload_document_cloud
+        from muckrock.foia.tasks import extract_file_text, upload_document_cloud
         if not foia_pks:
             raise ValueError('Expected a request to move the communication to.')
         if not isinstance(foia_pks, list):
@@ -150,6 +153,9 @@ class FOIACommunication(models.Model):
             each_file.save()
             upload_document_cloud.apply_async(
                     args=[each_file.pk, change], countdown=3)
+        # files which already have their text are skipped
+        extract_file_text.apply_async(
+                args=[[f.pk for f in self.files.all()]], countdown=3)
         self.save()
         logger.info('Communication #%d moved to request #%d', self.id, self.foia.id)
         # if cloning happens, self gets overwritten. so we save it to a variable here
@@ -173,13 +179,14 @@ class FOIACommunication(models.Model):
         """
         # pylint: disable=too-many-locals
         # avoid circular imports
-        from muckrock.foia.tasks import upload_document_cloud
+        from muckrock.foia.models.file import FOIAFileText
+        from muckrock.foia.tasks import extract_file_text, upload_document_cloud
         request_list = FOIARequest.objects.filter(pk__in=foia_pks)
         if not request_list:
             raise ValueError('No valid request(s) provided for cloning.')
         cloned_comms = []
         original_pk = self.pk
-        files = self.files.all()
+        files = self.files.select_related('text')
         emails = self.emails.all()
         faxes = self.faxes.all()
         mails = self.mails.all()
@@ -197,18 +204,32 @@ class FOIACommunication(models.Model):
                 file_.comm = this_clone
                 file_.access = access
                 file_.source = this_clone.get_source()
-                # make a copy of the file on the storage backend
-                try:
-                    new_ffile = ContentFile(file_.ffile.read())
-                except ValueError:
-                    error_msg = ('FOIAFile #%s has no data in its ffile field. '
-                                'It has not been cloned.')
-                    logger.error(error_msg, original_file_id)
+                # the clone refers to the same stored file, which is only
+                # deleted from storage once no files refer to it
+                if not file_.ffile:
+                    logger.error('FOIAFile #%s has no data in its ffile field. '
+                            'It has not been cloned.', original_file_id)
                     continue
-                new_ffile.name = file_.ffile.name
-                file_.ffile = new_ffile
+                # files already on document cloud share the document and its
+                # page count, only files which are not need to be uploaded
+                if not file_.doc_id and file_.is_doccloud():
+                    file_.doccloud_status = 'pending'
+                    file_.doccloud_attempts = 0
+                    file_.doccloud_next_attempt = datetime.now()
                 file_.save()
-                upload_document_cloud.apply_async(args=[file_.pk, False], countdown=3)
+                if file_.doccloud_status == 'pending':
+                    upload_document_cloud.apply_async(
+                            args=[file_.pk, False], countdown=3)
+                # copy the extracted text instead of extracting it again
+                try:
+                    text = file_.text
+                except FOIAFileText.DoesNotExist:
+                    extract_file_text.apply_async(
+                            args=[[file_.pk]], countdown=3)
+                else:
+                    text.pk = None
+                    text.file = file_
+                    text.save()
             # clone all sub communications as well
             for comms in [emails, faxes, mails, web_comms]:
                 for comm in comms:
@@ -295,23 +316,28 @@ class FOIACommunication(models.Model):
     def upload_file(self, file_):
         """Upload and attach a file"""
         # avoid circular imports
-        from muckrock.foia.tasks import upload_document_cloud
+        from muckrock.foia.models.file import FOIAFile
+        from muckrock.foia.tasks import extract_file_text, upload_document_cloud
         # make orphans and embargoed documents private
         access = 'private' if not self.foia or self.foia.embargo else 'public'
         source = self.get_source()
 
-        foia_file = self.files.create(
+        foia_file = FOIAFile(
+                comm=self,
                 foia=self.foia,
                 title=os.path.splitext(file_.name)[0][:70],
                 date=datetime.now(),
                 source=source[:70],
                 access=access)
         # max db size of 255, - 22 for folder name
-        foia_file.ffile.save(file_.name[:233].encode('ascii', 'ignore'), file_)
-        foia_file.save()
-        if self.foia:
+        # files which were already stored reuse their document and text
+        foia_file.save_content(
+                file_.name[:233].encode('ascii', 'ignore'), file_)
+        if self.foia and not foia_file.doc_id:
             upload_document_cloud.apply_async(
                     args=[foia_file.pk, False], countdown=3)
+        if foia_file.get_text() is None:
+            extract_file_text.apply_async(args=[[foia_file.pk]], countdown=3)
 
     def create_agency_notifications(self):
         """Create the notifications for when an agency creates a new comm"""
@@ -327,9 +353,11 @@ class FOIACommunication(models.Model):
 
     def attach_files(self, msg):
         """Attach all of this communications files to the email message"""
+        # avoid circular imports
+        from muckrock.foia.filecache import file_cache
         for file_ in self.files.all():
             name = file_.name()
-            content = file_.ffile.read()
+            content = file_cache.read(file_)
             mimetype, _ = mimetypes.guess_type(name)
             if mimetype and mimetype.startswith('text/'):
                 enc = chardet.detect(content)['encoding']
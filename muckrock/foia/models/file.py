@@ -5,15 +5,71 @@ Models for the FOIA application
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
 
+from datetime import datetime
+from hashlib import md5, sha1
 import logging
+import operator
 import os
+import zlib
 
 from muckrock.foia.models.request import FOIARequest
 from muckrock.foia.models.communication import FOIACommunication
 
 logger = logging.getLogger(__name__)
 
+DOC_CLOUD_EXTENSIONS = ['.pdf', '.doc', '.docx']
+
+DOC_CLOUD_STATUS = (
+        ('pending', 'Pending'),
+        ('uploading', 'Uploading'),
+        ('uploaded', 'Uploaded'),
+        ('pages_known', 'Pages Known'),
+        ('failed', 'Failed'),
+        )
+
+
+class FOIAFileQuerySet(models.QuerySet):
+    """Object manager for FOIA files"""
+
+    def doccloud(self):
+        """Files which doc cloud can support"""
+        return self.filter(reduce(operator.or_, [
+            Q(ffile__iendswith=ext) for ext in DOC_CLOUD_EXTENSIONS]))
+
+    def doccloud_due(self):
+        """
+        Files which are due to be uploaded to doc cloud - either waiting
+        to be uploaded, or stuck uploading past their deadline
+        """
+        return self.filter(
+                doccloud_status__in=['pending', 'uploading'],
+                doccloud_next_attempt__lte=datetime.now(),
+                )
+
+    def doccloud_waiting(self):
+        """
+        Files whose text is still to come from doc cloud.  Files which failed
+        to upload will never have any, and are not waited on.
+        """
+        return (self
+                .doccloud()
+                .filter(
+                    doc_id='',
+                    text=None,
+                    doccloud_status__in=['pending', 'uploading'],
+                    ))
+
+
+def file_md5(content):
+    """Hash a file's contents a chunk at a time"""
+    hash_ = md5()
+    for chunk in content.chunks():
+        hash_.update(chunk)
+    content.seek(0)
+    return hash_.hexdigest()
+
 
 class FOIAFile(models.Model):
     """An arbitrary file attached to a FOIA request"""
@@ -31,6 +87,34 @@ class FOIAFile(models.Model):
     access = models.CharField(max_length=12, default='public', choices=access)
     doc_id = models.SlugField(max_length=80, blank=True, editable=False)
     pages = models.PositiveIntegerField(default=0, editable=False)
+    doccloud_status = models.CharField(
+            max_length=11,
+            blank=True,
+            choices=DOC_CLOUD_STATUS,
+            editable=False,
+            )
+    doccloud_attempts = models.PositiveSmallIntegerField(
+            default=0, editable=False)
+    doccloud_next_attempt = models.DateTimeField(
+            blank=True, null=True, editable=False)
+    # fetching the text once the document is in doc cloud
+    text_attempts = models.PositiveSmallIntegerField(
+            default=0, editable=False)
+    text_next_attempt = models.DateTimeField(
+            blank=True, null=True, editable=False)
+    # the hash of the contents, to find files which have already been stored
+    md5 = models.CharField(max_length=32, blank=True, editable=False)
+
+    objects = FOIAFileQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        """Queue new doc cloud files to be uploaded"""
+        # pylint: disable=arguments-differ
+        if (not self.doccloud_status and not self.doc_id and
+                self.foia_id and self.is_doccloud()):
+            self.doccloud_status = 'pending'
+            self.doccloud_next_attempt = datetime.now()
+        super(FOIAFile, self).save(*args, **kwargs)
 
     def __unicode__(self):
         return self.title
@@ -43,7 +127,7 @@ class FOIAFile(models.Model):
         """Is this a file doc cloud can support"""
 
         _, ext = os.path.splitext(self.ffile.name)
-        return ext.lower() in ['.pdf', '.doc', '.docx']
+        return ext.lower() in DOC_CLOUD_EXTENSIONS
 
     def get_thumbnail(self):
         """Get the url to the thumbnail image. If document is not public, use a generic fallback."""
@@ -96,11 +180,128 @@ class FOIAFile(models.Model):
         """Anchor name"""
         return 'file-%d' % self.pk
 
+    def get_text(self):
+        """Get the stored text for this file, or None if it has not been fetched"""
+        try:
+            return self.text.get_text()
+        except FOIAFileText.DoesNotExist:
+            return None
+
+    def get_original(self):
+        """Get the first file stored with the same contents as this one"""
+        if not self.md5:
+            return None
+        return (FOIAFile.objects
+                .filter(md5=self.md5)
+                .exclude(pk=self.pk)
+                .exclude(ffile='')
+                .select_related('text')
+                .order_by('pk')
+                .first())
+
+    def dedupe(self, original=None):
+        """
+        If a file with the same contents has already been stored, point this
+        file at it instead of storing it again.  Its page count is reused,
+        as is its document cloud document if it is in the same request and
+        has the same access.  Documents are not shared between requests, as
+        lifting one request's embargo would publish the other's file.
+        Returns the original file, or None if there is not one.
+        """
+        if original is None:
+            original = self.get_original()
+        if original is None:
+            return None
+        self.ffile.name = original.ffile.name
+        self.pages = self.pages or original.pages
+        if (original.doc_id and original.access == self.access and
+                original.get_foia() == self.get_foia()):
+            self.doc_id = original.doc_id
+            self.doccloud_status = original.doccloud_status
+            self.doccloud_next_attempt = None
+        return original
+
+    def save_content(self, name, content):
+        """
+        Store the contents for this file and save it, unless identical
+        contents are already stored.  Returns the original file if they were.
+        """
+        self.md5 = file_md5(content)
+        original = self.dedupe()
+        if original is None:
+            self.ffile.save(name, content, save=False)
+        self.save()
+        if original is not None:
+            self.copy_text(original)
+        return original
+
+    def copy_text(self, original):
+        """Copy the extracted text from another file with the same contents"""
+        try:
+            text = original.text
+        except FOIAFileText.DoesNotExist:
+            return None
+        return FOIAFileText.objects.create(
+                file=self,
+                compressed_text=text.compressed_text,
+                pages=text.pages,
+                content_hash=text.content_hash,
+                )
+
     class Meta:
         # pylint: disable=too-few-public-methods
         verbose_name = 'FOIA Document File'
         ordering = ['date']
         app_label = 'foia'
+        indexes = [
+                models.Index(
+                    fields=['doccloud_status', 'doccloud_next_attempt'],
+                    name='foia_file_doccloud_queue_idx',
+                    ),
+                models.Index(fields=['md5'], name='foia_file_md5_idx'),
+                models.Index(fields=['ffile'], name='foia_file_ffile_idx'),
+                ]
+
+
+class FOIAFileTextQuerySet(models.QuerySet):
+    """Object manager for file text"""
+
+    def store(self, file_, text, pages):
+        """Compress and store the text for a file"""
+        text = text.encode('utf8')
+        return self.update_or_create(
+                file=file_,
+                defaults={
+                    'compressed_text': zlib.compress(text),
+                    'pages': pages,
+                    'content_hash': sha1(text).hexdigest(),
+                    },
+                )[0]
+
+
+class FOIAFileText(models.Model):
+    """
+    The extracted text of a file - stored seperately for performance, and
+    compressed, so normal file queries do not load it
+    """
+    file = models.OneToOneField(FOIAFile, related_name='text')
+    compressed_text = models.BinaryField()
+    pages = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=40, editable=False)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    objects = FOIAFileTextQuerySet.as_manager()
+
+    def __unicode__(self):
+        return 'Text: %s' % self.file.title
+
+    def get_text(self):
+        """Decompress the text"""
+        return zlib.decompress(self.compressed_text).decode('utf8')
+
+    class Meta:
+        verbose_name = 'FOIA Document File Text'
+        app_label = 'foia'
 
 
 def attachment_path(instance, filename):
@@ -141,3 +342,61 @@ class OutboundAttachment(models.Model):
     def name(self):
         """Return the basename of the file"""
         return os.path.basename(self.ffile.name)
+
+
+class AutoImportCheckpoint(models.Model):
+    """
+    Progress importing a scanned file from S3 into a request, so an
+    interrupted autoimport can resume where it stopped
+    """
+
+    STAGES = (
+            ('copied', 'Copied'),
+            ('committed', 'Committed'),
+            )
+
+    # the top level key or prefix in the scans folder
+    scan_name = models.CharField(max_length=255, db_index=True)
+    key_name = models.CharField(max_length=255)
+    foia = models.ForeignKey(FOIARequest, related_name='+')
+    storage_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    stage = models.CharField(max_length=9, choices=STAGES)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return '%s: %s' % (self.key_name, self.stage)
+
+    class Meta:
+        app_label = 'foia'
+        unique_together = ('key_name', 'foia')
+
+
+class StorageDeletion(models.Model):
+    """
+    A stored file waiting to be deleted - they are deleted in bulk in the
+    background, once nothing refers to them any more
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return 'Delete: %s' % self.name
+
+    class Meta:
+        app_label = 'foia'
+
+
+def referenced_files(names):
+    """Get which of the stored file names are still referred to"""
+    referenced = set()
+    for model, field in [
+            (FOIAFile, 'ffile'),
+            (OutboundAttachment, 'ffile'),
+            (AutoImportCheckpoint, 'storage_name'),
+            ]:
+        referenced.update(model.objects
+                .filter(**{'%s__in' % field: names})
+                .values_list(field, flat=True))
+    return referenced
@@ -41,6 +41,9 @@ class FOIAMultiRequest(models.Model):
     num_org_requests = models.PositiveSmallIntegerField(default=0)
     num_monthly_requests = models.PositiveSmallIntegerField(default=0)
     num_reg_requests = models.PositiveSmallIntegerField(default=0)
+    # submission progress
+    num_agencies = models.PositiveIntegerField(default=0, editable=False)
+    num_submitted = models.PositiveIntegerField(default=0, editable=False)
 
     tags = TaggableManager(through=TaggedItemBase, blank=True)
 
@@ -55,6 +58,12 @@ class FOIAMultiRequest(models.Model):
                 'foia-multi-draft',
                 kwargs={'slug': self.slug, 'idx': self.pk})
 
+    def get_progress(self):
+        """Percentage of the agencies which have been submitted to"""
+        if not self.num_agencies:
+            return 0
+        return 100 * self.num_submitted / self.num_agencies
+
     class Meta:
         # pylint: disable=too-few-public-methods
         ordering = ['title']
@@ -7,11 +7,10 @@ Models for the FOIA application
 
 from django.conf import settings
 from django.contrib.auth.models import User, AnonymousUser
-from django.core.mail import EmailMultiAlternatives
 from django.core.urlresolvers import reverse
-from django.db import models, connection
+from django.db import models, connection, transaction
 from django.db.models import Q, Sum, Count, Max, Case, When
-from django.template.defaultfilters import escape, linebreaks, slugify
+from django.template.defaultfilters import slugify
 from django.template.loader import render_to_string
 
 from actstream.models import followers
@@ -187,6 +186,22 @@ STATUS = [
 
 END_STATUS = ['rejected', 'no_docs', 'done', 'partial', 'abandoned']
 
+def followup_days(status, date_estimate, jurisdiction_days, jurisdiction_level):
+    """How many days do we wait until we follow up?"""
+    if status == 'ack':
+        # if we have not at least been acknowledged yet, set the days
+        # to the period required by law
+        if jurisdiction_days is not None:
+            return jurisdiction_days
+    if date_estimate and date.today() < date_estimate:
+        # return the days until the estimated date
+        date_difference = date_estimate - date.today()
+        return date_difference.days
+    if jurisdiction_level == 'f':
+        return 30
+    else:
+        return 15
+
 class Action():
     """A helper class to provide interfaces for request actions"""
     # pylint: disable=too-many-arguments
@@ -219,7 +234,15 @@ class FOIARequest(models.Model):
     date_done = models.DateField(blank=True, null=True, verbose_name='Date response received')
     date_due = models.DateField(blank=True, null=True, db_index=True)
     days_until_due = models.IntegerField(blank=True, null=True)
+    due_date_moved = models.BooleanField(
+            default=False,
+            editable=False,
+            help_text='The due date has been moved, by pausing the count down '
+            'or by hand, so it can no longer be derived from the submit date',
+            )
     date_followup = models.DateField(blank=True, null=True)
+    date_followup_attempted = models.DateTimeField(
+            blank=True, null=True, editable=False)
     date_estimate = models.DateField(blank=True, null=True,
             verbose_name='Estimated Date Completed')
     date_processing = models.DateField(blank=True, null=True)
@@ -332,6 +355,15 @@ class FOIARequest(models.Model):
             comment = kwargs.pop('comment')
             if reversion.revision_context_manager.is_active():
                 reversion.set_comment(comment)
+        # the signal handlers compare the request to how it was saved before,
+        # so it is loaded once here for all of them
+        self.saved_request = self.get_saved() if self.pk is not None else None
+        # update_dates only sets the due date on first submit and when
+        # unpausing, so a due date changed from one date to another was
+        # set by hand
+        if (self.saved_request and self.saved_request.date_due and
+                self.date_due and self.date_due != self.saved_request.date_due):
+            self.due_date_moved = True
         super(FOIARequest, self).save(*args, **kwargs)
 
     def is_editable(self):
@@ -646,7 +678,7 @@ class FOIARequest(models.Model):
             estimate = 'none'
 
         self.communications.create(
-            from_user=User.objects.get(username='MuckrockStaff'),
+            from_user=utils.get_staff_user(),
             to_user=self.get_to_user(),
             date=datetime.now(),
             response=False,
@@ -745,6 +777,7 @@ class FOIARequest(models.Model):
 
     def _send_email(self, comm, **kwargs):
         """Send the message as an email"""
+        from muckrock.foia.tasks import send_email
 
         from_addr = self.get_mail_id()
         from_email, _ = EmailAddress.objects.get_or_create(
@@ -770,32 +803,18 @@ class FOIARequest(models.Model):
                 communication=comm,
                 sent_datetime=datetime.now(),
                 from_email=from_email,
+                status='queued',
                 )
         email_comm.to_emails.add(self.email)
         email_comm.cc_emails.set(self.cc_emails.all())
-        msg = EmailMultiAlternatives(
-                subject=comm.subject,
-                body=body,
-                from_email=str(from_email),
-                to=[str(self.email)],
-                cc=[str(e) for e in self.cc_emails.all()],
-                bcc=['diagnostics@muckrock.com'],
-                headers={
-                    'X-Mailgun-Variables':
-                    {'email_id': email_comm.pk},
-                    }
-                )
-        msg.attach_alternative(linebreaks(escape(body)), 'text/html')
-        # atach all files from the latest communication
-        comm.attach_files(msg)
-
-        msg.send(fail_silently=False)
-
-        email_comm.set_raw_email(msg.message())
+        # the attachments are read and the email is sent by a worker, once
+        # the email communication has been committed for it to load
+        transaction.on_commit(lambda: send_email.apply_async(
+            args=[email_comm.pk, comm.subject, body]))
 
     def _send_fax(self, comm, **kwargs):
         """Send the message as a fax"""
-        from muckrock.foia.tasks import send_fax
+        from muckrock.foia.tasks import fax_batch_countdown, send_fax
 
         context = {
                 'request': self,
@@ -810,7 +829,10 @@ class FOIARequest(models.Model):
                 kwargs.get('thanks'),
                 )
 
-        send_fax.apply_async(args=[comm.pk, comm.subject, body])
+        send_fax.apply_async(
+                args=[comm.pk, comm.subject, body],
+                countdown=fax_batch_countdown(self.fax),
+                )
 
     def _send_snail_mail(self, comm, **kwargs):
         """Send the message as a snail mail"""
@@ -875,6 +897,7 @@ class FOIARequest(models.Model):
                 last_datetime = datetime.now()
             self.days_until_due = cal.business_days_between(last_datetime.date(), self.date_due)
             self.date_due = None
+            self.due_date_moved = True
         self.save()
 
     def _update_followup_date(self):
@@ -893,20 +916,14 @@ class FOIARequest(models.Model):
 
     def _followup_days(self):
         """How many days do we wait until we follow up?"""
-        if self.status == 'ack' and self.jurisdiction:
-            # if we have not at least been acknowledged yet, set the days
-            # to the period required by law
-            jurisdiction_days = self.jurisdiction.get_days()
-            if jurisdiction_days is not None:
-                return jurisdiction_days
-        if self.date_estimate and date.today() < self.date_estimate:
-            # return the days until the estimated date
-            date_difference = self.date_estimate - date.today()
-            return date_difference.days
-        if self.jurisdiction and self.jurisdiction.level == 'f':
-            return 30
-        else:
-            return 15
+        if not self.jurisdiction:
+            return followup_days(self.status, self.date_estimate, None, None)
+        return followup_days(
+                self.status,
+                self.date_estimate,
+                self.jurisdiction.get_days() if self.status == 'ack' else None,
+                self.jurisdiction.level,
+                )
 
     def update_tags(self, tags):
         """Update the requests tags"""
@@ -991,7 +1008,7 @@ class FOIARequest(models.Model):
             ' from an out-of-state resident.'
             )
         self.notes.create(
-            author=User.objects.get(username='MuckrockStaff'),
+            author=utils.get_staff_user(),
             note='The request has been rejected with the agency stating that '
             'you must be a resident of the state. MuckRock is working with our '
             'in-state volunteers to refile this request, and it should appear '
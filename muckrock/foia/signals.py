@@ -3,58 +3,42 @@
 from django.conf import settings
 from django.db.models.signals import pre_save, post_delete
 
-from boto.s3.connection import S3Connection
-
-from muckrock.foia.models import FOIARequest, FOIAFile, OutboundAttachment
-from muckrock.foia.tasks import upload_document_cloud
+from muckrock.foia.models import (
+        FOIARequest,
+        FOIAFile,
+        OutboundAttachment,
+        StorageDeletion,
+        )
+from muckrock.foia.tasks import set_document_cloud_access
 
 
 def foia_update_embargo(sender, **kwargs):
     """When embargo has possibly been switched, update the document cloud permissions"""
     # pylint: disable=unused-argument
     request = kwargs['instance']
-    old_request = request.get_saved()
+    old_request = getattr(request, 'saved_request', None)
     # if we are saving a new FOIA Request, there are no docs to update
     if old_request and request.embargo != old_request.embargo:
         access = 'private' if request.embargo else 'public'
-        for doc in request.files.all():
-            if doc.is_doccloud() and doc.access != access:
-                doc.access = access
-                doc.save()
-                upload_document_cloud.apply_async(args=[doc.pk, True], countdown=3)
-
-
-def foia_file_delete_s3(sender, **kwargs):
-    """Delete file from S3 after the model is deleted"""
-    # pylint: disable=unused-argument
+        docs = request.files.doccloud().exclude(access=access)
+        doc_pks = list(docs.values_list('pk', flat=True))
+        if doc_pks:
+            docs.update(access=access)
+            set_document_cloud_access.apply_async(
+                    args=[doc_pks, access], countdown=3)
 
-    if settings.CLEAN_S3_ON_FOIA_DELETE:
-        # only delete if we are using s3
-        foia_file = kwargs['instance']
-
-        conn = S3Connection(settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY)
-        bucket = conn.get_bucket(settings.AWS_STORAGE_BUCKET_NAME)
-        key = bucket.get_key(foia_file.ffile.name)
-        if key:
-            key.delete()
 
-
-def attachment_delete_s3(sender, **kwargs):
-    """Delete file from S3 after the model is deleted"""
+def queue_storage_deletion(sender, **kwargs):
+    """Queue the file to be deleted from S3 after the model is deleted"""
     # pylint: disable=unused-argument
 
     if settings.CLEAN_S3_ON_FOIA_DELETE:
         # only delete if we are using s3
-        attachment = kwargs['instance']
-
-        conn = S3Connection(
-                settings.AWS_ACCESS_KEY_ID,
-                settings.AWS_SECRET_ACCESS_KEY,
-                )
-        bucket = conn.get_bucket(settings.AWS_STORAGE_BUCKET_NAME)
-        key = bucket.get_key(attachment.ffile.name)
-        if key:
-            key.delete()
+        ffile = kwargs['instance'].ffile
+        if ffile:
+            # files are only deleted from s3 once nothing refers to them,
+            # as they may be shared by clones and duplicate uploads
+            StorageDeletion.objects.get_or_create(name=ffile.name)
 
 
 pre_save.connect(
@@ -65,14 +49,14 @@ pre_save.connect(
 
 
 post_delete.connect(
-        foia_file_delete_s3,
+        queue_storage_deletion,
         sender=FOIAFile,
         dispatch_uid='muckrock.foia.signals.file_delete_s3',
         )
 
 
 post_delete.connect(
-        attachment_delete_s3,
+        queue_storage_deletion,
         sender=OutboundAttachment,
         dispatch_uid='muckrock.foia.signals.attachment_delete_s3',
         )
@@ -2,54 +2,76 @@
 
 from celery.exceptions import SoftTimeLimitExceeded
 from celery.schedules import crontab
+from celery import group
 from celery.task import periodic_task, task
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.files.storage import default_storage
-from django.core.mail import send_mail
+from django.core.cache import cache
+from django.core.mail import (
+        EmailMultiAlternatives,
+        get_connection,
+        send_mail,
+        send_mass_mail,
+        )
 from django.core.urlresolvers import reverse
-from django.template.defaultfilters import slugify
+from django.db import transaction
+from django.db.models import (
+        Case,
+        CharField,
+        DateTimeField,
+        F,
+        IntegerField,
+        Q,
+        Value,
+        When,
+        )
+from django.template.defaultfilters import escape, linebreaks, slugify
 from django.template.loader import render_to_string, get_template
 
-import dill as pickle
 import dbsettings
-import base64
-import json
 import logging
-import numpy as np
 import os
-import os.path
-import re
 import requests
+import smtplib
+import socket
 import sys
-import urllib2
+import time
+from boto.exception import BotoClientError, BotoServerError
 from boto.s3.connection import S3Connection
-from datetime import date, datetime
-from decimal import Decimal
+from boto.utils import parse_ts
+from datetime import date, datetime, timedelta
 from django_mailgun import MailgunAPIError
 from phaxio import PhaxioApi
 from phaxio.exceptions import PhaxioError
 from random import randint
 from raven import Client
 from raven.contrib.celery import register_logger_signal, register_signal
-from scipy.sparse import hstack
-from urllib import quote_plus
+from reversion import revisions as reversion
 
+from muckrock.accounts.counters import increment
 from muckrock.communication.models import (
+        EmailCommunication,
         FaxCommunication,
         FaxError,
-        MailCommunication,
         )
 from muckrock.foia.models import (
     FOIAFile,
+    FOIAFileText,
     FOIARequest,
     FOIAMultiRequest,
     FOIACommunication,
+    StorageDeletion,
+    referenced_files,
     )
-from muckrock.foia.codes import CODES
+from muckrock.foia import dates, documentcloud
+from muckrock.foia.autoimport import AutoImporter
+from muckrock.foia.classifier import status_classifier
+from muckrock.foia.extraction import can_extract, extraction_pool
+from muckrock.foia.filecache import file_cache
+from muckrock.foia.documentcloud import doccloud_client
+from muckrock.models import bulk_update_values
 from muckrock.task.models import ResponseTask
-from muckrock.utils import generate_status_action
-from muckrock.vendor import MultipartPostHandler
+from muckrock.utils import take_token
 
 foia_url = r'(?P<jurisdiction>[\w\d_-]+)-(?P<jidx>\d+)/(?P<slug>[\w\d_-]+)-(?P<idx>\d+)'
 
@@ -67,6 +89,33 @@ class FOIAOptions(dbsettings.Group):
             'whether to send automated followups or not on the weekends')
 foia_options = FOIAOptions()
 
+# how many agencies to create requests for at once in a multi request
+MULTI_REQUEST_CHUNK_SIZE = 50
+
+# how many requests to claim for follow ups at once
+FOLLOWUP_BATCH_SIZE = 500
+# the longest a follow up is delayed for - it must stay under the broker's
+# visibility timeout of an hour, or delayed tasks are delivered twice
+FOLLOWUP_MAX_COUNTDOWN = 50 * 60
+
+# how many expired embargoes to lift at once
+EMBARGO_BATCH_SIZE = 500
+
+# the email connection for this worker, reused between emails
+email_connection = {}
+
+# the storage bucket connection for this worker, reused between tasks
+storage_connection = {}
+# how many stored files to delete at once - the most S3 allows
+STORAGE_DELETE_BATCH_SIZE = 1000
+# how old an unreferenced stored file must be to be swept up
+ORPHAN_MIN_AGE = timedelta(days=7)
+
+# how long an upload may take before it is assumed to be stuck
+DOC_CLOUD_LEASE = timedelta(hours=1)
+# give up uploading a document after this many attempts
+DOC_CLOUD_MAX_ATTEMPTS = 10
+
 class MLOptions(dbsettings.Group):
     """DB settings for the machine learning"""
     enable = dbsettings.BooleanValue(
@@ -75,13 +124,10 @@ class MLOptions(dbsettings.Group):
             'minimum percent confidence level to automatically resolve')
 ml_options = MLOptions()
 
-def authenticate_documentcloud(request):
-    """This is just standard username/password encoding"""
-    username = settings.DOCUMENTCLOUD_USERNAME
-    password = settings.DOCUMENTCLOUD_PASSWORD
-    auth = base64.encodestring('%s:%s' % (username, password))[:-1]
-    request.add_header('Authorization', 'Basic %s' % auth)
-    return request
+def doccloud_backoff(attempts):
+    """How long to wait before the next upload attempt"""
+    return timedelta(seconds=(2 ** attempts) * 300 + randint(0, 300))
+
 
 @task(ignore_result=True, max_retries=10, name='muckrock.foia.tasks.upload_document_cloud')
 def upload_document_cloud(doc_pk, change, **kwargs):
@@ -106,43 +152,64 @@ def upload_document_cloud(doc_pk, change, **kwargs):
         logger.warn('Upload Doc Cloud: Changing without a doc id: %s', doc.pk)
         return
 
-    # these need to be encoded -> unicode to regular byte strings
+    if not change:
+        # claim the upload, so it is not uploaded more than once
+        claimed = (FOIAFile.objects
+                .filter(pk=doc.pk, doccloud_status='pending')
+                .update(
+                    doccloud_status='uploading',
+                    doccloud_attempts=F('doccloud_attempts') + 1,
+                    # if we have not finished by then, assume we are stuck
+                    doccloud_next_attempt=datetime.now() + DOC_CLOUD_LEASE,
+                    ))
+        if not claimed:
+            return
+        doc.refresh_from_db(fields=['doccloud_attempts'])
+
     params = {
-        'title': doc.title.encode('utf8'),
-        'source': doc.source.encode('utf8'),
-        'description': doc.description.encode('utf8'),
-        'access': doc.access.encode('utf8'),
+        'title': doc.title,
+        'source': doc.source,
+        'description': doc.description,
+        'access': doc.access,
         'related_article': ('https://www.muckrock.com' +
-                            doc.get_foia().get_absolute_url()).encode('utf8'),
+                            doc.get_foia().get_absolute_url()),
         }
-    if change:
-        params['_method'] = str('put')
-        url = '/documents/%s.json' % quote_plus(doc.doc_id.encode('utf-8'))
-    else:
-        params['file'] = doc.ffile.url.replace('https', 'http', 1)
-        url = '/upload.json'
-
-    opener = urllib2.build_opener(MultipartPostHandler.MultipartPostHandler)
-    request = urllib2.Request('https://www.documentcloud.org/api/%s' % url, params)
-    request = authenticate_documentcloud(request)
 
     try:
-        ret = opener.open(request).read()
-        if not change:
-            info = json.loads(ret)
-            doc.doc_id = info['id']
+        if change:
+            doccloud_client.update(doc.doc_id, params)
+        else:
+            params['file'] = doc.ffile.url.replace('https', 'http', 1)
+            doc.doc_id = doccloud_client.upload(params)
+            doc.doccloud_status = 'uploaded'
+            doc.doccloud_next_attempt = None
             doc.save()
             set_document_cloud_pages.apply_async(args=[doc.pk], countdown=1800)
-    except (urllib2.URLError, urllib2.HTTPError) as exc:
-        logger.warn('Upload Doc Cloud error: %s %s', url, doc.pk)
-        countdown = ((2 ** upload_document_cloud.request.retries)
-                * 300 + randint(0, 300))
-        upload_document_cloud.retry(
-                args=[doc.pk, change],
-                kwargs=kwargs,
-                exc=exc,
-                countdown=countdown,
-                )
+    except (requests.exceptions.RequestException, ValueError, KeyError) as exc:
+        logger.warn('Upload Doc Cloud error: %s %s', doc.pk, exc)
+        if change:
+            countdown = ((2 ** upload_document_cloud.request.retries)
+                    * 300 + randint(0, 300))
+            upload_document_cloud.retry(
+                    args=[doc.pk, change],
+                    kwargs=kwargs,
+                    exc=exc,
+                    countdown=countdown,
+                    )
+        elif doc.doccloud_attempts >= DOC_CLOUD_MAX_ATTEMPTS:
+            logger.error('Upload Doc Cloud failed after %d attempts: %s',
+                    doc.doccloud_attempts, doc.pk)
+            FOIAFile.objects.filter(pk=doc.pk).update(
+                    doccloud_status='failed',
+                    doccloud_next_attempt=None,
+                    )
+        else:
+            # process_document_cloud_queue will try again later
+            FOIAFile.objects.filter(pk=doc.pk).update(
+                    doccloud_status='pending',
+                    doccloud_next_attempt=datetime.now() +
+                        doccloud_backoff(doc.doccloud_attempts),
+                    )
 
 
 @task(ignore_result=True, max_retries=10, name='muckrock.foia.tasks.set_document_cloud_pages')
@@ -158,51 +225,122 @@ def set_document_cloud_pages(doc_pk, **kwargs):
         # already has pages set or not a doc cloud, just return
         return
 
-    request = urllib2.Request(
-            u'https://www.documentcloud.org/api/documents/%s.json' %
-            quote_plus(doc.doc_id.encode('utf-8')))
-    request = authenticate_documentcloud(request)
-
     try:
-        ret = urllib2.urlopen(request).read()
-        info = json.loads(ret)
-        doc.pages = info['document']['pages']
+        doc.pages = doccloud_client.get_document(doc.doc_id)['pages']
+        if doc.pages:
+            doc.doccloud_status = 'pages_known'
         doc.save()
-    except urllib2.HTTPError, exc:
-        if exc.code == 404:
+    except requests.exceptions.HTTPError as exc:
+        if exc.response is not None and exc.response.status_code == 404:
             # if 404, this doc id is not on document cloud
-            # delete the doc_id which will cause it to get reuploaded by retry_stuck_documents
+            # delete the doc_id and queue it to be reuploaded
             doc.doc_id = ''
+            doc.doccloud_status = 'pending'
+            doc.doccloud_attempts = 0
+            doc.doccloud_next_attempt = datetime.now()
             doc.save()
         else:
             set_document_cloud_pages.retry(args=[doc.pk], countdown=600, kwargs=kwargs, exc=exc)
-    except urllib2.URLError, exc:
+    except (requests.exceptions.RequestException, ValueError, KeyError) as exc:
         set_document_cloud_pages.retry(args=[doc.pk], countdown=600, kwargs=kwargs, exc=exc)
 
 
-@task(ignore_result=True, max_retries=10, name='muckrock.foia.tasks.submit_multi_request')
-def submit_multi_request(req_pk, **kwargs):
-    """Submit a multi request to all agencies"""
-    # pylint: disable=unused-argument
-    req = FOIAMultiRequest.objects.get(pk=req_pk)
+@task(
+        ignore_result=True,
+        max_retries=5,
+        name='muckrock.foia.tasks.set_document_cloud_access',
+        )
+def set_document_cloud_access(doc_pks, access, **kwargs):
+    """Set the access level for many documents on document cloud at once"""
+    doc_ids = list(FOIAFile.objects
+            .filter(pk__in=doc_pks, access=access)
+            .exclude(doc_id='')
+            .values_list('doc_id', flat=True))
+    results = doccloud_client.set_access(doc_ids, access)
+    failed = [
+            doc_id for doc_id, result in zip(doc_ids, results)
+            if isinstance(result, Exception)
+            ]
+    logger.info('Set document cloud access to %s for %d of %d documents',
+            access, len(doc_ids) - len(failed), len(doc_ids))
+    if failed:
+        # only retry the failed documents
+        set_document_cloud_access.retry(
+                args=[
+                    list(FOIAFile.objects
+                        .filter(doc_id__in=failed)
+                        .values_list('pk', flat=True)),
+                    access,
+                    ],
+                kwargs=kwargs,
+                countdown=((2 ** set_document_cloud_access.request.retries)
+                    * 300 + randint(0, 300)),
+                )
 
-    # break the agencies into chunks of 50 to not timeout the database
-    agencies = req.agencies.all()
-    agency_chunks = [agencies[i*50:(i+1)*50] for i in xrange(agencies.count()/50 + 1)]
 
-    for agency_chunk in agency_chunks:
-        for agency in agency_chunk:
+@task(
+        ignore_result=True,
+        time_limit=10 * 60,
+        soft_time_limit=9 * 60,
+        name='muckrock.foia.tasks.extract_file_text',
+        )
+def extract_file_text(file_pks, **kwargs):
+    """
+    Count the pages and extract the text of newly uploaded files locally,
+    so they do not need to wait on document cloud
+    """
+    # pylint: disable=unused-argument
+    files = [
+            f for f in FOIAFile.objects.filter(pk__in=file_pks, text=None)
+            if can_extract(f.ffile.name)
+            ]
+    contents = []
+    for file_ in files:
+        try:
+            contents.append((file_.ffile.name, file_cache.read(file_)))
+        except (IOError, OSError, ValueError) as exc:
+            logger.warn('Extraction error: could not read file %s: %s',
+                    file_.pk, exc)
+            contents.append((file_.ffile.name, None))
+
+    to_extract = [c for c in contents if c[1] is not None]
+    results = iter(extraction_pool.extract_files(to_extract))
+    pages = {}
+    stored = 0
+    for file_, (_, data) in zip(files, contents):
+        text_pages = next(results) if data is not None else None
+        if text_pages is None:
+            continue
+        FOIAFileText.objects.store(file_, *text_pages)
+        stored += 1
+        if text_pages[1] and not file_.pages:
+            pages[file_.pk] = text_pages[1]
+    documentcloud.update_pages(pages)
+    logger.info('Extracted text locally for %d of %d files',
+            stored, len(file_pks))
+
+
+def create_multi_request_chunk(req, template, agency_ids):
+    """
+    Create the requests and their communications for a chunk of a multi
+    request's agencies in bulk, skipping agencies which already have one.
+    Returns the pks of the chunk's requests which still need to be submitted.
+    """
+    with transaction.atomic():
+        # lock the multi request so agencies are not created twice at once
+        FOIAMultiRequest.objects.select_for_update().get(pk=req.pk)
+        existing = (FOIARequest.objects
+                .filter(multirequest=req, agency__in=agency_ids)
+                .values('agency'))
+        agencies = (req.agencies
+                .select_related('jurisdiction')
+                .filter(pk__in=agency_ids)
+                .exclude(pk__in=existing))
+        foias = []
+        for agency in agencies:
             # make a copy of the foia (and its communication) for each agency
-            title = '%s (%s)' % (req.title, agency.name)
-            template = get_template('text/foia/request.txt')
-            context = {
-                    'document_request': req.requested_docs,
-                    'jurisdiction': agency.jurisdiction,
-                    'user_name': req.user.get_full_name(),
-                    }
-            foia_request = template.render(context).split('\n', 1)[1].strip()
-
-            new_foia = FOIARequest.objects.create(
+            title = ('%s (%s)' % (req.title, agency.name)).strip()
+            foias.append(FOIARequest(
                 user=req.user,
                 status='started',
                 title=title,
@@ -213,69 +351,192 @@ def submit_multi_request(req_pk, **kwargs):
                 requested_docs=req.requested_docs,
                 description=req.requested_docs,
                 multirequest=req,
-                )
+                date_updated=date.today(),
+                ))
+        foias = FOIARequest.objects.bulk_create(foias)
 
-            FOIACommunication.objects.create(
-                foia=new_foia,
-                from_user=new_foia.user,
-                to_user=new_foia.get_to_user(),
+        user_name = req.user.get_full_name()
+        comms = []
+        for foia in foias:
+            context = {
+                    'document_request': req.requested_docs,
+                    'jurisdiction': foia.jurisdiction,
+                    'user_name': user_name,
+                    }
+            comm = FOIACommunication(
+                foia=foia,
+                from_user=req.user,
+                to_user=foia.get_to_user(),
                 date=datetime.now(),
                 response=False,
-                communication=foia_request,
+                communication=template.render(context).split('\n', 1)[1].strip(),
                 )
+            comm.clean_communication()
+            comms.append(comm)
+        FOIACommunication.objects.bulk_create(comms)
+        # bulk_create does not send the signals the live counters follow
+        increment('requests', 'started', len(foias))
+        increment('communications', 'sent', len(comms))
+
+    return list(FOIARequest.objects
+            .filter(multirequest=req, agency__in=agency_ids, status='started')
+            .values_list('pk', flat=True))
+
+
+def update_multi_request_progress(req_pk):
+    """Count the submitted requests, and mark it filed once all are submitted"""
+    submitted = (FOIARequest.objects
+            .filter(multirequest=req_pk)
+            .exclude(status='started')
+            .count())
+    FOIAMultiRequest.objects.filter(pk=req_pk).update(num_submitted=submitted)
+    (FOIAMultiRequest.objects
+            .filter(pk=req_pk, num_agencies__lte=submitted)
+            .exclude(status='filed')
+            .update(status='filed'))
 
-            new_foia.submit()
-    req.status = 'filed'
-    req.save()
-
-@task(ignore_result=True, max_retries=3, name='muckrock.foia.tasks.classify_status')
-def classify_status(task_pk, **kwargs):
-    """Use a machine learning classifier to predict the communications status"""
-    # pylint: disable=too-many-locals
 
-    def get_text_ocr(doc_id):
-        """Get the text OCR from document cloud"""
-        doc_cloud_url = u'http://www.documentcloud.org/api/documents/%s.json'
-        resp = requests.get(doc_cloud_url % quote_plus(doc_id.encode('utf-8')))
+@task(ignore_result=True, max_retries=10, name='muckrock.foia.tasks.submit_multi_request')
+def submit_multi_request(req_pk, **kwargs):
+    """
+    Submit a multi request to all agencies.  The requests are created in
+    bulk a chunk of agencies at a time, and each chunk is then submitted in
+    parallel.  Agencies which already have a request are skipped and only
+    unsubmitted requests are submitted, so running this again resumes an
+    interrupted submission.
+    """
+    # pylint: disable=unused-argument
+    req = FOIAMultiRequest.objects.select_related('user').get(pk=req_pk)
+    template = get_template('text/foia/request.txt')
+
+    agency_ids = list(req.agencies.order_by('pk').values_list('pk', flat=True))
+    FOIAMultiRequest.objects.filter(pk=req_pk).update(
+            num_agencies=len(agency_ids))
+
+    # break the agencies into chunks to not timeout the database
+    chunks = []
+    for i in xrange(0, len(agency_ids), MULTI_REQUEST_CHUNK_SIZE):
+        foia_pks = create_multi_request_chunk(
+                req,
+                template,
+                agency_ids[i:i + MULTI_REQUEST_CHUNK_SIZE],
+                )
+        if foia_pks:
+            chunks.append(foia_pks)
+
+    update_multi_request_progress(req_pk)
+    group(submit_multi_request_chunk.s(req_pk, foia_pks)
+            for foia_pks in chunks).apply_async()
+
+
+@task(ignore_result=True, max_retries=5, name='muckrock.foia.tasks.submit_multi_request_chunk')
+def submit_multi_request_chunk(req_pk, foia_pks, **kwargs):
+    """
+    Submit a chunk of a multi request's requests.  Requests which fail do
+    not hold up the rest of the chunk, and are retried together at the end.
+    """
+    failed = []
+    error = None
+    for foia_pk in foia_pks:
         try:
-            doc_cloud_json = resp.json()
-        except ValueError:
-            logger.warn(u'Doc Cloud error for %s: %s', doc_id, resp.content)
-            return ''
-        if 'error' in doc_cloud_json:
-            logger.warn(u'Doc Cloud error for %s: %s',
-                    doc_id, doc_cloud_json['error'])
+            with transaction.atomic():
+                # skip requests which are being or have been submitted
+                foia = (FOIARequest.objects
+                        .select_for_update(skip_locked=True)
+                        .filter(pk=foia_pk, status='started')
+                        .first())
+                if foia is not None:
+                    foia.submit()
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as exc: # pylint: disable=broad-except
+            logger.error('Multi request %s: error submitting request %s: %s',
+                    req_pk, foia_pk, exc, exc_info=sys.exc_info())
+            failed.append(foia_pk)
+            error = exc
+    update_multi_request_progress(req_pk)
+    if failed:
+        submit_multi_request_chunk.retry(
+                args=[req_pk, failed],
+                kwargs=kwargs,
+                exc=error,
+                countdown=60 * (2 ** submit_multi_request_chunk.request.retries),
+                )
+
+@task(
+        ignore_result=True,
+        time_limit=30 * 60,
+        soft_time_limit=29 * 60,
+        name='muckrock.foia.tasks.recompute_dates',
+        )
+def recompute_dates(jurisdiction_ids=None, **kwargs):
+    """Recompute due and follow up dates for open requests"""
+    # pylint: disable=unused-argument
+    changes = dates.recompute_dates(jurisdiction_ids)
+    logger.info(
+            'Recompute dates: %d requests updated for jurisdictions %s',
+            len(changes),
+            'all' if jurisdiction_ids is None else jurisdiction_ids,
+            )
+
+def get_document_cloud_text(doc_id):
+    """
+    Get the text OCR and page count from document cloud,
+    or None if there is an error
+    """
+    try:
+        return doccloud_client.get_text(doc_id)
+    except (requests.exceptions.RequestException, ValueError, KeyError) as exc:
+        logger.warn(u'Doc Cloud error for %s: %s', doc_id, exc)
+        return None
+
+
+def get_file_text(file_):
+    """Get a file's text from the text store, fetching it if needed"""
+    text = file_.get_text()
+    if text is None and not file_.doc_id:
+        return ''
+    if text is None:
+        text_pages = get_document_cloud_text(file_.doc_id)
+        if text_pages is None:
             return ''
-        text_url = doc_cloud_json['document']['resources']['text']
-        resp = requests.get(text_url)
-        return resp.content.decode('utf-8')
-
-    def get_classifier():
-        """Load the pickled classifier"""
-        with open('muckrock/foia/classifier.pkl', 'rb') as pkl_fp:
-            return pickle.load(pkl_fp)
-
-    def predict_status(vectorizer, selector, classifier, text, pages):
-        """Run the prediction"""
-        input_vect = vectorizer.transform([text])
-        pages_vect = np.array([pages], dtype=np.float).transpose()
-        input_vect = hstack([input_vect, pages_vect])
-        input_vect = selector.transform(input_vect)
-        probs = classifier.predict_proba(input_vect)[0]
-        max_prob = max(probs)
-        status = classifier.classes_[list(probs).index(max_prob)]
-        return status, max_prob
-
-    def resolve_if_possible(resp_task):
-        """Resolve this response task if possible based off of ML setttings"""
-        if (ml_options.enable and
-                resp_task.status_probability >= ml_options.confidence_min):
-            try:
+        text = text_pages[0]
+        FOIAFileText.objects.store(file_, *text_pages)
+    return text
+
+
+def get_classification_input(resp_task):
+    """
+    Get the text and page count to classify a response task with,
+    or None if its files have not been processed yet
+    """
+    files = resp_task.communication.files.all()
+    if any(f.is_doccloud() and not f.doc_id and f.get_text() is None and
+            f.doccloud_status in ('pending', 'uploading')
+            for f in files):
+        return None
+    file_text = [get_file_text(f) for f in files if f.is_doccloud()]
+    total_pages = sum(f.pages for f in files)
+    full_text = resp_task.communication.communication + (' '.join(file_text))
+    return full_text, total_pages
+
+
+def resolve_if_possible(resp_task, ml_robot=None):
+    """Resolve this response task if possible based off of ML setttings"""
+    if (ml_options.enable and
+            resp_task.status_probability >= ml_options.confidence_min):
+        try:
+            if ml_robot is None:
                 ml_robot = User.objects.get(username='mlrobot')
-                resp_task.set_status(resp_task.predicted_status)
-                resp_task.resolve(ml_robot)
-            except User.DoesNotExist:
-                logger.error('mlrobot account does not exist')
+            resp_task.set_status(resp_task.predicted_status)
+            resp_task.resolve(ml_robot)
+        except User.DoesNotExist:
+            logger.error('mlrobot account does not exist')
+
+
+@task(ignore_result=True, max_retries=3, name='muckrock.foia.tasks.classify_status')
+def classify_status(task_pk, **kwargs):
+    """Use a machine learning classifier to predict the communications status"""
 
     try:
         resp_task = ResponseTask.objects.get(pk=task_pk)
@@ -283,22 +544,13 @@ def classify_status(task_pk, **kwargs):
         classify_status.retry(
                 countdown=60*30, args=[task_pk], kwargs=kwargs, exc=exc)
 
-    file_text = []
-    total_pages = 0
-    for file_ in resp_task.communication.files.all():
-        total_pages += file_.pages
-        if file_.is_doccloud() and file_.doc_id:
-            file_text.append(get_text_ocr(file_.doc_id))
-        elif file_.is_doccloud() and not file_.doc_id:
-            # wait longer for document cloud
-            classify_status.retry(
-                    countdown=60*30, args=[task_pk], kwargs=kwargs)
-
-    full_text = resp_task.communication.communication + (' '.join(file_text))
-    vectorizer, selector, classifier = get_classifier()
+    classification_input = get_classification_input(resp_task)
+    if classification_input is None:
+        # wait longer for document cloud
+        classify_status.retry(
+                countdown=60*30, args=[task_pk], kwargs=kwargs)
 
-    status, prob = predict_status(
-        vectorizer, selector, classifier, full_text, total_pages)
+    status, prob = status_classifier.predict(*classification_input)
 
     resp_task.predicted_status = status
     resp_task.status_probability = int(100 * prob)
@@ -307,14 +559,121 @@ def classify_status(task_pk, **kwargs):
 
     resp_task.save()
 
+
+@periodic_task(
+        run_every=crontab(minute='*/5'),
+        time_limit=5 * 60,
+        soft_time_limit=4 * 60,
+        name='muckrock.foia.tasks.classify_pending_statuses',
+        )
+def classify_pending_statuses(batch_size=500):
+    """
+    Predict the status of all unscored response tasks in a single batch.
+    Tasks are given a few minutes for their files to be extracted, and are
+    skipped until all of their files have text, either extracted locally or
+    from document cloud.  Waiting tasks are filtered out before the batch is
+    taken, so they cannot crowd out the tasks which are ready.
+    """
+    waiting = (FOIAFile.objects
+            .doccloud_waiting()
+            .exclude(comm=None)
+            .values('comm_id'))
+    resp_tasks = (ResponseTask.objects
+            .get_unresolved()
+            .filter(
+                predicted_status=None,
+                date_created__lte=datetime.now() - timedelta(minutes=2),
+                )
+            .exclude(communication__in=waiting)
+            .select_related('communication')
+            .prefetch_related('communication__files__text')
+            .order_by('date_created')
+            [:batch_size])
+
+    ready_tasks = []
+    texts = []
+    pages = []
+    for resp_task in resp_tasks:
+        classification_input = get_classification_input(resp_task)
+        if classification_input is not None:
+            ready_tasks.append(resp_task)
+            texts.append(classification_input[0])
+            pages.append(classification_input[1])
+    if not ready_tasks:
+        return
+
+    predictions = status_classifier.predict_batch(texts, pages)
+    for resp_task, (status, prob) in zip(ready_tasks, predictions):
+        resp_task.predicted_status = status
+        resp_task.status_probability = int(100 * prob)
+    bulk_update_values(
+            ResponseTask.objects.all(),
+            'predicted_status',
+            {t.pk: t.predicted_status for t in ready_tasks},
+            CharField(),
+            )
+    bulk_update_values(
+            ResponseTask.objects.all(),
+            'status_probability',
+            {t.pk: t.status_probability for t in ready_tasks},
+            IntegerField(),
+            )
+    logger.info(
+            'Classified %d of %d pending response tasks',
+            len(ready_tasks),
+            len(resp_tasks),
+            )
+
+    try:
+        ml_robot = User.objects.get(username='mlrobot')
+    except User.DoesNotExist:
+        ml_robot = None
+    for resp_task in ready_tasks:
+        resolve_if_possible(resp_task, ml_robot)
+
+
+def fax_batch_countdown(number):
+    """
+    Faxes to the same number within a short window are sent together, so
+    Phaxio combines them into one batch.  Returns how long to wait before
+    sending a fax to the number.
+    """
+    key = 'foia:fax_batch:%s' % number.pk
+    now = time.time()
+    send_at = now + settings.FAX_BATCH_WINDOW
+    if not cache.add(key, send_at, settings.FAX_BATCH_WINDOW):
+        send_at = cache.get(key, now)
+    return max(0, int(send_at - now))
+
+
+def count_fax_usage():
+    """Count a fax against today's Phaxio usage, returning the total so far"""
+    key = 'foia:fax_usage:%s' % date.today().isoformat()
+    cache.add(key, 0, 2 * 24 * 60 * 60)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return None
+
+
 @task(
     ignore_result=True,
     max_retries=5,
     name='muckrock.foia.tasks.send_fax',
-    rate_limit='15/m',
     )
 def send_fax(comm_id, subject, body, **kwargs):
     """Send a fax using the Phaxio API"""
+    # the rate limit is shared by all of the workers
+    wait = take_token('phaxio', settings.PHAXIO_RATE_LIMIT)
+    if wait:
+        # wait for the limit to reset, without using up a retry
+        send_fax.apply_async(
+                args=[comm_id, subject, body],
+                kwargs=kwargs,
+                countdown=wait + randint(0, 10),
+                )
+        return
+
     api = PhaxioApi(
             settings.PHAXIO_KEY,
             settings.PHAXIO_SECRET,
@@ -331,7 +690,7 @@ def send_fax(comm_id, subject, body, **kwargs):
                 exc=exc,
                 )
 
-    files = [f.ffile for f in comm.files.all()]
+    files = [file_cache.open(f) for f in comm.files.all()]
     callback_url = 'https://%s%s' % (
             settings.MUCKROCK_URL,
             reverse('phaxio-callback'),
@@ -374,86 +733,441 @@ def send_fax(comm_id, subject, body, **kwargs):
                 kwargs=kwargs,
                 exc=exc,
                 )
+    finally:
+        for file_ in files:
+            file_.close()
 
     fax.fax_id = results['faxId']
     fax.save()
+    logger.info('Phaxio usage today: %s faxes', count_fax_usage())
+
+
+def get_email_connection():
+    """Get this worker's email connection, opening it if needed"""
+    if 'connection' not in email_connection:
+        backend = settings.EMAIL_BACKEND
+        # in production the default backend queues email in celery,
+        # here it needs to actually be sent
+        if backend == 'djcelery_email.backends.CeleryEmailBackend':
+            backend = settings.CELERY_EMAIL_BACKEND
+        connection = get_connection(backend)
+        connection.open()
+        email_connection['connection'] = connection
+    return email_connection['connection']
+
+
+def close_email_connection():
+    """Close this worker's email connection, after an error"""
+    connection = email_connection.pop('connection', None)
+    if connection is not None:
+        try:
+            connection.close()
+        except (smtplib.SMTPException, socket.error):
+            pass
+
+
+def email_domain_wait(email):
+    """How long to wait before emailing the domain, to stay under its rate limit"""
+    domain = email.rsplit('@', 1)[-1].lower()
+    return take_token('email:%s' % domain, settings.EMAIL_DOMAIN_RATE_LIMIT)
+
+
+@task(
+    ignore_result=True,
+    max_retries=5,
+    name='muckrock.foia.tasks.send_email',
+    )
+def send_email(email_comm_pk, subject, body, **kwargs):
+    """Send a queued email for a communication"""
+    try:
+        email_comm = (EmailCommunication.objects
+                .select_related('communication', 'from_email')
+                .get(pk=email_comm_pk))
+    except EmailCommunication.DoesNotExist as exc:
+        send_email.retry(
+                countdown=300,
+                args=[email_comm_pk, subject, body],
+                kwargs=kwargs,
+                exc=exc,
+                )
+
+    to_emails = [str(e) for e in email_comm.to_emails.all()]
+    wait = email_domain_wait(to_emails[0]) if to_emails else 0
+    if wait:
+        # wait for the limit to reset, without using up a retry
+        send_email.apply_async(
+                args=[email_comm_pk, subject, body],
+                kwargs=kwargs,
+                countdown=wait + randint(0, 30),
+                )
+        return
+
+    msg = EmailMultiAlternatives(
+            subject=subject,
+            body=body,
+            from_email=str(email_comm.from_email),
+            to=to_emails,
+            cc=[str(e) for e in email_comm.cc_emails.all()],
+            bcc=['diagnostics@muckrock.com'],
+            headers={
+                'X-Mailgun-Variables':
+                {'email_id': email_comm.pk},
+                }
+            )
+    msg.attach_alternative(linebreaks(escape(body)), 'text/html')
+    # atach all files from the communication
+    email_comm.communication.attach_files(msg)
+
+    try:
+        get_email_connection().send_messages([msg])
+    except (smtplib.SMTPException, socket.error, MailgunAPIError) as exc:
+        close_email_connection()
+        if send_email.request.retries >= send_email.max_retries:
+            logger.error('Send email failed: %s %s', email_comm.pk, exc,
+                    exc_info=sys.exc_info())
+            EmailCommunication.objects.filter(pk=email_comm.pk).update(
+                    status='failed')
+            return
+        logger.warn('Send email error, will retry: %s %s', email_comm.pk, exc)
+        send_email.retry(
+                countdown=(2 ** send_email.request.retries) * 300 + randint(0, 300),
+                args=[email_comm_pk, subject, body],
+                kwargs=kwargs,
+                exc=exc,
+                )
+
+    email_comm.status = 'sent'
+    email_comm.sent_datetime = datetime.now()
+    email_comm.save()
+    email_comm.set_raw_email(msg.message())
+
 
 @periodic_task(
-        run_every=crontab(hour=5, minute=0),
-        time_limit=10 * 60,
-        soft_time_limit=570,
+        run_every=crontab(hour='5-20', minute=0),
         name='muckrock.foia.tasks.followup_requests')
-def followup_requests():
-    """Follow up on any requests that need following up on"""
-    log = []
+def followup_requests(batch_size=FOLLOWUP_BATCH_SIZE):
+    """Queue follow ups for any requests that need following up on"""
     # weekday returns 5 for sat and 6 for sun
     is_weekday = datetime.today().weekday() < 5
-    if (foia_options.enable_followup and
+    if not (foia_options.enable_followup and
             (foia_options.enable_weekend_followup or is_weekday)):
-        try:
-            num_requests = FOIARequest.objects.get_followup().count()
-            for foia in FOIARequest.objects.get_followup():
-                try:
-                    foia.followup()
-                    log.append('%s - %d - %s' % (foia.status, foia.pk, foia.title))
-                except MailgunAPIError as exc:
-                    logger.error('Mailgun error during followups: %s', exc, exc_info=sys.exc_info())
-        except SoftTimeLimitExceeded:
-            logger.warn('Follow ups did not complete in time. '
-                    'Completed %d out of %d',
-                    num_requests - FOIARequest.objects.get_followup().count(),
-                    num_requests,
-                    )
+        return
+    today = datetime.combine(date.today(), datetime.min.time())
+    # space the follow ups out so they are sent no faster than the rate
+    # limit, no matter how many workers are consuming the queue, and only
+    # queue as many as can be sent before the next hourly run, which
+    # claims the rest
+    interval = 60.0 / settings.FOLLOWUP_RATE_LIMIT
+    max_requests = int(FOLLOWUP_MAX_COUNTDOWN / interval) + 1
+    num_requests = 0
+    while num_requests < max_requests:
+        with transaction.atomic():
+            # skip locked rows, so concurrent runs claim different requests,
+            # and mark them as attempted so they are not claimed again today
+            foia_pks = list(FOIARequest.objects
+                    .get_followup()
+                    .filter(Q(date_followup_attempted=None) |
+                        Q(date_followup_attempted__lt=today))
+                    .select_for_update(skip_locked=True)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)
+                    [:min(batch_size, max_requests - num_requests)])
+            if not foia_pks:
+                break
+            FOIARequest.objects.filter(pk__in=foia_pks).update(
+                    date_followup_attempted=datetime.now())
+
+            def send(foia_pks=foia_pks, offset=num_requests):
+                """Queue the follow ups once the claims are committed"""
+                for i, pk in enumerate(foia_pks, offset):
+                    followup_request.apply_async(
+                            args=[pk], countdown=int(i * interval))
+            transaction.on_commit(send)
+        num_requests += len(foia_pks)
+    logger.info('Follow ups: %d requests queued', num_requests)
+
+
+@task(ignore_result=True, name='muckrock.foia.tasks.followup_request')
+def followup_request(foia_pk):
+    """Follow up on a single request"""
+    try:
+        # the request may have been updated since it was queued
+        foia = FOIARequest.objects.get_followup().get(pk=foia_pk)
+    except FOIARequest.DoesNotExist:
+        return
+    try:
+        foia.followup()
+    except MailgunAPIError as exc:
+        # the communication has already been created, so do not retry and
+        # risk sending the follow up twice
+        logger.error('Mailgun error during followups: %s', exc, exc_info=sys.exc_info())
+        return
+    logger.info('Follow Up: %s - %d - %s', foia.status, foia.pk, foia.title)
 
-        logger.info('Follow Ups:\n%s', '\n'.join(log))
+
+def send_embargo_mail(foias, subject, template):
+    """Email the owners of the requests, all over a single connection"""
+    send_mass_mail([
+        (subject % foia.title,
+         render_to_string(template, {'request': foia}),
+         'info@muckrock.com',
+         [foia.user.email])
+        for foia in foias])
 
 
 @periodic_task(run_every=crontab(hour=6, minute=0), name='muckrock.foia.tasks.embargo_warn')
 def embargo_warn():
     """Warn users their requests are about to come off of embargo"""
-    for foia in FOIARequest.objects.filter(embargo=True,
-                                           permanent_embargo=False,
-                                           date_embargo=date.today()):
-        send_mail('[MuckRock] Embargo about to expire for FOI Request "%s"' % foia.title,
-                  render_to_string('text/foia/embargo_will_expire.txt', {'request': foia}),
-                  'info@muckrock.com',
-                  [foia.user.email])
+    send_embargo_mail(
+            FOIARequest.objects
+                .filter(embargo=True,
+                        permanent_embargo=False,
+                        date_embargo=date.today())
+                .select_related('user'),
+            '[MuckRock] Embargo about to expire for FOI Request "%s"',
+            'text/foia/embargo_will_expire.txt',
+            )
+
 
 @periodic_task(run_every=crontab(hour=0, minute=0), name='muckrock.foia.tasks.embargo_expire')
-def embargo_expire():
+def embargo_expire(batch_size=EMBARGO_BATCH_SIZE):
     """Expire requests that have a date_embargo before today"""
-    for foia in FOIARequest.objects.filter(embargo=True,
-                                           permanent_embargo=False,
-                                           date_embargo__lt=date.today()):
-        foia.embargo = False
-        foia.save(comment='embargo expired')
-        send_mail('[MuckRock] Embargo expired for FOI Request "%s"' % foia.title,
-                  render_to_string('text/foia/embargo_did_expire.txt', {'request': foia}),
-                  'info@muckrock.com',
-                  [foia.user.email])
-
-@periodic_task(run_every=crontab(hour=0, minute=0),
-               name='muckrock.foia.tasks.set_all_document_cloud_pages')
+    expired = (FOIARequest.objects
+            .filter(embargo=True,
+                    permanent_embargo=False,
+                    date_embargo__lt=date.today())
+            .select_related('user')
+            .order_by('pk'))
+    while True:
+        with transaction.atomic(), reversion.create_revision():
+            foias = list(expired[:batch_size])
+            if not foias:
+                break
+            foia_pks = [f.pk for f in foias]
+            FOIARequest.objects.filter(pk__in=foia_pks).update(embargo=False)
+            for foia in foias:
+                foia.embargo = False
+                reversion.add_to_revision(foia)
+            reversion.set_comment(
+                    'embargo expired for %d requests' % len(foias))
+
+            # the files are made public here in bulk, instead of by the
+            # embargo signal on each request
+            docs = (FOIAFile.objects
+                    .filter(foia__in=foia_pks)
+                    .doccloud()
+                    .exclude(access='public'))
+            doc_pks = list(docs.values_list('pk', flat=True))
+            if doc_pks:
+                docs.update(access='public')
+
+                def set_access(doc_pks=doc_pks):
+                    """Update document cloud once the batch is committed"""
+                    set_document_cloud_access.apply_async(
+                            args=[doc_pks, 'public'], countdown=3)
+                transaction.on_commit(set_access)
+        send_embargo_mail(
+                foias,
+                '[MuckRock] Embargo expired for FOI Request "%s"',
+                'text/foia/embargo_did_expire.txt',
+                )
+        logger.info('Embargo expired for %d requests', len(foias))
+
+@periodic_task(
+        run_every=crontab(hour=0, minute=0),
+        time_limit=30 * 60,
+        soft_time_limit=29 * 60,
+        name='muckrock.foia.tasks.set_all_document_cloud_pages',
+        )
 def set_all_document_cloud_pages():
     """Try and set all document cloud documents that have no page count set"""
-    docs = [doc for doc in FOIAFile.objects.filter(pages=0) if doc.is_doccloud()]
-    logger.info('Setting document cloud pages, %d documents with 0 pages', len(docs))
-    for doc in docs:
-        set_document_cloud_pages.apply_async(args=[doc.pk])
+    try:
+        documentcloud.sync_pages()
+    except SoftTimeLimitExceeded:
+        logger.warn('Setting document cloud pages timed out, '
+                'it will resume from where it stopped')
+    except (requests.exceptions.RequestException, ValueError) as exc:
+        logger.warn('Setting document cloud pages error: %s', exc)
+
 
+@periodic_task(
+        run_every=crontab(minute=40),
+        time_limit=30 * 60,
+        soft_time_limit=29 * 60,
+        name='muckrock.foia.tasks.fetch_document_cloud_text',
+        )
+def fetch_document_cloud_text(batch_size=1000):
+    """
+    Fetch and store the text for document cloud files which do not have it
+    yet.  Files whose text cannot be fetched are retried with a backoff, and
+    given up on after DOC_CLOUD_MAX_ATTEMPTS, or at once if the document is
+    gone.
+    """
+    now = datetime.now()
+    files = list(FOIAFile.objects
+            .exclude(doc_id='')
+            .filter(
+                Q(text_next_attempt=None) | Q(text_next_attempt__lte=now),
+                text=None,
+                pages__gt=0,
+                text_attempts__lt=DOC_CLOUD_MAX_ATTEMPTS,
+                )
+            .order_by('text_attempts', 'pk')
+            .only('pk', 'doc_id', 'text_attempts')
+            [:batch_size])
+    results = doccloud_client.batch(
+            doccloud_client.get_text,
+            [f.doc_id for f in files],
+            )
+    stored = 0
+    failed = []
+    for file_, text_pages in zip(files, results):
+        if not isinstance(text_pages, Exception):
+            FOIAFileText.objects.store(file_, *text_pages)
+            stored += 1
+            continue
+        response = getattr(text_pages, 'response', None)
+        if response is not None and response.status_code == 404:
+            file_.text_attempts = DOC_CLOUD_MAX_ATTEMPTS
+        else:
+            file_.text_attempts += 1
+        if file_.text_attempts >= DOC_CLOUD_MAX_ATTEMPTS:
+            logger.error('Fetching Doc Cloud text failed after %d attempts: %s',
+                    file_.text_attempts, file_.pk)
+        failed.append(file_)
+    bulk_update_values(
+            FOIAFile.objects.all(),
+            'text_attempts',
+            {f.pk: f.text_attempts for f in failed},
+            IntegerField(),
+            )
+    bulk_update_values(
+            FOIAFile.objects.all(),
+            'text_next_attempt',
+            {f.pk: now + doccloud_backoff(f.text_attempts) for f in failed},
+            DateTimeField(),
+            )
+    logger.info('Fetched document cloud text for %d of %d files', stored, len(files))
 
-@periodic_task(run_every=crontab(hour=0, minute=20),
-               name='muckrock.foia.tasks.retry_stuck_documents')
-def retry_stuck_documents():
-    """Reupload all document cloud documents which are stuck"""
-    docs = [doc for doc in FOIAFile.objects.filter(doc_id='')
-            if doc.is_doccloud() and doc.get_foia()]
-    logger.info('Reupload documents, %d documents are stuck', len(docs))
-    for doc in docs:
-        upload_document_cloud.apply_async(args=[doc.pk, False])
 
-class SizeError(Exception):
-    """Uploaded file is not the correct size"""
+@periodic_task(
+        run_every=crontab(minute='*/5'),
+        name='muckrock.foia.tasks.process_document_cloud_queue',
+        )
+def process_document_cloud_queue(batch_size=200):
+    """Upload the documents which are due to be uploaded to document cloud"""
+    with transaction.atomic():
+        # skip locked rows, so concurrent runs claim different documents
+        doc_pks = list(FOIAFile.objects
+                .select_for_update(skip_locked=True)
+                .doccloud_due()
+                .order_by('doccloud_next_attempt')
+                .values_list('pk', flat=True)
+                [:batch_size])
+        # give the upload tasks time to claim them before the next run
+        FOIAFile.objects.filter(pk__in=doc_pks).update(
+                doccloud_status='pending',
+                doccloud_next_attempt=datetime.now() + DOC_CLOUD_LEASE,
+                )
+
+        def upload():
+            """Start the uploads once the claims are committed"""
+            for pk in doc_pks:
+                upload_document_cloud.apply_async(args=[pk, False])
+        transaction.on_commit(upload)
+    logger.info('Document cloud queue: %d documents due', len(doc_pks))
+
+
+def get_storage_bucket():
+    """Get the storage bucket, over a connection reused between tasks"""
+    if 'bucket' not in storage_connection:
+        conn = S3Connection(settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY)
+        storage_connection['bucket'] = conn.get_bucket(
+                settings.AWS_STORAGE_BUCKET_NAME, validate=False)
+    return storage_connection['bucket']
+
+
+@periodic_task(
+        run_every=crontab(minute='*/10'),
+        name='muckrock.foia.tasks.delete_stored_files',
+        )
+def delete_stored_files(batch_size=STORAGE_DELETE_BATCH_SIZE):
+    """Delete the stored files which are waiting to be deleted, in bulk"""
+    bucket = get_storage_bucket()
+    deleted = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            # skip locked rows, so concurrent runs claim different files
+            deletions = list(StorageDeletion.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    [:batch_size])
+            if not deletions:
+                break
+            last_pk = deletions[-1].pk
+            names = [d.name for d in deletions]
+            # files may have been reused since they were queued
+            in_use = referenced_files(names)
+            to_delete = [n for n in names if n not in in_use]
+            failed = set()
+            if to_delete:
+                try:
+                    result = bucket.delete_keys(to_delete, quiet=True)
+                except (BotoClientError, BotoServerError, socket.error) as exc:
+                    logger.warn('Deleting stored files error: %s', exc)
+                    break
+                failed = set(error.key for error in result.errors)
+            StorageDeletion.objects.filter(
+                    pk__in=[d.pk for d in deletions if d.name not in failed]
+                    ).delete()
+            deleted += len(to_delete) - len(failed)
+    logger.info('Deleted %d stored files', deleted)
+
+
+def queue_orphans(keys, cutoff):
+    """Queue the keys which nothing refers to for deletion"""
+    names = [k.name for k in keys if parse_ts(k.last_modified) < cutoff]
+    in_use = referenced_files(names)
+    orphans = set(n for n in names if n not in in_use)
+    orphans.difference_update(StorageDeletion.objects
+            .filter(name__in=orphans)
+            .values_list('name', flat=True))
+    StorageDeletion.objects.bulk_create(
+            StorageDeletion(name=name) for name in orphans)
+    return len(orphans)
+
+
+@periodic_task(
+        run_every=crontab(day_of_week='sun', hour=3, minute=0),
+        time_limit=3 * 60 * 60,
+        soft_time_limit=3 * 60 * 60 - 60,
+        name='muckrock.foia.tasks.sweep_orphaned_files',
+        )
+def sweep_orphaned_files(prefixes=('foia_files/', 'outbound_attachments/')):
+    """
+    Queue stored files which nothing refers to for deletion - older files
+    only, so files which are being uploaded or imported are not swept up
+    """
+    if not settings.CLEAN_S3_ON_FOIA_DELETE:
+        return
+    bucket = get_storage_bucket()
+    cutoff = datetime.utcnow() - ORPHAN_MIN_AGE
+    orphans = 0
+    try:
+        for prefix in prefixes:
+            keys = []
+            for key in bucket.list(prefix=prefix):
+                keys.append(key)
+                if len(keys) == STORAGE_DELETE_BATCH_SIZE:
+                    orphans += queue_orphans(keys, cutoff)
+                    keys = []
+            orphans += queue_orphans(keys, cutoff)
+    except SoftTimeLimitExceeded:
+        logger.warn('Sweeping orphaned files did not complete in time')
+    logger.info('Queued %d orphaned files for deletion', orphans)
+
 
 # Increase the time limit for autoimport to 1 hour, and a soft time limit to
 # 5 minutes before that
@@ -463,211 +1177,31 @@ class SizeError(Exception):
         time_limit=3600, soft_time_limit=3300)
 def autoimport():
     """Auto import documents from S3"""
-    # pylint: disable=broad-except
-    # pylint: disable=too-many-locals
-    # pylint: disable=too-many-branches
-    # pylint: disable=too-many-statements
-    p_name = re.compile(
-            r'(?P<month>\d\d?)-(?P<day>\d\d?)-(?P<year>\d\d) '
-            r'(?P<docs>(?:mr\d+ )+)(?P<code>[a-z-]+)(?:\$(?P<arg>\S+))?'
-            r'(?: ID#(?P<id>\S+))?'
-            r'(?: EST(?P<estm>\d\d?)-(?P<estd>\d\d?)-(?P<esty>\d\d))?'
-            , re.I)
-
-    def s3_copy(bucket, key_or_pre, dest_name):
-        """Copy an s3 key or prefix"""
-
-        if key_or_pre.name.endswith('/'):
-            for key in bucket.list(prefix=key_or_pre.name, delimiter='/'):
-                if key.name == key_or_pre.name:
-                    key.copy(bucket, dest_name)
-                    continue
-                s3_copy(bucket, key, '%s/%s' % (
-                    dest_name,
-                    os.path.basename(os.path.normpath(key.name))
-                ))
-        else:
-            key_or_pre.copy(bucket, dest_name)
-
-    def s3_delete(bucket, key_or_pre):
-        """Delete an s3 key or prefix"""
-
-        if key_or_pre.name.endswith('/'):
-            for key in bucket.list(prefix=key_or_pre.name, delimiter='/'):
-                if key.name == key_or_pre.name:
-                    key.delete()
-                    continue
-                s3_delete(bucket, key)
-        else:
-            key_or_pre.delete()
-
-    def parse_name(name):
-        """Parse a file name"""
-        # strip off trailing / and file extension
-        name = os.path.normpath(name)
-        name = os.path.splitext(name)[0]
-
-        m_name = p_name.match(name)
-        if not m_name:
-            raise ValueError('ERROR: %s does not match the file name format' % name)
-        code = m_name.group('code').upper()
-        if code not in CODES:
-            raise ValueError('ERROR: %s uses an unknown code' % name)
-        foia_pks = [pk[2:] for pk in m_name.group('docs').split()]
-        file_date = datetime(int(m_name.group('year')) + 2000,
-                             int(m_name.group('month')),
-                             int(m_name.group('day')))
-        title, status, body = CODES[code]
-        arg = m_name.group('arg')
-        id_ = m_name.group('id')
-        if m_name.group('esty'):
-            est_date = date(int(m_name.group('esty')) + 2000,
-                            int(m_name.group('estm')),
-                            int(m_name.group('estd')))
-        else:
-            est_date = None
-
-        return (foia_pks, file_date, code, title,
-                status, body, arg, id_, est_date)
-
-    def import_key(key, storage_bucket, comm, log, title=None):
-        """Import a key"""
 
-        foia = comm.foia
-        file_name = os.path.split(key.name)[1]
-
-        title = title or file_name
-        access = 'private' if foia.embargo else 'public'
-
-        foia_file = FOIAFile(
-                foia=foia,
-                comm=comm,
-                title=title,
-                date=comm.date,
-                source=comm.get_source(),
-                access=access,
-                )
-        full_file_name = foia_file.ffile.field.generate_filename(
-                foia_file.ffile.instance,
-                file_name,
+    def connect():
+        """Connect to the autoimport and storage buckets"""
+        conn = S3Connection(settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY)
+        return (
+                conn.get_bucket(settings.AWS_AUTOIMPORT_BUCKET_NAME),
+                conn.get_bucket(settings.AWS_STORAGE_BUCKET_NAME),
                 )
-        full_file_name = default_storage.get_available_name(full_file_name)
-        new_key = key.copy(storage_bucket, full_file_name)
-        new_key.set_acl('public-read')
-
-        foia_file.ffile.name = full_file_name
-        foia_file.save()
-        if key.size != foia_file.ffile.size:
-            raise SizeError(key.size, foia_file.ffile.size, foia_file)
-
-        log.append('SUCCESS: %s uploaded to FOIA Request %s with a status of %s' %
-                   (file_name, foia.pk, foia.status))
-
-        upload_document_cloud.apply_async(args=[foia_file.pk, False], countdown=3)
-
-    def import_prefix(prefix, bucket, storage_bucket, comm, log):
-        """Import a prefix (folder) full of documents"""
-
-        for key in bucket.list(prefix=prefix.name, delimiter='/'):
-            if key.name == prefix.name:
-                continue
-            if key.name.endswith('/'):
-                log.append('ERROR: nested directories not allowed: %s in %s' %
-                        (key.name, prefix.name))
-                continue
-            try:
-                import_key(key, storage_bucket, comm, log)
-            except SizeError as exc:
-                s3_copy(bucket, key, 'review/%s' % key.name[6:])
-                exc.args[2].delete() # delete the foia file
-                comm.delete()
-                log.append('ERROR: %s was %s bytes and after uploaded was %s bytes - retry' %
-                           (key.name[6:], exc.args[0], exc.args[1]))
 
     def process(log):
         """Process the files"""
         log.append('Start Time: %s' % datetime.now())
-        conn = S3Connection(settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY)
-        bucket = conn.get_bucket(settings.AWS_AUTOIMPORT_BUCKET_NAME)
-        storage_bucket = conn.get_bucket(settings.AWS_STORAGE_BUCKET_NAME)
-        for key in bucket.list(prefix='scans/', delimiter='/'):
-            if key.name == 'scans/':
-                continue
-            # strip off 'scans/'
-            file_name = key.name[6:]
-
-            try:
-                (foia_pks, file_date, code, title, status,
-                        body, arg, id_, est_date) = parse_name(file_name)
-            except ValueError as exc:
-                s3_copy(bucket, key, 'review/%s' % file_name)
-                s3_delete(bucket, key)
-                log.append(unicode(exc))
-                continue
-
-            for foia_pk in foia_pks:
-                try:
-                    foia = FOIARequest.objects.get(pk=foia_pk)
-                    from_user = foia.agency.get_user() if foia.agency else None
-
-                    comm = FOIACommunication.objects.create(
-                        foia=foia,
-                        from_user=from_user,
-                        to_user=foia.user,
-                        response=True,
-                        date=file_date,
-                        communication=body,
-                        status=status,
-                        )
-                    MailCommunication.objects.create(
-                            communication=comm,
-                            sent_datetime=file_date,
-                            )
-
-                    foia.status = status or foia.status
-                    if foia.status in ['partial', 'done', 'rejected', 'no_docs']:
-                        foia.date_done = file_date.date()
-                    if code == 'FEE' and arg:
-                        foia.price = Decimal(arg)
-                    if id_:
-                        foia.tracking_id = id_
-                    if est_date:
-                        foia.date_estimate = est_date
-                    if code == 'REJ-P':
-                        foia.proxy_reject()
-
-                    if key.name.endswith('/'):
-                        import_prefix(key, bucket, storage_bucket, comm, log)
-                    else:
-                        import_key(key, storage_bucket, comm, log, title=title)
-
-                    foia.save(comment='updated from autoimport files')
-                    action = generate_status_action(foia)
-                    foia.notify(action)
-                    foia.update(comm.anchor())
-
-                except FOIARequest.DoesNotExist:
-                    s3_copy(bucket, key, 'review/%s' % file_name)
-                    log.append('ERROR: %s references FOIA Request %s, but it does not exist' %
-                               (file_name, foia_pk))
-                except SoftTimeLimitExceeded:
-                    # if we reach the soft time limit,
-                    # re-raise so we can catch and clean up
-                    raise
-                except Exception as exc:
-                    s3_copy(bucket, key, 'review/%s' % file_name)
-                    log.append('ERROR: %s has caused an unknown error. %s' % (file_name, exc))
-                    logger.error('Autoimport error: %s', exc, exc_info=sys.exc_info())
-            # delete key after processing all requests for it
-            s3_delete(bucket, key)
+        AutoImporter(
+                connect,
+                log,
+                workers=settings.AUTOIMPORT_WORKERS,
+                ).run()
         log.append('End Time: %s' % datetime.now())
 
     try:
         log = []
         process(log)
     except SoftTimeLimitExceeded:
-        log.append('ERROR: Time limit exceeded, please check folder for '
-                'undeleted uploads.  How big of a file did you put in there?')
+        log.append('ERROR: Time limit exceeded, the remaining uploads will '
+                'be imported by the next run')
         log.append('End Time: %s' % datetime.now())
     finally:
         send_mail(
@@ -0,0 +1,195 @@
+"""
+Tests for autoimporting scans from S3, against an in memory stand in for S3
+"""
+
+from django.conf import settings
+from django.core import mail
+from django.test import TestCase
+
+from hashlib import md5
+from mock import patch
+from nose.tools import eq_, ok_
+import threading
+
+from muckrock.factories import FOIAFileFactory, FOIARequestFactory
+from muckrock.foia.autoimport import AutoImporter
+from muckrock.foia.models import (
+        AutoImportCheckpoint,
+        FOIACommunication,
+        FOIAFile,
+        )
+from muckrock.foia.tasks import autoimport
+
+
+class FakeKey(object):
+    """An S3 key or prefix"""
+
+    def __init__(self, bucket, name, data=''):
+        self.bucket = bucket
+        self.name = name
+        self.data = data
+
+    @property
+    def size(self):
+        """The size of the key's data"""
+        return len(self.data)
+
+    @property
+    def etag(self):
+        """S3 uses the md5 as the etag"""
+        return '"%s"' % md5(self.data).hexdigest()
+
+    def copy(self, dst_bucket, dst_name):
+        """Server side copy"""
+        dst_bucket.keys[dst_name] = FakeKey(dst_bucket, dst_name, self.data)
+        return dst_bucket.keys[dst_name]
+
+    def set_acl(self, acl):
+        """ACLs are not simulated"""
+        pass
+
+
+class FakeBucket(object):
+    """An S3 bucket, which lists keys and prefixes like S3 does"""
+    buckets = {}
+
+    def __init__(self, name, names=()):
+        self.name = name
+        self.buckets[name] = self
+        self.keys = {}
+        for name in names:
+            self.keys[name] = FakeKey(self, name, 'data for %s' % name)
+
+    def list(self, prefix='', delimiter='/'):
+        """List the keys and common prefixes directly under a prefix"""
+        prefixes = set()
+        for name in sorted(self.keys):
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix):]
+            if delimiter in rest[:-1] or (rest.endswith(delimiter) and rest):
+                sub_prefix = prefix + rest.split(delimiter)[0] + delimiter
+                if sub_prefix not in prefixes:
+                    prefixes.add(sub_prefix)
+                    yield FakeKey(self, sub_prefix)
+            else:
+                yield self.keys[name]
+
+    def get_key(self, name):
+        """Get a key by name"""
+        return self.keys.get(name)
+
+    def copy_key(self, new_key_name, src_bucket_name, src_key_name):
+        """Server side copy from a bucket by name"""
+        src_key = self.buckets[src_bucket_name].keys[src_key_name]
+        return src_key.copy(self, new_key_name)
+
+    def delete_key(self, name):
+        """Delete a key by name"""
+        del self.keys[name]
+
+
+class TestAutoImport(TestCase):
+    """Scans should be imported from S3 into requests"""
+
+    def setUp(self):
+        self.foia = FOIARequestFactory(status='ack')
+        self.name = 'scans/10-20-17 mr%d ACK.pdf' % self.foia.pk
+        self.bucket = FakeBucket('autoimport', ['scans/', self.name])
+        self.storage_bucket = FakeBucket('storage')
+
+    def connect(self):
+        """Connect to the fake buckets"""
+        return self.bucket, self.storage_bucket
+
+    def test_import(self):
+        """A scan is copied, attached to its request and deleted"""
+        log = []
+        AutoImporter(self.connect, log).run()
+        comm = FOIACommunication.objects.get(foia=self.foia)
+        eq_(comm.status, 'processed')
+        file_ = FOIAFile.objects.get(comm=comm)
+        ok_(file_.ffile.name in self.storage_bucket.keys)
+        ok_(self.name not in self.bucket.keys)
+        eq_(AutoImportCheckpoint.objects.count(), 0)
+
+    def test_prefix(self):
+        """All of the scans in a prefix are imported"""
+        prefix = 'scans/10-20-17 mr%d RES/' % self.foia.pk
+        self.bucket = FakeBucket('autoimport', [
+            'scans/',
+            prefix,
+            prefix + 'one.pdf',
+            prefix + 'two.pdf',
+            ])
+        AutoImporter(self.connect, []).run()
+        eq_(FOIAFile.objects.filter(foia=self.foia).count(), 2)
+        eq_(self.bucket.keys.keys(), ['scans/'])
+
+    def test_resume(self):
+        """An interrupted import resumes without copying again"""
+        importer = AutoImporter(self.connect, [])
+        importer.build_manifest()
+        importer.load_checkpoints()
+        importer.copy()
+        eq_(importer.copied_count, 1)
+        eq_(AutoImportCheckpoint.objects.get().stage, 'copied')
+
+        importer = AutoImporter(self.connect, [])
+        importer.run()
+        eq_(importer.copied_count, 0)
+        eq_(FOIACommunication.objects.filter(foia=self.foia).count(), 1)
+        eq_(len(self.storage_bucket.keys), 1)
+        ok_(self.name not in self.bucket.keys)
+
+    def test_connections(self):
+        """Each thread in the pool uses its own connection"""
+        threads = []
+
+        def connect():
+            """Record which thread is connecting"""
+            threads.append(threading.current_thread())
+            return self.connect()
+        AutoImporter(connect, [], workers=2).run()
+        ok_(FOIACommunication.objects.filter(foia=self.foia).exists())
+        eq_(len(threads), len(set(threads)))
+        ok_(len(threads) > 1)
+
+    def test_bad_name(self):
+        """Scans which cannot be parsed are moved to review"""
+        self.bucket = FakeBucket('autoimport', ['scans/', 'scans/bad name.pdf'])
+        log = []
+        AutoImporter(self.connect, log).run()
+        ok_('review/bad name.pdf' in self.bucket.keys)
+        ok_('scans/bad name.pdf' not in self.bucket.keys)
+
+    def test_duplicate(self):
+        """A scan which is already stored is not copied again"""
+        original = FOIAFileFactory(
+                md5=md5('data for %s' % self.name).hexdigest(),
+                doc_id='123-doc',
+                pages=4,
+                )
+        importer = AutoImporter(self.connect, [])
+        importer.run()
+        eq_(importer.copied_count, 0)
+        eq_(importer.deduped_count, 1)
+        eq_(self.storage_bucket.keys, {})
+        file_ = FOIAFile.objects.get(foia=self.foia)
+        eq_(file_.ffile.name, original.ffile.name)
+        eq_(file_.pages, 4)
+        # the original is in another request, so it gets its own document
+        eq_(file_.doc_id, '')
+
+    @patch('muckrock.foia.tasks.S3Connection')
+    def test_task(self, mock_connection):
+        """The task imports the scans and emails the log"""
+        mock_connection.return_value.get_bucket.side_effect = (
+                lambda name: self.bucket
+                if name == settings.AWS_AUTOIMPORT_BUCKET_NAME
+                else self.storage_bucket)
+        autoimport()
+        ok_(FOIACommunication.objects.filter(foia=self.foia).exists())
+        eq_(len(mail.outbox), 1)
+        ok_(mail.outbox[0].subject.startswith('[AUTOIMPORT]'))
+        ok_('End Time' in mail.outbox[0].body)
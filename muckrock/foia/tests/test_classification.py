@@ -4,11 +4,18 @@ Tests using nose for the classifing of new communications
 
 from django.test import TestCase
 
+from datetime import datetime, timedelta
+import dill as pickle
+import mock
 import nose.tools
+import os
+import tempfile
 
-from muckrock.factories import FOIACommunicationFactory
-from muckrock.foia.tasks import classify_status
+from muckrock.factories import FOIACommunicationFactory, FOIAFileFactory
+from muckrock.foia.classifier import StatusClassifier
+from muckrock.foia.tasks import classify_status, classify_pending_statuses
 from muckrock.task.factories import ResponseTaskFactory
+from muckrock.task.models import ResponseTask
 
 class TestFOIAClassify(TestCase):
     """Test the classification of a new communication"""
@@ -23,3 +30,81 @@ class TestFOIAClassify(TestCase):
         task.refresh_from_db()
         nose.tools.ok_(task.predicted_status)
         nose.tools.ok_(task.status_probability)
+
+    @mock.patch(
+            'muckrock.foia.tasks.status_classifier.predict_batch',
+            return_value=[('done', 0.9)],
+            )
+    def test_classify_pending(self, mock_predict):
+        """Pending tasks should be classified in a batch"""
+        # pylint: disable=no-self-use
+        comm = FOIACommunicationFactory(
+                communication="Here are your responsive documents")
+        task = ResponseTaskFactory(communication=comm)
+        new_task = ResponseTaskFactory(communication=comm)
+        ResponseTask.objects.filter(pk=task.pk).update(
+                date_created=datetime.now() - timedelta(hours=1))
+        classify_pending_statuses()
+        mock_predict.assert_called_once_with(
+                ['Here are your responsive documents'], [0])
+        task.refresh_from_db()
+        new_task.refresh_from_db()
+        nose.tools.eq_(task.predicted_status, 'done')
+        nose.tools.eq_(task.status_probability, 90)
+        nose.tools.eq_(new_task.predicted_status, None)
+
+    @mock.patch(
+            'muckrock.foia.tasks.status_classifier.predict_batch',
+            return_value=[('done', 0.9)],
+            )
+    def test_classify_waiting(self, mock_predict):
+        """Tasks waiting on doc cloud do not hold up the batch, and files
+        which failed to upload are not waited on"""
+        # pylint: disable=no-self-use
+        waiting_file = FOIAFileFactory(ffile__filename='waiting.pdf')
+        failed_file = FOIAFileFactory(
+                ffile__filename='failed.doc',
+                doccloud_status='failed',
+                )
+        waiting_task = ResponseTaskFactory(communication=waiting_file.comm)
+        failed_task = ResponseTaskFactory(communication=failed_file.comm)
+        ResponseTask.objects.filter(pk=waiting_task.pk).update(
+                date_created=datetime.now() - timedelta(hours=2))
+        ResponseTask.objects.filter(pk=failed_task.pk).update(
+                date_created=datetime.now() - timedelta(hours=1))
+        classify_pending_statuses(batch_size=1)
+        nose.tools.eq_(mock_predict.call_count, 1)
+        waiting_task.refresh_from_db()
+        failed_task.refresh_from_db()
+        nose.tools.eq_(waiting_task.predicted_status, None)
+        nose.tools.eq_(failed_task.predicted_status, 'done')
+
+
+class TestStatusClassifier(TestCase):
+    """Test loading the status classifier"""
+
+    def setUp(self):
+        """Pickle a stand in model"""
+        self.pkl_fd, self.pkl_path = tempfile.mkstemp(suffix='.pkl')
+        with os.fdopen(self.pkl_fd, 'wb') as pkl_fp:
+            pickle.dump(('vectorizer', 'selector', 'classifier'), pkl_fp)
+
+    def tearDown(self):
+        """Remove the stand in model"""
+        os.remove(self.pkl_path)
+
+    def test_load_once(self):
+        """The model is only loaded once"""
+        classifier = StatusClassifier(self.pkl_path, 'v1')
+        nose.tools.eq_(classifier.get_model(), ('vectorizer', 'selector', 'classifier'))
+        classifier.get_model()
+        nose.tools.eq_(classifier.load_count, 1)
+
+    def test_reload_version(self):
+        """The model is reloaded when the version changes"""
+        classifier = StatusClassifier(self.pkl_path, 'v1')
+        classifier.get_model()
+        # pylint: disable=protected-access
+        classifier._version = 'v2'
+        classifier.get_model()
+        nose.tools.eq_(classifier.load_count, 2)
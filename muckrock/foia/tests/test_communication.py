@@ -166,6 +166,19 @@ class TestCommunicationClone(test.TestCase):
             eq_(each_clone.files.count(), file_count,
                 'Each clone should have its own set of files.')
 
+    def test_clone_file_shared(self):
+        """Cloned files share the stored file and their document"""
+        self.file.doc_id = '123-doc'
+        self.file.pages = 4
+        self.file.doccloud_status = 'pages_known'
+        self.file.save()
+        other_foia = factories.FOIARequestFactory()
+        clone = self.comm.clone([other_foia.pk])[0].files.get()
+        eq_(clone.ffile.name, self.file.ffile.name)
+        eq_(clone.doc_id, '123-doc')
+        eq_(clone.pages, 4)
+        eq_(clone.doccloud_status, 'pages_known')
+
     @raises(ValueError)
     def test_clone_empty_list(self):
         """Should throw a value error if given an empty list"""
@@ -0,0 +1,85 @@
+"""
+Tests for recomputing request dates in bulk
+"""
+
+from django.test import TestCase
+
+from datetime import date, datetime, timedelta
+from nose.tools import eq_
+
+from muckrock.factories import FOIARequestFactory, FOIACommunicationFactory
+from muckrock.foia.dates import recompute_dates
+from muckrock.foia.models import FOIARequest
+
+# pylint: disable=no-self-use
+
+class TestRecomputeDates(TestCase):
+    """Test the bulk due date and follow up date recomputation"""
+
+    def setUp(self):
+        """Create an open request with out of date dates"""
+        self.foia = FOIARequestFactory(
+                status='ack',
+                date_submitted=date(2017, 11, 1),
+                date_due=date(2017, 11, 10),
+                date_followup=date(2017, 11, 10),
+                jurisdiction__days=10,
+                )
+        FOIACommunicationFactory(
+                foia=self.foia,
+                date=datetime(2017, 11, 1, 12),
+                )
+
+    def test_dry_run(self):
+        """A dry run reports the changes without saving them"""
+        changes = recompute_dates(dry_run=True)
+        eq_(len(changes), 1)
+        eq_(changes[0].pk, self.foia.pk)
+        eq_(changes[0].new_due, date(2017, 11, 15))
+        eq_(changes[0].new_followup, date(2017, 11, 15))
+        foia = FOIARequest.objects.get(pk=self.foia.pk)
+        eq_(foia.date_due, date(2017, 11, 10))
+
+    def test_recompute(self):
+        """Dates are saved, and recomputing again is a no-op"""
+        recompute_dates([self.foia.jurisdiction.pk])
+        foia = FOIARequest.objects.get(pk=self.foia.pk)
+        eq_(foia.date_due, date(2017, 11, 15))
+        eq_(foia.date_followup, date(2017, 11, 15))
+        eq_(recompute_dates(), [])
+
+    def test_moved(self):
+        """Requests whose due date has been moved keep it"""
+        FOIARequest.objects.filter(pk=self.foia.pk).update(due_date_moved=True)
+        recompute_dates()
+        foia = FOIARequest.objects.get(pk=self.foia.pk)
+        eq_(foia.date_due, date(2017, 11, 10))
+        eq_(foia.date_followup, date(2017, 11, 10))
+
+    def test_set_by_hand(self):
+        """Changing the due date by hand marks it as moved"""
+        self.foia.date_due = date(2017, 11, 20)
+        self.foia.save()
+        foia = FOIARequest.objects.get(pk=self.foia.pk)
+        eq_(foia.due_date_moved, True)
+        recompute_dates()
+        foia = FOIARequest.objects.get(pk=self.foia.pk)
+        eq_(foia.date_due, date(2017, 11, 20))
+
+    def test_followup_not_earlier(self):
+        """The follow up date is never moved earlier"""
+        FOIARequest.objects.filter(pk=self.foia.pk).update(
+                date_followup=date(2017, 12, 1))
+        recompute_dates()
+        foia = FOIARequest.objects.get(pk=self.foia.pk)
+        eq_(foia.date_due, date(2017, 11, 15))
+        eq_(foia.date_followup, date(2017, 12, 1))
+
+    def test_estimate(self):
+        """Follow ups waiting on a future estimate are left alone"""
+        FOIARequest.objects.filter(pk=self.foia.pk).update(
+                date_estimate=date.today() + timedelta(30))
+        recompute_dates()
+        foia = FOIARequest.objects.get(pk=self.foia.pk)
+        eq_(foia.date_due, date(2017, 11, 15))
+        eq_(foia.date_followup, date(2017, 11, 10))
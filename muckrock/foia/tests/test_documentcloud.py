@@ -0,0 +1,226 @@
+"""
+Tests for syncing with DocumentCloud, against a local stub server
+"""
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from mock import patch
+from nose.tools import assert_raises, eq_, ok_
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from urlparse import parse_qs, urlparse
+import json
+import requests
+import threading
+
+from muckrock.factories import FOIAFileFactory
+from muckrock.foia.documentcloud import (
+        CURSOR_KEY,
+        DocumentCloudClient,
+        sync_pages,
+        )
+from muckrock.foia.models import FOIAFile
+from muckrock.foia.tasks import DOC_CLOUD_MAX_ATTEMPTS, fetch_document_cloud_text
+
+
+class StubDocumentCloud(object):
+    """A local HTTP server standing in for the DocumentCloud search API"""
+
+    def __init__(self, pages):
+        # search result pages - a status code in place of a page is served
+        # as an error once, and then as a page of unrelated documents
+        self.pages = pages
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Serve the search result pages"""
+            # pylint: disable=invalid-name
+
+            def do_GET(self):
+                """Serve a page of search results"""
+                params = parse_qs(urlparse(self.path).query)
+                page = int(params['page'][0])
+                stub.requests.append(page)
+                result = (stub.pages[page - 1]
+                        if page <= len(stub.pages) else [])
+                if isinstance(result, int):
+                    stub.pages[page - 1] = [{'id': '0-z', 'pages': 1}]
+                    self.send_response(result)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({'documents': result}))
+
+            def log_message(self, *args):
+                """Keep the test output quiet"""
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        """The stub's API url"""
+        return 'http://127.0.0.1:%d/api' % self.server.server_port
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestSyncPages(TestCase):
+    """Page counts should be synced in bulk from DocumentCloud"""
+
+    def setUp(self):
+        cache.delete(CURSOR_KEY)
+        self.pdf = FOIAFileFactory(
+                ffile='foia_files/a.pdf',
+                doc_id='1-a',
+                doccloud_status='uploaded',
+                )
+        self.docx = FOIAFileFactory(
+                ffile='foia_files/b.docx',
+                doc_id='2-b',
+                doccloud_status='uploaded',
+                )
+        self.image = FOIAFileFactory(ffile='foia_files/c.png', doc_id='3-c')
+
+    def test_sync(self):
+        """Only doc cloud files are updated, and it stops once all are found"""
+        pages = [
+                [{'id': '1-a', 'pages': 3}, {'id': '3-c', 'pages': 7}],
+                [{'id': '2-b', 'pages': 5}],
+                [{'id': '4-d', 'pages': 9}],
+                ]
+        with StubDocumentCloud(pages) as stub:
+            with self.settings(DOCUMENTCLOUD_API_URL=stub.url):
+                eq_(sync_pages(per_page=2), 2)
+        eq_(stub.requests, [1, 2])
+        eq_(FOIAFile.objects.get(pk=self.pdf.pk).pages, 3)
+        eq_(FOIAFile.objects.get(pk=self.docx.pk).pages, 5)
+        eq_(FOIAFile.objects.get(pk=self.image.pk).pages, 0)
+        eq_(FOIAFile.objects.get(pk=self.pdf.pk).doccloud_status, 'pages_known')
+        eq_(cache.get(CURSOR_KEY), None)
+
+    def test_resume(self):
+        """An interrupted sync resumes from the page it stopped on"""
+        pages = [
+                [{'id': '1-a', 'pages': 3}],
+                403,
+                [{'id': '2-b', 'pages': 5}],
+                ]
+        with StubDocumentCloud(pages) as stub:
+            with self.settings(DOCUMENTCLOUD_API_URL=stub.url):
+                with assert_raises(requests.exceptions.HTTPError):
+                    sync_pages()
+                eq_(cache.get(CURSOR_KEY), 2)
+                eq_(FOIAFile.objects.get(pk=self.pdf.pk).pages, 3)
+                eq_(sync_pages(), 1)
+        eq_(stub.requests, [1, 2, 2, 3])
+        eq_(FOIAFile.objects.get(pk=self.docx.pk).pages, 5)
+
+
+class RecordedAdapter(HTTPAdapter):
+    """Replays recorded DocumentCloud responses instead of making requests"""
+
+    def __init__(self, responses):
+        super(RecordedAdapter, self).__init__()
+        # (method, url) -> (status code, body)
+        self.responses = responses
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        """Look up the recorded response"""
+        # pylint: disable=arguments-differ
+        with self.lock:
+            self.sent.append(request)
+        status, body = self.responses[(request.method, request.url)]
+        resp = Response()
+        resp.status_code = status
+        resp._content = body if isinstance(body, str) else json.dumps(body)
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+
+API = 'https://dc.example.com/api'
+RECORDED = {
+        ('POST', API + '/upload.json'):
+            (200, {'id': '123-doc', 'title': 'Doc'}),
+        ('PUT', API + '/documents/123-doc.json'):
+            (200, {'document': {'id': '123-doc'}}),
+        ('PUT', API + '/documents/456-gone.json'):
+            (404, {'error': 'Not found'}),
+        ('GET', API + '/documents/123-doc.json'):
+            (200, {'document': {
+                'id': '123-doc',
+                'pages': 4,
+                'resources': {
+                    'text': 'https://dc.example.com/123-doc.txt',
+                    },
+                }}),
+        ('GET', 'https://dc.example.com/123-doc.txt'):
+            (200, 'Document text'),
+        ('GET', API + '/documents/456-gone.json'):
+            (404, {'error': 'Not found'}),
+        ('GET', API + '/documents/789-down.json'):
+            (500, {'error': 'Server error'}),
+        }
+
+
+class TestDocumentCloudClient(TestCase):
+    """The DocumentCloud client against recorded responses"""
+
+    def setUp(self):
+        self.adapter = RecordedAdapter(RECORDED)
+        self.client = DocumentCloudClient(api_url=API, concurrency=2)
+        self.client.session.mount('https://', self.adapter)
+
+    def test_upload(self):
+        """Uploading returns the new doc id, authenticated"""
+        eq_(self.client.upload({'title': 'Doc', 'file': 'http://a.com/a.pdf'}),
+                '123-doc')
+        ok_(self.adapter.sent[0].headers['Authorization'].startswith('Basic '))
+
+    def test_get_text(self):
+        """Text is fetched with the page count"""
+        eq_(self.client.get_text('123-doc'), (u'Document text', 4))
+
+    def test_set_access(self):
+        """Access is set in a batch, with failures returned"""
+        results = self.client.set_access(['123-doc', '456-gone'], 'private')
+        eq_(results[0], None)
+        ok_(isinstance(results[1], requests.exceptions.HTTPError))
+        eq_(len(self.adapter.sent), 2)
+        eq_(self.adapter.sent[0].body, 'access=private')
+
+    def test_fetch_text(self):
+        """Text which cannot be fetched is retried later, unless it is gone"""
+        fetched = FOIAFileFactory(doc_id='123-doc', pages=4)
+        gone = FOIAFileFactory(doc_id='456-gone', pages=1)
+        down = FOIAFileFactory(doc_id='789-down', pages=1)
+        with patch('muckrock.foia.tasks.doccloud_client', self.client):
+            fetch_document_cloud_text()
+            eq_(fetched.get_text(), u'Document text')
+            gone.refresh_from_db()
+            eq_(gone.text_attempts, DOC_CLOUD_MAX_ATTEMPTS)
+            down.refresh_from_db()
+            eq_(down.text_attempts, 1)
+            ok_(down.text_next_attempt)
+            # neither is tried again until the backoff is over
+            sent = len(self.adapter.sent)
+            fetch_document_cloud_text()
+            eq_(len(self.adapter.sent), sent)
@@ -2,10 +2,12 @@
 Tests embargo features on a request
 """
 
+from django.core import mail
 from django.test import TestCase, RequestFactory
 
 import datetime
 from nose.tools import assert_false, assert_true, eq_, ok_
+from reversion.models import Revision
 
 from muckrock import factories, foia, test_utils
 
@@ -178,6 +180,22 @@ class TestEmbargo(TestCase):
         self.foia.refresh_from_db()
         assert_false(self.foia.embargo, 'The embargo should be repealed.')
 
+    def test_expire_batch(self):
+        """Expired embargoes are lifted together, with one revision per batch"""
+        yesterday = datetime.date.today() - datetime.timedelta(1)
+        foias = [
+                factories.FOIARequestFactory(
+                    status='rejected', embargo=True, date_embargo=yesterday)
+                for _ in range(3)]
+        mail.outbox = []
+        foia.tasks.embargo_expire(batch_size=2)
+        for foia_ in foias:
+            foia_.refresh_from_db()
+            assert_false(foia_.embargo, 'The embargo should be repealed.')
+        eq_(len(mail.outbox), 3)
+        eq_(Revision.objects.count(), 2)
+        eq_(Revision.objects.first().version_set.count(), 2)
+
     def test_do_not_expire_permanent(self):
         """A request with a permanent embargo should stay embargoed."""
         self.foia.embargo = True
@@ -0,0 +1,89 @@
+"""
+Tests for local page counting and text extraction
+"""
+
+from django.test import TestCase
+
+from cStringIO import StringIO
+from nose.tools import eq_
+from PyPDF2 import PdfFileWriter
+import zipfile
+
+from muckrock.foia.extraction import (
+        APP_NS,
+        WORD_NS,
+        ExtractionPool,
+        can_extract,
+        extract,
+        )
+
+
+def make_pdf(pages):
+    """Make a PDF with the given number of blank pages"""
+    writer = PdfFileWriter()
+    for _ in xrange(pages):
+        writer.addBlankPage(612, 792)
+    output = StringIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def make_docx(paragraphs, pages):
+    """Make a minimal DOCX file"""
+    output = StringIO()
+    docx = zipfile.ZipFile(output, 'w')
+    docx.writestr(
+            'word/document.xml',
+            '<w:document xmlns:w="%s"><w:body>%s</w:body></w:document>' % (
+                WORD_NS,
+                ''.join('<w:p><w:r><w:t>%s</w:t></w:r></w:p>' % p
+                    for p in paragraphs),
+                ))
+    docx.writestr(
+            'docProps/app.xml',
+            '<Properties xmlns="%s"><Pages>%d</Pages></Properties>' % (
+                APP_NS, pages))
+    docx.close()
+    return output.getvalue()
+
+
+class TestExtraction(TestCase):
+    """Files should have their text and pages read locally"""
+
+    def test_can_extract(self):
+        """Only PDF and DOCX files can be read"""
+        eq_(can_extract('foia_files/doc.PDF'), True)
+        eq_(can_extract('foia_files/doc.docx'), True)
+        eq_(can_extract('foia_files/doc.doc'), False)
+        eq_(can_extract('foia_files/image.png'), False)
+
+    def test_extract_pdf(self):
+        """PDF page counts are read"""
+        eq_(extract('doc.pdf', make_pdf(3))[1], 3)
+
+    def test_extract_docx(self):
+        """DOCX text and page counts are read"""
+        eq_(
+                extract('doc.docx', make_docx(['Hello', 'World'], 2)),
+                (u'Hello\nWorld', 2),
+                )
+
+    def test_extract_bad_file(self):
+        """Unreadable files return None"""
+        eq_(extract('doc.pdf', 'not a pdf'), None)
+        eq_(extract('doc.docx', 'not a docx'), None)
+        eq_(extract('image.png', 'not extractable'), None)
+
+    def test_extraction_pool(self):
+        """Files are extracted in worker processes"""
+        pool = ExtractionPool(processes=1, timeout=30, memory_limit=2 ** 30)
+        try:
+            eq_(
+                    pool.extract_files([
+                        ('doc.pdf', make_pdf(2)),
+                        ('doc.pdf', 'not a pdf'),
+                        ]),
+                    [(u'\n', 2), None],
+                    )
+        finally:
+            pool.terminate()
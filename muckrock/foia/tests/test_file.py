@@ -2,13 +2,24 @@
 Files should be added to communications
 """
 
+from django.core.files.base import ContentFile
 from django.core.urlresolvers import reverse
 from django.http import Http404
 from django.test import TestCase
+from django.test.utils import override_settings
 
+from datetime import datetime
+from mock import Mock, patch
 from nose.tools import eq_, ok_, raises
+import requests
 
-from muckrock.factories import FOIAFileFactory, UserFactory
+from muckrock.factories import (
+        FOIACommunicationFactory,
+        FOIAFileFactory,
+        UserFactory,
+        )
+from muckrock.foia.models import FOIAFile, FOIAFileText, StorageDeletion
+from muckrock.foia.tasks import delete_stored_files, upload_document_cloud
 from muckrock.foia.views import FOIAFileListView
 from muckrock.test_utils import http_get_response
 
@@ -41,3 +52,111 @@ class TestRequestFilesView(TestCase):
         user = UserFactory()
         ok_(not self.foia.has_perm(user, 'view'))
         http_get_response(self.url, self.view, user, **self.kwargs)
+
+
+class TestFileText(TestCase):
+    """The extracted text of files is stored compressed"""
+
+    def test_store(self):
+        """Storing text should round trip and replace the previous text"""
+        file_ = FOIAFileFactory()
+        eq_(file_.get_text(), None)
+        FOIAFileText.objects.store(file_, u'Some text \u2603', 2)
+        file_ = FOIAFile.objects.get(pk=file_.pk)
+        eq_(file_.get_text(), u'Some text \u2603')
+        eq_(file_.text.pages, 2)
+        FOIAFileText.objects.store(file_, u'New text', 3)
+        eq_(FOIAFileText.objects.filter(file=file_).count(), 1)
+        eq_(FOIAFileText.objects.get(file=file_).get_text(), u'New text')
+
+
+class TestDedupe(TestCase):
+    """Files with the same contents are only stored once"""
+
+    def test_upload_duplicate(self):
+        """A duplicate upload shares the stored file, document and text"""
+        comm = FOIACommunicationFactory()
+        comm.upload_file(ContentFile('contents', name='a.pdf'))
+        original = comm.files.get()
+        FOIAFile.objects.filter(pk=original.pk).update(
+                doc_id='123-doc', pages=3, doccloud_status='pages_known')
+        FOIAFileText.objects.store(original, u'Text', 3)
+
+        other_comm = FOIACommunicationFactory(foia=comm.foia)
+        other_comm.upload_file(ContentFile('contents', name='b.pdf'))
+        duplicate = other_comm.files.get()
+        eq_(duplicate.md5, original.md5)
+        eq_(duplicate.ffile.name, original.ffile.name)
+        eq_(duplicate.doc_id, '123-doc')
+        eq_(duplicate.pages, 3)
+        eq_(duplicate.get_text(), u'Text')
+
+        other_comm.upload_file(ContentFile('other contents', name='c.pdf'))
+        ok_(other_comm.files.exclude(ffile=original.ffile.name).exists())
+
+        # other requests share the stored file, but not the document
+        other_request_comm = FOIACommunicationFactory()
+        other_request_comm.upload_file(ContentFile('contents', name='d.pdf'))
+        other_request = other_request_comm.files.get()
+        eq_(other_request.ffile.name, original.ffile.name)
+        eq_(other_request.doc_id, '')
+        eq_(other_request.pages, 3)
+        eq_(other_request.get_text(), u'Text')
+
+
+class TestDocCloudStatus(TestCase):
+    """Files are queued to be uploaded to document cloud"""
+
+    def test_new_file(self):
+        """New doc cloud files are pending, others are left alone"""
+        eq_(FOIAFileFactory(ffile='foia_files/a.pdf').doccloud_status, 'pending')
+        eq_(FOIAFileFactory(ffile='foia_files/b.png').doccloud_status, '')
+        eq_(FOIAFileFactory(ffile='foia_files/c.pdf', foia=None, comm=None)
+                .doccloud_status, '')
+
+    @patch('muckrock.foia.tasks.doccloud_client.upload',
+            Mock(side_effect=requests.exceptions.ConnectionError('error')))
+    def test_upload_error(self):
+        """A failed upload is retried later, and eventually gives up"""
+        file_ = FOIAFileFactory(ffile='foia_files/a.pdf')
+        upload_document_cloud(file_.pk, False)
+        file_ = FOIAFile.objects.get(pk=file_.pk)
+        eq_(file_.doccloud_status, 'pending')
+        eq_(file_.doccloud_attempts, 1)
+        ok_(file_.doccloud_next_attempt > datetime.now())
+        ok_(not FOIAFile.objects.doccloud_due().filter(pk=file_.pk).exists())
+
+        FOIAFile.objects.filter(pk=file_.pk).update(doccloud_attempts=9)
+        upload_document_cloud(file_.pk, False)
+        file_ = FOIAFile.objects.get(pk=file_.pk)
+        eq_(file_.doccloud_status, 'failed')
+        eq_(file_.doccloud_attempts, 10)
+
+    @patch('muckrock.foia.tasks.doccloud_client.upload')
+    def test_upload_claimed(self, mock_upload):
+        """A file which is already being uploaded is not uploaded again"""
+        file_ = FOIAFileFactory(ffile='foia_files/a.pdf')
+        FOIAFile.objects.filter(pk=file_.pk).update(doccloud_status='uploading')
+        upload_document_cloud(file_.pk, False)
+        ok_(not mock_upload.called)
+
+
+@override_settings(CLEAN_S3_ON_FOIA_DELETE=True)
+class TestStorageDeletion(TestCase):
+    """Deleted files are removed from storage in bulk, once unused"""
+
+    @patch('muckrock.foia.tasks.get_storage_bucket')
+    def test_delete(self, mock_bucket):
+        """Only files which nothing refers to are deleted"""
+        mock_bucket.return_value.delete_keys.return_value = Mock(errors=[])
+        file_ = FOIAFileFactory()
+        shared = FOIAFileFactory()
+        FOIAFileFactory(ffile=shared.ffile.name)
+        file_.delete()
+        shared.delete()
+        eq_(StorageDeletion.objects.count(), 2)
+
+        delete_stored_files()
+        mock_bucket.return_value.delete_keys.assert_called_once_with(
+                [file_.ffile.name], quiet=True)
+        eq_(StorageDeletion.objects.count(), 0)
@@ -0,0 +1,48 @@
+"""
+Tests for the local cache of stored files
+"""
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from nose.tools import eq_, ok_
+import os
+import shutil
+import tempfile
+
+from muckrock.factories import FOIAFileFactory
+from muckrock.foia.filecache import STATS_KEY, FileCache
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestFileCache(TestCase):
+    """Stored files are read from local disk after the first time"""
+
+    def setUp(self):
+        cache.delete_many([STATS_KEY % 'hits', STATS_KEY % 'misses'])
+        self.directory = tempfile.mkdtemp()
+        self.file_cache = FileCache(directory=self.directory, max_size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read(self):
+        """The second read is a hit"""
+        file_ = FOIAFileFactory(ffile__data='contents')
+        eq_(self.file_cache.read(file_), 'contents')
+        eq_(self.file_cache.read(file_), 'contents')
+        eq_(self.file_cache.stats(),
+                {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_evict(self):
+        """The least recently used files are removed past the size limit"""
+        first = FOIAFileFactory(ffile__data='a' * 60)
+        second = FOIAFileFactory(ffile__data='b' * 60)
+        first_path = self.file_cache.get_path(first)
+        os.utime(first_path, (0, 0))
+        second_path = self.file_cache.get_path(second)
+        ok_(not os.path.exists(first_path))
+        ok_(os.path.exists(second_path))
+        eq_(os.listdir(self.directory), [os.path.basename(second_path)])
@@ -5,12 +5,12 @@ Tests using nose for the FOIA application
 from django.contrib.auth.models import User, AnonymousUser
 from django.core.urlresolvers import reverse
 from django.core import mail
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, RequestFactory, override_settings
 
 from actstream.actions import follow, unfollow
 import datetime
 from datetime import date as real_date
-from mock import Mock
+from mock import Mock, patch
 import nose.tools
 from operator import attrgetter
 import re
@@ -23,9 +23,15 @@ from muckrock.factories import (
     ProjectFactory,
     AgencyFactory,
     AppealAgencyFactory,
+    FOIAMultiRequestFactory,
     OrganizationFactory,
     )
 from muckrock.foia.models import FOIARequest, FOIACommunication
+from muckrock.foia.tasks import (
+    followup_request,
+    followup_requests,
+    submit_multi_request_chunk,
+    )
 from muckrock.foia.views import Detail, FollowingRequestList
 from muckrock.foia.views.composers import _make_user
 from muckrock.jurisdiction.models import Jurisdiction, Appeal
@@ -170,6 +176,8 @@ class TestFOIARequestUnit(TestCase):
         foia.set_mail_id()
         nose.tools.eq_(mail_id, foia.mail_id)
 
+    # emails are sent once the transaction commits, which a TestCase never does
+    @patch('django.db.transaction.on_commit', lambda func: func())
     def test_foia_followup(self):
         """Make sure the follow up date is set correctly"""
         # pylint: disable=protected-access
@@ -201,6 +209,17 @@ class TestFOIARequestUnit(TestCase):
         nose.tools.assert_in('check on the status', mail.outbox[-1].body)
         nose.tools.eq_(foia._followup_days(), 15)
 
+    # emails are sent once the transaction commits, which a TestCase never does
+    @patch('django.db.transaction.on_commit', lambda func: func())
+    def test_foia_email_sent(self):
+        """Emails are queued, and marked sent once the worker sends them"""
+        foia = FOIARequestFactory(status='processed')
+        foia.followup()
+        email_comm = foia.communications.last().emails.get()
+        nose.tools.eq_(email_comm.status, 'sent')
+        ok_(email_comm.communication.get_raw_email())
+        nose.tools.eq_(mail.outbox[-1].to, [str(foia.email)])
+
     def test_foia_followup_estimated(self):
         """If request has an estimated date, returns number of days until the estimated date"""
         # pylint: disable=protected-access
@@ -610,6 +629,57 @@ class TestFOIAIntegration(TestCase):
         nose.tools.ok_(foia.days_until_due is None)
 
 
+class TestFollowupRequests(TestCase):
+    """Follow ups are claimed in batches and sent one request at a time"""
+
+    def setUp(self):
+        UserFactory(username='MuckrockStaff')
+        yesterday = datetime.date.today() - datetime.timedelta(1)
+        self.foias = [
+                FOIARequestFactory(status='ack', date_followup=yesterday)
+                for _ in range(3)]
+        self.done = FOIARequestFactory(status='done', date_followup=yesterday)
+
+    @patch('muckrock.foia.tasks.foia_options',
+            Mock(enable_followup=True, enable_weekend_followup=True))
+    def test_claim(self):
+        """Due requests are marked as attempted once per day"""
+        followup_requests(batch_size=2)
+        for foia in self.foias:
+            foia.refresh_from_db()
+            ok_(foia.date_followup_attempted)
+        self.done.refresh_from_db()
+        nose.tools.eq_(self.done.date_followup_attempted, None)
+
+        attempted = self.foias[0].date_followup_attempted
+        followup_requests()
+        self.foias[0].refresh_from_db()
+        nose.tools.eq_(self.foias[0].date_followup_attempted, attempted)
+
+    @patch('muckrock.foia.tasks.foia_options',
+            Mock(enable_followup=True, enable_weekend_followup=True))
+    @patch('muckrock.foia.tasks.FOLLOWUP_MAX_COUNTDOWN', 1)
+    @override_settings(FOLLOWUP_RATE_LIMIT=60)
+    def test_max_countdown(self):
+        """Only as many follow ups are claimed as can be sent before the
+        next run"""
+        followup_requests(batch_size=1)
+        nose.tools.eq_(FOIARequest.objects
+                .exclude(date_followup_attempted=None).count(), 2)
+        followup_requests()
+        nose.tools.eq_(FOIARequest.objects
+                .exclude(date_followup_attempted=None).count(), 3)
+
+    def test_followup_request(self):
+        """A follow up is sent only if the request is still due"""
+        followup_request(self.foias[0].pk)
+        followup_request(self.done.pk)
+        nose.tools.eq_(self.foias[0].communications.count(), 1)
+        nose.tools.eq_(self.done.communications.count(), 0)
+        followup_request(self.foias[0].pk)
+        nose.tools.eq_(self.foias[0].communications.count(), 1)
+
+
 class TestFOIARequestAppeal(TestCase):
     """A request should be able to send an appeal to the agency that receives them."""
     def setUp(self):
@@ -1026,3 +1096,22 @@ class TestFOIANotification(TestCase):
         other_request.notify(other_action)
         eq_(self.owner.notifications.get_unread().count(), unread_count + 2,
             'The user should have two unread notifications.')
+
+
+class TestMultiRequestChunk(TestCase):
+    """Test submitting a chunk of a multi request"""
+
+    @patch('muckrock.foia.tasks.submit_multi_request_chunk.retry')
+    @patch('muckrock.foia.models.FOIARequest.submit')
+    def test_failure(self, mock_submit, mock_retry):
+        """A failed request does not stop the rest of the chunk, and only the
+        failed requests are retried"""
+        multi = FOIAMultiRequestFactory()
+        foias = [
+            FOIARequestFactory(status='started', multirequest=multi),
+            FOIARequestFactory(status='started', multirequest=multi),
+            ]
+        mock_submit.side_effect = [ValueError('error'), None]
+        submit_multi_request_chunk(multi.pk, [f.pk for f in foias])
+        eq_(mock_submit.call_count, 2)
+        eq_(mock_retry.call_args[1]['args'], [multi.pk, [foias[0].pk]])
@@ -0,0 +1 @@
+default_app_config = 'muckrock.jurisdiction.apps.JurisdictionConfig'
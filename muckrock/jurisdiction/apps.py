@@ -0,0 +1,15 @@
+"""
+App config for jurisdiction
+"""
+
+from django.apps import AppConfig
+
+
+class JurisdictionConfig(AppConfig):
+    """Configures the jurisdiction application"""
+    name = 'muckrock.jurisdiction'
+
+    def ready(self):
+        """Connect the calendar registry invalidation signals"""
+        # pylint: disable=unused-variable
+        import muckrock.jurisdiction.signals
@@ -0,0 +1,152 @@
+"""
+A process wide registry of business day calendars for jurisdictions
+
+All jurisdictions' day rules and holidays are loaded in a few queries the
+first time a calendar is needed, and the resulting calendars are shared by
+every caller in the process.  Saving a holiday or a jurisdiction, or changing
+a jurisdiction's holidays, invalidates the registry.  A version number kept in
+the shared cache lets other processes notice the invalidation.
+"""
+
+from django.core.cache import cache
+
+from collections import namedtuple
+import logging
+import uuid
+
+from muckrock.business_days.models import Calendar, Holiday, HolidayCalendar
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'jurisdiction:calendar_version'
+
+DayRules = namedtuple(
+        'DayRules',
+        'level parent_id days use_business_days observe_sat',
+        )
+
+
+class CalendarRegistry(object):
+    """Loads and hands out shared calendars for all jurisdictions"""
+
+    def __init__(self):
+        self._version = None
+        self._rules = None
+        self._calendars = None
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def _current_version(self):
+        """Get the current version from the shared cache, creating it if needed"""
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _load(self, version):
+        """Load the rules and holidays for every jurisdiction"""
+        # avoid circular imports
+        from muckrock.jurisdiction.models import Jurisdiction
+        rules = {}
+        for values in Jurisdiction.objects.values_list(
+                'pk',
+                'level',
+                'parent_id',
+                'days',
+                'use_business_days',
+                'observe_sat',
+                ):
+            rules[values[0]] = DayRules(*values[1:])
+        holidays = Holiday.objects.in_bulk()
+        jurisdiction_holidays = {}
+        for jurisdiction_id, holiday_id in (Jurisdiction.holidays.through
+                .objects.order_by('pk')
+                .values_list('jurisdiction_id', 'holiday_id')):
+            jurisdiction_holidays.setdefault(jurisdiction_id, []).append(
+                    holidays[holiday_id])
+
+        # local jurisdictions use their parent's calendar, and all
+        # calendar day jurisdictions share a single calendar
+        calendar_days = Calendar()
+        calendars = {}
+        for pk, rule in rules.iteritems():
+            if rule.level != 'l':
+                if rule.use_business_days:
+                    calendars[pk] = HolidayCalendar(
+                            tuple(jurisdiction_holidays.get(pk, [])),
+                            rule.observe_sat,
+                            )
+                else:
+                    calendars[pk] = calendar_days
+        for pk, rule in rules.iteritems():
+            if rule.level == 'l' and rule.parent_id in calendars:
+                calendars[pk] = calendars[rule.parent_id]
+
+        self._rules = rules
+        self._calendars = calendars
+        self._version = version
+        self.loads += 1
+        logger.info(
+                'Loaded calendars for %d jurisdictions (version %s)',
+                len(rules),
+                version,
+                )
+
+    def _ensure_loaded(self):
+        """Load the calendars if they are missing or out of date"""
+        version = self._current_version()
+        if self._calendars is None or version != self._version:
+            self._load(version)
+
+    def get_calendar(self, jurisdiction):
+        """Get the shared calendar for a jurisdiction"""
+        self._ensure_loaded()
+        calendar = self._calendars.get(jurisdiction.pk)
+        if calendar is None:
+            # not saved yet, or created in another process which has
+            # not yet invalidated the registry
+            self.misses += 1
+            return jurisdiction.build_calendar()
+        self.hits += 1
+        return calendar
+
+    def get_calendar_by_id(self, jurisdiction_id):
+        """Get the shared calendar for a jurisdiction id, or None if unknown"""
+        self._ensure_loaded()
+        return self._calendars.get(jurisdiction_id)
+
+    def get_rules(self, jurisdiction_id):
+        """Get the day rules for a jurisdiction id, or None if unknown"""
+        self._ensure_loaded()
+        return self._rules.get(jurisdiction_id)
+
+    def get_days(self, jurisdiction_id):
+        """How many days does the jurisdiction have to reply?"""
+        rules = self.get_rules(jurisdiction_id)
+        if rules is None:
+            return None
+        if rules.level == 'l':
+            rules = self._rules.get(rules.parent_id)
+        return rules.days if rules is not None else None
+
+    def invalidate(self):
+        """Drop the loaded calendars in this and all other processes"""
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        self._rules = None
+        self._calendars = None
+        self._version = None
+
+    def stats(self):
+        """Hit and miss counts for monitoring"""
+        total = self.hits + self.misses
+        return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'hit_ratio': float(self.hits) / total if total else 0,
+                }
+
+
+registry = CalendarRegistry()
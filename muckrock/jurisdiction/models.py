@@ -2,60 +2,232 @@
 Models for the Jurisdiction application
 """
 from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
 from django.db import models
-from django.db.models import F, Q, Avg, Sum, Count
+from django.db.models import F, Q, Avg, Sum, Count, Case, When
 from django.template.defaultfilters import slugify
 
+from datetime import date
 from easy_thumbnails.fields import ThumbnailerImageField
+import numpy as np
 from taggit.managers import TaggableManager
 
 from muckrock.business_days.models import Holiday, HolidayCalendar, Calendar
 from muckrock.foia.models import FOIARequest, END_STATUS
+from muckrock.models import count_if
 from muckrock.tags.models import TaggedItemBase
 
 # pylint: disable=bad-continuation
 
+# the statuses counted for the detail pages
+STAT_STATUSES = ('rejected', 'ack', 'processed', 'fix', 'no_docs', 'done', 'appealing')
+# the response time percentiles which are stored
+PERCENTILES = (10, 25, 50, 75, 90)
+# the lower edges of the response time histogram's bins, in business days
+HISTOGRAM_BINS = (0, 5, 10, 20, 30, 45, 60, 90, 120, 180, 365)
+
+
 class RequestHelper(object):
-    """Helper methods for classes that have a get_requests() method"""
+    """
+    Helper methods for classes that have a get_requests() method and a
+    request statistics table
+    """
+
+    def get_stats(self):
+        """
+        Get the stored request statistics, which read as zeros if they have
+        not been calculated yet
+        """
+        try:
+            return self.stats
+        except ObjectDoesNotExist:
+            return self._meta.get_field('stats').related_model()
+
+    def refresh_stats(self):
+        """Recalculate and store the request statistics"""
+        field = self._meta.get_field('stats')
+        stats, _ = field.related_model.objects.get_or_create(
+                **{field.field.name: self})
+        stats.refresh(self.get_requests())
+        self.stats = stats
+        return stats
 
     def average_response_time(self):
         """Get the average response time from a submitted to completed request"""
-        requests = self.get_requests()
-        avg = (requests.aggregate(avg=Avg(F('date_done') - F('date_submitted')))['avg'])
-        return int(avg.days) if avg is not None else 0
+        return self.get_stats().average_response_time
 
     def average_fee(self):
         """Get the average fees required on requests that have a price."""
-        requests = self.get_requests()
-        avg = requests.filter(price__gt=0).aggregate(price=Avg('price'))['price']
-        return avg if avg else 0
+        return self.get_stats().average_fee
 
     def fee_rate(self):
         """Get the percentage of requests that have a fee."""
-        requests = self.get_requests()
-        filed = float(requests.get_submitted().count())
-        fee = float(requests.get_submitted().filter(price__gt=0).count())
-        rate = 0
-        if filed > 0:
-            rate = fee / filed * 100
-        return rate
+        return self.get_stats().fee_rate
 
     def success_rate(self):
         """Get the percentage of requests that are successful."""
-        requests = self.get_requests()
-        filed = float(requests.get_submitted().count())
-        completed = float(requests.get_done().count())
-        rate = 0
-        if filed > 0:
-            rate = completed / filed * 100
-        return rate
+        return self.get_stats().success_rate
 
     def total_pages(self):
         """Total pages released"""
-        requests = self.get_requests()
-        pages = requests.aggregate(Sum('files__pages'))['files__pages__sum']
-        return pages if pages else 0
+        return self.get_stats().total_pages
+
+    def get_response_times(self):
+        """The distribution of response times, if it has been calculated"""
+        try:
+            return self.response_times
+        except ObjectDoesNotExist:
+            return None
+
+
+class RequestStats(models.Model):
+    """
+    Statistics about the requests filed with an agency or jurisdiction.
+
+    These are only ever read by the views.  They are recalculated by a task
+    queued shortly after one of their requests or its files change, and
+    nightly, as whether a request is overdue depends on the day.
+    """
+    date_refreshed = models.DateField(blank=True, null=True)
+
+    average_response_time = models.IntegerField(default=0)
+    average_fee = models.FloatField(default=0)
+    fee_rate = models.FloatField(default=0)
+    success_rate = models.FloatField(default=0)
+    total_pages = models.IntegerField(default=0)
+
+    num_submitted = models.IntegerField(default=0)
+    num_overdue = models.IntegerField(default=0)
+    num_rejected = models.IntegerField(default=0)
+    num_ack = models.IntegerField(default=0)
+    num_processed = models.IntegerField(default=0)
+    num_fix = models.IntegerField(default=0)
+    num_no_docs = models.IntegerField(default=0)
+    num_done = models.IntegerField(default=0)
+    num_appealing = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def refresh(self, requests):
+        """Recalculate the statistics from the requests, in two queries"""
+        submitted = ~Q(status='started')
+        aggregates = {
+                'response_time': Avg(F('date_done') - F('date_submitted')),
+                'average_fee': Avg(Case(
+                    When(price__gt=0, then=F('price')),
+                    output_field=models.DecimalField(),
+                    )),
+                'num_fee': count_if(submitted, price__gt=0),
+                'num_completed': count_if(
+                    status__in=['partial', 'done'], date_done__isnull=False),
+                'num_submitted': count_if(submitted),
+                'num_overdue': count_if(
+                    status__in=['ack', 'processed'], date_due__lt=date.today()),
+                }
+        for status in STAT_STATUSES:
+            aggregates['num_%s' % status] = count_if(status=status)
+        stats = requests.aggregate(**aggregates)
+
+        response_time = stats.pop('response_time')
+        self.average_response_time = (
+                int(response_time.days) if response_time is not None else 0)
+        self.average_fee = stats.pop('average_fee') or 0
+        num_fee = stats.pop('num_fee')
+        num_completed = stats.pop('num_completed')
+        for name, value in stats.iteritems():
+            setattr(self, name, value)
+        if self.num_submitted > 0:
+            self.fee_rate = float(num_fee) / self.num_submitted * 100
+            self.success_rate = float(num_completed) / self.num_submitted * 100
+        else:
+            self.fee_rate = 0
+            self.success_rate = 0
+        # files are counted on their own, as joining them repeats requests
+        self.total_pages = (requests
+                .aggregate(Sum('files__pages'))['files__pages__sum'] or 0)
+        self.date_refreshed = date.today()
+        self.save()
+
+    def status_counts(self):
+        """The status counts, for the detail pages"""
+        counts = {'num_%s' % s: getattr(self, 'num_%s' % s) for s in STAT_STATUSES}
+        counts['num_overdue'] = self.num_overdue
+        counts['num_submitted'] = self.num_submitted
+        return counts
+
+
+def pack(values):
+    """Pack an array of integers to be stored"""
+    return np.asarray(values, dtype='<i4').tobytes()
+
+
+def unpack(data, columns=None):
+    """Unpack a stored array of integers"""
+    values = np.frombuffer(bytes(data), dtype='<i4')
+    if columns is not None:
+        values = values.reshape(-1, columns)
+    return values
+
+
+class ResponseTimes(models.Model):
+    """
+    The distribution of response times for the requests filed with an
+    agency or jurisdiction, in business days from being submitted.  These
+    are calculated for every agency and jurisdiction at once, by
+    muckrock.jurisdiction.response_times, and stored as packed arrays.
+    """
+    date_calculated = models.DateField()
+    # requests with a first response, and requests which are completed
+    response_count = models.IntegerField(default=0)
+    completion_count = models.IntegerField(default=0)
+    # a value for each of PERCENTILES
+    response_percentiles = models.BinaryField()
+    completion_percentiles = models.BinaryField()
+    # a count for each of HISTOGRAM_BINS
+    response_histogram = models.BinaryField()
+    completion_histogram = models.BinaryField()
+    # rows of (year submitted, requests, median response, median completion)
+    yearly = models.BinaryField()
+
+    class Meta:
+        abstract = True
+
+    def get_response_percentiles(self):
+        """The time to a first response, by percentile"""
+        return dict(zip(
+                PERCENTILES,
+                [int(v) for v in unpack(self.response_percentiles)],
+                ))
+
+    def get_completion_percentiles(self):
+        """The time to completion, by percentile"""
+        return dict(zip(
+                PERCENTILES,
+                [int(v) for v in unpack(self.completion_percentiles)],
+                ))
+
+    def get_histogram(self):
+        """Rows of (bin label, responses, completions)"""
+        labels = ['%d-%d' % (low, high - 1)
+                for low, high in zip(HISTOGRAM_BINS, HISTOGRAM_BINS[1:])]
+        labels.append('%d+' % HISTOGRAM_BINS[-1])
+        return zip(
+                labels,
+                unpack(self.response_histogram),
+                unpack(self.completion_histogram),
+                )
+
+    def get_yearly(self):
+        """
+        Rows of (year, requests, median response, median completion), with
+        None for medians which are not known
+        """
+        return [
+                tuple(int(v) if v >= 0 else None for v in row)
+                for row in unpack(self.yearly, 4)
+                ]
 
 
 class Jurisdiction(models.Model, RequestHelper):
@@ -193,6 +365,11 @@ class Jurisdiction(models.Model, RequestHelper):
 
     def get_calendar(self):
         """Get a calendar of business days for the jurisdiction"""
+        from muckrock.jurisdiction.calendars import registry
+        return registry.get_calendar(self)
+
+    def build_calendar(self):
+        """Build a new calendar of business days for the jurisdiction"""
         if self.level == 'l' and not self.parent.use_business_days:
             return Calendar()
         elif self.level == 'l' and self.parent.use_business_days:
@@ -246,6 +423,33 @@ class Jurisdiction(models.Model, RequestHelper):
         unique_together = ('slug', 'parent')
 
 
+class JurisdictionStats(RequestStats):
+    """Request statistics for a jurisdiction - a state's include its localities"""
+    jurisdiction = models.OneToOneField(
+            Jurisdiction,
+            related_name='stats',
+            primary_key=True,
+            )
+
+    def __unicode__(self):
+        return u'Stats for %s' % self.jurisdiction
+
+    class Meta(RequestStats.Meta):
+        verbose_name_plural = 'jurisdiction stats'
+
+
+class JurisdictionResponseTimes(ResponseTimes):
+    """Response times for a jurisdiction - a state's include its localities"""
+    jurisdiction = models.OneToOneField(
+            Jurisdiction,
+            related_name='response_times',
+            primary_key=True,
+            )
+
+    class Meta(ResponseTimes.Meta):
+        verbose_name_plural = 'jurisdiction response times'
+
+
 class Law(models.Model):
     """A law that allows for requests for public records from a jurisdiction."""
     jurisdiction = models.ForeignKey(Jurisdiction, related_name='laws')
@@ -266,6 +470,13 @@ class Law(models.Model):
         """Return the url for the jurisdiction."""
         return self.jurisdiction.get_absolute_url()
 
+    def get_response_times(self):
+        """
+        Requests are not filed under a particular law, so a law's response
+        times are those of its jurisdiction
+        """
+        return self.jurisdiction.get_response_times()
+
 
 class Exemption(models.Model):
     """An exemption describes a reason for not releasing documents or information inside them."""
@@ -0,0 +1,224 @@
+"""
+Response time distributions for every agency and jurisdiction
+
+The submitted, first response and completed dates of every submitted request
+are read in a single streaming query into arrays.  They are converted to
+business days with each jurisdiction's calendar, one calendar at a time, and
+the requests are sorted once by agency, by jurisdiction and by state, so each
+group of requests is a slice of the arrays.  The percentiles, histograms and
+yearly medians of each slice are then calculated with NumPy, and all of the
+results are replaced in one transaction.
+"""
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Min, When
+
+from datetime import date
+import logging
+import numpy as np
+import time
+
+from muckrock.agency.models import AgencyResponseTimes
+from muckrock.business_days.models import Calendar
+from muckrock.foia.models import FOIARequest
+from muckrock.jurisdiction.calendars import registry
+from muckrock.jurisdiction.models import (
+        HISTOGRAM_BINS,
+        PERCENTILES,
+        JurisdictionResponseTimes,
+        pack,
+        )
+
+logger = logging.getLogger(__name__)
+
+# marks a missing id or date in the arrays
+NONE = -1
+
+
+def load_requests():
+    """
+    Read the agency, jurisdiction, submitted, first response and done
+    dates of every submitted request, as columns of ordinals
+    """
+    requests = (FOIARequest.objects
+            .exclude(status='started')
+            .exclude(date_submitted=None)
+            .annotate(first_response=Min(Case(
+                When(
+                    communications__response=True,
+                    then=F('communications__date'),
+                    ),
+                output_field=DateTimeField(),
+                )))
+            .order_by()
+            .values_list(
+                'agency_id',
+                'jurisdiction_id',
+                'date_submitted',
+                'first_response',
+                'date_done',
+                )
+            .iterator())
+    rows = [
+            (
+                agency_id if agency_id is not None else NONE,
+                jurisdiction_id,
+                submitted.toordinal(),
+                first_response.date().toordinal() if first_response else NONE,
+                done.toordinal() if done else NONE,
+            )
+            for agency_id, jurisdiction_id, submitted, first_response, done
+            in requests
+            ]
+    return np.array(rows, dtype=np.int64).reshape(-1, 5).T
+
+
+def business_days(jurisdiction_ids, start, end):
+    """
+    The business days from start to end for each request, counted with its
+    jurisdiction's calendar, or NONE if the end is missing or before the start
+    """
+    days = np.empty(len(start), dtype=np.int32)
+    days.fill(NONE)
+    known = end != NONE
+    unique_ids, inverse = np.unique(jurisdiction_ids, return_inverse=True)
+    # many jurisdictions share a calendar
+    calendars = {}
+    default = Calendar()
+    for index, jurisdiction_id in enumerate(unique_ids):
+        calendar = registry.get_calendar_by_id(int(jurisdiction_id)) or default
+        calendars.setdefault(id(calendar), (calendar, []))[1].append(index)
+    for calendar, indexes in calendars.itervalues():
+        mask = known & np.in1d(inverse, indexes)
+        days[mask] = calendar.business_days_between_many(start[mask], end[mask])
+    days[known & (days < 0)] = NONE
+    return days
+
+
+def state_ids(jurisdiction_ids):
+    """The state each request is filed in, for rolling up states' localities"""
+    unique_ids, inverse = np.unique(jurisdiction_ids, return_inverse=True)
+    states = np.empty(len(unique_ids), dtype=np.int64)
+    states.fill(NONE)
+    for index, jurisdiction_id in enumerate(unique_ids):
+        rules = registry.get_rules(int(jurisdiction_id))
+        if rules is None:
+            continue
+        if rules.level == 's':
+            states[index] = jurisdiction_id
+        elif rules.level == 'l' and rules.parent_id is not None:
+            states[index] = rules.parent_id
+    return states[inverse]
+
+
+def submitted_years(submitted):
+    """The year each request was submitted, from its ordinal"""
+    if len(submitted) == 0:
+        return np.zeros(0, dtype=np.int32)
+    first = date.fromordinal(int(submitted.min())).year
+    last = date.fromordinal(int(submitted.max())).year
+    year_starts = [date(y, 1, 1).toordinal() for y in xrange(first, last + 1)]
+    return first + np.searchsorted(year_starts, submitted, side='right') - 1
+
+
+def percentiles(days):
+    """The percentiles of the known durations, or NONE if there are none"""
+    if len(days) == 0:
+        return [NONE] * len(PERCENTILES)
+    return np.round(np.percentile(days, PERCENTILES))
+
+
+def histogram(days):
+    """How many of the durations fall into each bin"""
+    bins = np.searchsorted(HISTOGRAM_BINS, days, side='right') - 1
+    return np.bincount(bins, minlength=len(HISTOGRAM_BINS))
+
+
+def median(days):
+    """The median of the known durations, or NONE if there are none"""
+    return int(round(np.median(days))) if len(days) else NONE
+
+
+def summarize(response_days, completion_days, years):
+    """The response time fields for one group of requests"""
+    responses = response_days[response_days != NONE]
+    completions = completion_days[completion_days != NONE]
+    yearly = []
+    for year in np.unique(years):
+        in_year = years == year
+        year_responses = response_days[in_year]
+        year_completions = completion_days[in_year]
+        yearly.append((
+            year,
+            in_year.sum(),
+            median(year_responses[year_responses != NONE]),
+            median(year_completions[year_completions != NONE]),
+            ))
+    return {
+            'response_count': len(responses),
+            'completion_count': len(completions),
+            'response_percentiles': pack(percentiles(responses)),
+            'completion_percentiles': pack(percentiles(completions)),
+            'response_histogram': pack(histogram(responses)),
+            'completion_histogram': pack(histogram(completions)),
+            'yearly': pack(yearly),
+            }
+
+
+def by_group(keys, response_days, completion_days, years):
+    """Summarize the requests for each key, skipping those without one"""
+    order = np.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    response_days = response_days[order]
+    completion_days = completion_days[order]
+    years = years[order]
+    boundaries = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(keys)]))
+    groups = {}
+    for start, end in zip(starts, ends):
+        if end <= start or keys[start] == NONE:
+            continue
+        groups[int(keys[start])] = summarize(
+                response_days[start:end],
+                completion_days[start:end],
+                years[start:end],
+                )
+    return groups
+
+
+def calculate():
+    """Calculate and store the response times for every agency and jurisdiction"""
+    start_time = time.time()
+    agency_ids, jurisdiction_ids, submitted, first_response, done = load_requests()
+    logger.info('Response times: loaded %d requests in %.2f seconds',
+            len(submitted), time.time() - start_time)
+
+    response_days = business_days(jurisdiction_ids, submitted, first_response)
+    completion_days = business_days(jurisdiction_ids, submitted, done)
+    years = submitted_years(submitted)
+    columns = (response_days, completion_days, years)
+
+    agencies = by_group(agency_ids, *columns)
+    jurisdictions = by_group(jurisdiction_ids, *columns)
+    # a state's response times include its localities
+    jurisdictions.update(by_group(state_ids(jurisdiction_ids), *columns))
+
+    today = date.today()
+    with transaction.atomic():
+        AgencyResponseTimes.objects.all().delete()
+        AgencyResponseTimes.objects.bulk_create(
+                [AgencyResponseTimes(agency_id=pk, date_calculated=today, **fields)
+                    for pk, fields in agencies.iteritems()],
+                batch_size=1000,
+                )
+        JurisdictionResponseTimes.objects.all().delete()
+        JurisdictionResponseTimes.objects.bulk_create(
+                [JurisdictionResponseTimes(
+                    jurisdiction_id=pk, date_calculated=today, **fields)
+                    for pk, fields in jurisdictions.iteritems()],
+                batch_size=1000,
+                )
+    logger.info(
+            'Response times: %d agencies and %d jurisdictions in %.2f seconds',
+            len(agencies), len(jurisdictions), time.time() - start_time)
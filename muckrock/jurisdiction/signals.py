@@ -0,0 +1,211 @@
+"""Model signal handlers for the jurisdiction application"""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+
+from muckrock.business_days.models import Holiday
+from muckrock.foia.models import FOIARequest, FOIAFile
+from muckrock.jurisdiction.calendars import registry
+from muckrock.jurisdiction.models import Jurisdiction
+
+# pylint: disable=unused-argument
+
+# how long to wait for more changes before refreshing request statistics
+STATS_REFRESH_DELAY = 60
+DAY_RULE_FIELDS = ('level', 'parent_id', 'days', 'use_business_days', 'observe_sat')
+STAT_FIELDS = (
+        'status',
+        'price',
+        'date_submitted',
+        'date_done',
+        'date_due',
+        'agency_id',
+        'jurisdiction_id',
+        )
+
+
+def recompute_dates(jurisdiction_ids):
+    """Once committed, recompute the dates for open requests in the jurisdictions"""
+    if jurisdiction_ids == []:
+        return
+    # avoid circular imports
+    from muckrock.foia.tasks import recompute_dates as recompute_dates_task
+    transaction.on_commit(
+            lambda: recompute_dates_task.delay(jurisdiction_ids))
+
+
+def holiday_changed(sender, instance, **kwargs):
+    """A holiday changed, all calendars using it are out of date"""
+    registry.invalidate()
+    if not kwargs.get('raw'):
+        recompute_dates(list(instance.jurisdiction_set.values_list('pk', flat=True)))
+
+
+def holiday_deleted(sender, **kwargs):
+    """A holiday was deleted, all calendars using it are out of date"""
+    registry.invalidate()
+    recompute_dates(None)
+
+
+def jurisdiction_pre_save(sender, instance, **kwargs):
+    """Note if the day rules are being changed"""
+    # pylint: disable=protected-access
+    if kwargs.get('raw') or instance.pk is None:
+        instance._day_rules_changed = True
+        return
+    old_rules = (Jurisdiction.objects
+            .filter(pk=instance.pk)
+            .values_list(*DAY_RULE_FIELDS)
+            .first())
+    new_rules = tuple(getattr(instance, f) for f in DAY_RULE_FIELDS)
+    instance._day_rules_changed = old_rules != new_rules
+
+
+def jurisdiction_post_save(sender, instance, created, **kwargs):
+    """Only invalidate the calendars if the day rules have changed"""
+    # pylint: disable=protected-access
+    if getattr(instance, '_day_rules_changed', True):
+        registry.invalidate()
+        if not created and not kwargs.get('raw'):
+            recompute_dates([instance.pk])
+
+
+def jurisdiction_deleted(sender, **kwargs):
+    """A jurisdiction was deleted"""
+    registry.invalidate()
+
+
+def jurisdiction_holidays_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """A jurisdiction's holidays have been changed"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        registry.invalidate()
+        if not reverse:
+            recompute_dates([instance.pk])
+        elif pk_set:
+            recompute_dates(list(pk_set))
+        else:
+            recompute_dates(None)
+
+
+
+def stats_out_of_date(agency_ids, jurisdiction_ids):
+    """
+    Once committed, queue a refresh of the request statistics for agencies
+    and jurisdictions, and the states the jurisdictions are in.  Refreshes
+    are delayed, so a burst of changes is refreshed together.
+    """
+    # avoid circular imports
+    from muckrock.agency.tasks import refresh_request_stats, stats_refresh_key
+    agency_ids = set(i for i in agency_ids if i is not None)
+    jurisdiction_ids = set(i for i in jurisdiction_ids if i is not None)
+
+    def queue():
+        """Queue the refresh, unless one is already queued"""
+        agencies = [i for i in agency_ids if cache.add(
+            stats_refresh_key('agency', i), True, STATS_REFRESH_DELAY)]
+        jurisdictions = [i for i in jurisdiction_ids if cache.add(
+            stats_refresh_key('jurisdiction', i), True, STATS_REFRESH_DELAY)]
+        if agencies or jurisdictions:
+            refresh_request_stats.apply_async(
+                    args=[agencies, jurisdictions],
+                    countdown=STATS_REFRESH_DELAY,
+                    )
+
+    if agency_ids or jurisdiction_ids:
+        transaction.on_commit(queue)
+
+
+def request_post_save(sender, instance, **kwargs):
+    """Mark the request's statistics out of date if it has changed"""
+    if kwargs.get('raw'):
+        return
+    saved_request = getattr(instance, 'saved_request', None)
+    new_values = tuple(getattr(instance, f) for f in STAT_FIELDS)
+    agency_ids = [instance.agency_id]
+    jurisdiction_ids = [instance.jurisdiction_id]
+    if saved_request is not None:
+        old_values = tuple(getattr(saved_request, f) for f in STAT_FIELDS)
+        if old_values == new_values:
+            return
+        agency_ids.append(saved_request.agency_id)
+        jurisdiction_ids.append(saved_request.jurisdiction_id)
+    stats_out_of_date(agency_ids, jurisdiction_ids)
+
+
+def request_deleted(sender, instance, **kwargs):
+    """Mark a deleted request's statistics out of date"""
+    stats_out_of_date([instance.agency_id], [instance.jurisdiction_id])
+
+
+def file_changed(sender, instance, **kwargs):
+    """Mark a file's request's statistics out of date, as its pages count"""
+    if kwargs.get('raw') or instance.foia_id is None:
+        return
+    foia = (FOIARequest.objects
+            .filter(pk=instance.foia_id)
+            .values_list('agency_id', 'jurisdiction_id')
+            .first())
+    if foia is not None:
+        stats_out_of_date([foia[0]], [foia[1]])
+
+
+pre_save.connect(
+        jurisdiction_pre_save,
+        sender=Jurisdiction,
+        dispatch_uid='muckrock.jurisdiction.signals.jurisdiction_pre_save',
+        )
+
+post_save.connect(
+        holiday_changed,
+        sender=Holiday,
+        dispatch_uid='muckrock.jurisdiction.signals.holiday_save',
+        )
+
+post_delete.connect(
+        holiday_deleted,
+        sender=Holiday,
+        dispatch_uid='muckrock.jurisdiction.signals.holiday_delete',
+        )
+
+post_save.connect(
+        jurisdiction_post_save,
+        sender=Jurisdiction,
+        dispatch_uid='muckrock.jurisdiction.signals.jurisdiction_save',
+        )
+
+post_delete.connect(
+        jurisdiction_deleted,
+        sender=Jurisdiction,
+        dispatch_uid='muckrock.jurisdiction.signals.jurisdiction_delete',
+        )
+
+m2m_changed.connect(
+        jurisdiction_holidays_changed,
+        sender=Jurisdiction.holidays.through,
+        dispatch_uid='muckrock.jurisdiction.signals.jurisdiction_holidays',
+        )
+
+post_save.connect(
+        request_post_save,
+        sender=FOIARequest,
+        dispatch_uid='muckrock.jurisdiction.signals.request_save',
+        )
+
+post_delete.connect(
+        request_deleted,
+        sender=FOIARequest,
+        dispatch_uid='muckrock.jurisdiction.signals.request_delete',
+        )
+
+post_save.connect(
+        file_changed,
+        sender=FOIAFile,
+        dispatch_uid='muckrock.jurisdiction.signals.file_save',
+        )
+
+post_delete.connect(
+        file_changed,
+        sender=FOIAFile,
+        dispatch_uid='muckrock.jurisdiction.signals.file_delete',
+        )
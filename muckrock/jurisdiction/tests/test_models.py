@@ -6,9 +6,11 @@ from django.core.urlresolvers import reverse
 from django.test import TestCase
 
 from datetime import date, timedelta
-from nose.tools import eq_
+from mock import patch
+from nose.tools import eq_, ok_
 
 from muckrock.jurisdiction import factories
+from muckrock.jurisdiction.models import Jurisdiction
 from muckrock.factories import (
         FOIARequestFactory,
         FOIACommunicationFactory,
@@ -125,6 +127,7 @@ class TestJurisdictionUnit(TestCase):
             date_done=today,
             date_submitted=today-timedelta(local_duration)
         )
+        self.refresh_stats()
         eq_(self.state.average_response_time(), (local_duration + state_duration)/2)
         eq_(self.local.average_response_time(), local_duration)
 
@@ -143,6 +146,7 @@ class TestJurisdictionUnit(TestCase):
             jurisdiction=self.local,
             status='ack'
         )
+        self.refresh_stats()
         eq_(self.state.success_rate(), 50.0)
         eq_(self.local.success_rate(), 0.0)
 
@@ -161,6 +165,7 @@ class TestJurisdictionUnit(TestCase):
             status='ack',
             price=1.00
         )
+        self.refresh_stats()
         eq_(self.state.fee_rate(), 50.0)
         eq_(self.local.fee_rate(), 100.0)
 
@@ -174,9 +179,47 @@ class TestJurisdictionUnit(TestCase):
         state_foia = FOIARequestFactory(jurisdiction=self.state)
         local_foia.files.add(FOIAFileFactory(pages=page_count))
         state_foia.files.add(FOIAFileFactory(pages=page_count))
+        self.refresh_stats()
         eq_(self.local.total_pages(), page_count)
         eq_(self.state.total_pages(), 2*page_count)
 
+    def refresh_stats(self):
+        """Refresh the statistics, as the nightly task would"""
+        self.local.refresh_stats()
+        self.state.refresh_stats()
+
+    # the refresh is queued once the transaction commits, which a TestCase
+    # never does
+    @patch('django.db.transaction.on_commit', lambda func: func())
+    def test_stats_refresh(self):
+        """
+        The statistics read as zeros until they are calculated, and are
+        refreshed when a request changes, including the state's statistics
+        for a change to a local request.
+        """
+        eq_(self.state.get_stats().num_ack, 0)
+        foia = FOIARequestFactory(jurisdiction=self.local, status='ack')
+        state = Jurisdiction.objects.get(pk=self.state.pk)
+        eq_(state.get_stats().num_ack, 1)
+        foia.status = 'done'
+        foia.date_done = date.today()
+        foia.save()
+        state = Jurisdiction.objects.get(pk=self.state.pk)
+        eq_(state.success_rate(), 100.0)
+        eq_(state.get_stats().num_done, 1)
+        eq_(state.get_stats().num_ack, 0)
+
+    def test_get_calendar(self):
+        """Calendars are shared and reloaded when the day rules change"""
+        from muckrock.business_days.models import Calendar, HolidayCalendar
+        state_calendar = self.state.get_calendar()
+        ok_(isinstance(state_calendar, HolidayCalendar))
+        ok_(self.local.get_calendar() is state_calendar)
+        ok_(self.state.get_calendar() is state_calendar)
+        self.state.use_business_days = False
+        self.state.save()
+        ok_(isinstance(self.local.get_calendar(), Calendar))
+
     def test_get_proxy(self):
         """Test getting the proxy user for a state"""
         eq_(self.state.get_proxy(), None)
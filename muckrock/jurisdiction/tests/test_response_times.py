@@ -0,0 +1,63 @@
+"""
+Tests for the response time distributions
+"""
+
+from django.test import TestCase
+
+from datetime import date, datetime
+from nose.tools import eq_
+
+from muckrock.factories import FOIACommunicationFactory, FOIARequestFactory
+from muckrock.jurisdiction import factories, response_times
+from muckrock.jurisdiction.models import Jurisdiction
+
+
+class TestResponseTimes(TestCase):
+    """Response times are calculated for every agency and jurisdiction"""
+
+    def setUp(self):
+        self.state = factories.StateJurisdictionFactory()
+        self.local = factories.LocalJurisdictionFactory(parent=self.state)
+        # two weeks, which is ten business days
+        self.local_foia = FOIARequestFactory(
+                jurisdiction=self.local,
+                status='done',
+                date_submitted=date(2017, 10, 2),
+                date_done=date(2017, 10, 16),
+                )
+        FOIACommunicationFactory(
+                foia=self.local_foia,
+                response=True,
+                date=datetime(2017, 10, 4, 12),
+                )
+        self.state_foia = FOIARequestFactory(
+                jurisdiction=self.state,
+                status='ack',
+                date_submitted=date(2016, 10, 3),
+                )
+
+    def test_calculate(self):
+        """Durations are in business days, and states include their localities"""
+        response_times.calculate()
+
+        local = Jurisdiction.objects.get(pk=self.local.pk).get_response_times()
+        eq_(local.response_count, 1)
+        eq_(local.completion_count, 1)
+        eq_(local.get_response_percentiles()[50], 2)
+        eq_(local.get_completion_percentiles()[90], 10)
+        eq_(local.get_histogram()[2], ('10-19', 0, 1))
+
+        state = Jurisdiction.objects.get(pk=self.state.pk).get_response_times()
+        eq_(state.completion_count, 1)
+        eq_(state.get_yearly(), [(2016, 1, None, None), (2017, 1, 2, 10)])
+
+        agency = self.local_foia.agency.get_response_times()
+        eq_(agency.get_completion_percentiles()[50], 10)
+
+    def test_recalculate(self):
+        """Calculating again replaces the old results"""
+        response_times.calculate()
+        response_times.calculate()
+        eq_(Jurisdiction.objects
+                .filter(response_times__isnull=False)
+                .count(), 2)
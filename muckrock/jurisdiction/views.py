@@ -22,17 +22,7 @@ from muckrock.views import MRFilterListView
 
 def collect_stats(obj, context):
     """Helper for collecting stats"""
-    statuses = ('rejected', 'ack', 'processed', 'fix', 'no_docs', 'done', 'appealing')
-    requests = obj.get_requests()
-    status_counts = (requests
-        .filter(status__in=statuses)
-        .order_by('status')
-        .values_list('status')
-        .annotate(Count('status')))
-    context.update({'num_%s' % s: c for s, c in status_counts})
-    context['num_overdue'] = requests.get_overdue().count()
-    context['num_submitted'] = requests.get_submitted().count()
-
+    context.update(obj.get_stats().status_counts())
 
 def detail(request, fed_slug, state_slug, local_slug):
     """Details for a jurisdiction"""
@@ -41,6 +31,8 @@ def detail(request, fed_slug, state_slug, local_slug):
                 Jurisdiction.objects.select_related(
                     'parent',
                     'parent__parent',
+                    'stats',
+                    'response_times',
                     ),
                 level='l',
                 slug=local_slug,
@@ -49,14 +41,15 @@ def detail(request, fed_slug, state_slug, local_slug):
                 )
     elif state_slug:
         jurisdiction = get_object_or_404(
-                Jurisdiction.objects.select_related('parent'),
+                Jurisdiction.objects.select_related(
+                    'parent', 'stats', 'response_times'),
                 level='s',
                 slug=state_slug,
                 parent__slug=fed_slug,
                 )
     else:
         jurisdiction = get_object_or_404(
-                Jurisdiction,
+                Jurisdiction.objects.select_related('stats', 'response_times'),
                 level='f',
                 slug=fed_slug,
                 )
@@ -25,7 +25,7 @@ class JurisdictionViewSet(ModelViewSet):
     # pylint: disable=too-many-public-methods
     queryset = (Jurisdiction.objects
             .order_by('id')
-            .select_related('parent__parent')
+            .select_related('parent__parent', 'stats')
             )
     serializer_class = JurisdictionSerializer
     # don't allow ordering by computed fields
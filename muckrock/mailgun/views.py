@@ -35,7 +35,6 @@ from muckrock.foia.models import (
         FOIACommunication,
         RawEmail,
         )
-from muckrock.foia.tasks import classify_status
 from muckrock.task.models import (
         OrphanTask,
         ResponseTask,
@@ -258,11 +257,10 @@ def _handle_request(request, mail_id):
             raw_email='%s\n%s' % (post.get('message-headers', ''), post.get('body-plain', '')))
         comm.process_attachments(request.FILES)
 
-        task = ResponseTask.objects.create(communication=comm)
-        classify_status.apply_async(args=(task.pk,), countdown=30 * 60)
-        # resolve any stale agency tasks for this agency
-        if foia.agency:
-            foia.agency.unmark_stale()
+        # the status is predicted by the classify_pending_statuses batch
+        ResponseTask.objects.create(communication=comm)
+        # the agency's stale flag and tasks are cleared by the
+        # muckrock.agency.signals.response_received handler
 
         new_cc_emails = [e for e in (to_emails + cc_emails)
                 if e.domain not in ('requests.muckrock.com', 'muckrock.com')]
@@ -3,22 +3,17 @@ Digest objects for the messages app
 """
 
 from django.contrib.auth.models import User
-from django.db.models import Q
 from django.utils import timezone
 
 from actstream.models import Action
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 
+from muckrock.accounts.counters import get_totals
 from muckrock.accounts.models import Notification, Statistics
-from muckrock.communication.models import (
-        EmailCommunication,
-        FaxCommunication,
-        MailCommunication,
-        )
 from muckrock.crowdfund.models import Crowdfund
 from muckrock.message.email import TemplateEmail
-from muckrock.foia.models import FOIARequest, FOIACommunication
+from muckrock.foia.models import FOIARequest
 from muckrock.qanda.models import Question
 
 def get_salutation():
@@ -253,33 +248,27 @@ class StaffDigest(Digest):
     def get_trailing_cost(self, current, duration, cost_per):
         """Returns the trailing cost for communications over a period"""
         # pylint: disable=no-self-use
-        period = [current - relativedelta(days=duration), current]
-        filters = Q(
-                communication__date__range=period,
-                communication__response=False,
+        trailing = get_totals(
+                'sent_communications',
+                (current - relativedelta(days=duration)).date(),
+                current.date(),
                 )
-        trailing = {
-            'email': EmailCommunication.objects.filter(filters).count(),
-            'fax': FaxCommunication.objects.filter(filters).count(),
-            'mail': MailCommunication.objects.filter(filters).count(),
-        }
         trailing_cost = {
-            'email': trailing['email'] * cost_per['email'],
-            'fax': trailing['fax'] * cost_per['fax'],
-            'mail': trailing['mail'] * cost_per['mail']
+            'email': trailing.get('email', 0) * cost_per['email'],
+            'fax': trailing.get('fax', 0) * cost_per['fax'],
+            'mail': trailing.get('mail', 0) * cost_per['mail']
         }
         return trailing_cost
 
     def get_comms(self, start, end):
         """Returns communication data over a date range"""
-        filters = Q(
-                communication__date__range=[start, end],
-                communication__response=False,
-                )
+        # the communications are counted by day
+        totals = get_totals(
+                'sent_communications', start.date(), end.date())
         delivered_by = {
-            'email': EmailCommunication.objects.filter(filters).count(),
-            'fax': FaxCommunication.objects.filter(filters).count(),
-            'mail': MailCommunication.objects.filter(filters).count(),
+            'email': totals.get('email', 0),
+            'fax': totals.get('fax', 0),
+            'mail': totals.get('mail', 0),
         }
         cost_per = {
             'email': 0.00,
@@ -291,11 +280,10 @@ class StaffDigest(Digest):
             'fax': delivered_by['fax'] * cost_per['fax'],
             'mail': delivered_by['mail'] * cost_per['mail'],
         }
-        received = FOIACommunication.objects.filter(date__range=[start, end], response=True)
-        sent = FOIACommunication.objects.filter(date__range=[start, end], response=False)
+        comms = get_totals('communications', start.date(), end.date())
         return {
-            'sent': sent.count(),
-            'received': received.count(),
+            'sent': comms.get('sent', 0),
+            'received': comms.get('received', 0),
             'delivery': {
                 'format': delivered_by,
                 'cost': cost_per,
@@ -1,6 +1,16 @@
 """Site wide modl utilities"""
 
-from django.db.models import Func, IntegerField, DateTimeField
+from django.db.models import (
+        Case,
+        Count,
+        DateTimeField,
+        F,
+        Func,
+        IntegerField,
+        Q,
+        Value,
+        When,
+        )
 
 # pylint: disable=abstract-method
 
@@ -32,3 +42,33 @@ class Now(Func):
         """
         self.template = 'STATEMENT_TIMESTAMP()'
         return self.as_sql(compiler, connection)
+
+
+def count_if(*args, **kwargs):
+    """Count the rows matching a condition"""
+    return Count(Case(When(Q(*args, **kwargs), then=Value(1))))
+
+
+def count_distinct_if(*args, **kwargs):
+    """
+    Count the rows matching a condition, for queries where a join may
+    repeat a row
+    """
+    return Count(Case(When(Q(*args, **kwargs), then=F('pk'))), distinct=True)
+
+
+def bulk_update_values(queryset, field, values, output_field, **extra):
+    """
+    Set a field to a different value for each row in a single UPDATE, from a
+    dictionary of pks to values.  Only the rows in the dictionary are
+    updated, and any extra fields are set to the same value on all of them.
+    Returns the number of rows updated.
+    """
+    if not values:
+        return 0
+    extra[field] = Case(
+            *[When(pk=pk, then=Value(value)) for pk, value in values.iteritems()],
+            default=F(field),
+            output_field=output_field
+            )
+    return queryset.filter(pk__in=values.keys()).update(**extra)
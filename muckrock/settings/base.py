@@ -5,6 +5,7 @@ Django settings for muckrock project
 from django.core.urlresolvers import reverse
 import djcelery
 import os
+import tempfile
 import urlparse
 
 def boolcheck(setting):
@@ -271,6 +272,8 @@ CELERYD_MAX_TASKS_PER_CHILD = os.environ.get('CELERYD_MAX_TASKS_PER_CHILD', 100)
 CELERYD_TASK_TIME_LIMIT = os.environ.get('CELERYD_TASK_TIME_LIMIT', 5 * 60)
 CELERY_ROUTES = {
         'muckrock.foia.tasks.send_fax': {'queue': 'phaxio'},
+        'muckrock.foia.tasks.followup_request': {'queue': 'followup'},
+        'muckrock.foia.tasks.send_email': {'queue': 'email'},
         }
 
 AUTHENTICATION_BACKENDS = (
@@ -401,6 +404,8 @@ AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', 'muckrock-devel2')
 AWS_AUTOIMPORT_BUCKET_NAME = os.environ.get(
     'AWS_AUTOIMPORT_BUCKET_NAME', 'muckrock-autoimprot-devel')
+# how many files autoimport copies at once
+AUTOIMPORT_WORKERS = int(os.environ.get('AUTOIMPORT_WORKERS', 8))
 
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
 STRIPE_PUB_KEY = os.environ.get('STRIPE_PUB_KEY')
@@ -411,16 +416,54 @@ MAILCHIMP_LIST_DEFAULT = '20aa4a931d'
 
 MAILGUN_ACCESS_KEY = os.environ.get('MAILGUN_ACCESS_KEY')
 MAILGUN_SERVER_NAME = 'requests.muckrock.com'
+# how many emails to send to a single domain per minute
+EMAIL_DOMAIN_RATE_LIMIT = int(os.environ.get('EMAIL_DOMAIN_RATE_LIMIT', 30))
+# how many automated follow ups to send per minute
+FOLLOWUP_RATE_LIMIT = int(os.environ.get('FOLLOWUP_RATE_LIMIT', 60))
 
 EMAIL_SUBJECT_PREFIX = '[Muckrock]'
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
 DOCUMENTCLOUD_USERNAME = os.environ.get('DOCUMENTCLOUD_USERNAME')
 DOCUMENTCLOUD_PASSWORD = os.environ.get('DOCUMENTCLOUD_PASSWORD')
+DOCUMENTCLOUD_ACCOUNT = os.environ.get('DOCUMENTCLOUD_ACCOUNT', 'muckrock')
+DOCUMENTCLOUD_API_URL = os.environ.get(
+    'DOCUMENTCLOUD_API_URL', 'https://www.documentcloud.org/api')
+# how many requests to make to document cloud at once
+DOCUMENTCLOUD_CONCURRENCY = int(
+    os.environ.get('DOCUMENTCLOUD_CONCURRENCY', 8))
+
+# a local cache of stored files which are read often, such as attachments
+FILE_CACHE_DIR = os.environ.get(
+    'FILE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'muckrock-files'))
+FILE_CACHE_SIZE = int(os.environ.get('FILE_CACHE_SIZE', 1024 * 1024 * 1024))
+
+# how many groups of the daily statistics to calculate at once
+STATISTICS_CONCURRENCY = int(os.environ.get('STATISTICS_CONCURRENCY', 4))
+# how many days of live counters to recount each night - enough to cover
+# the staff digest's trailing costs
+COUNTER_RECONCILE_DAYS = int(os.environ.get('COUNTER_RECONCILE_DAYS', 31))
+
+# local page counting and text extraction for uploaded files
+EXTRACTION_PROCESSES = int(os.environ.get('EXTRACTION_PROCESSES', 2))
+# seconds to wait on a single file
+EXTRACTION_TIMEOUT = int(os.environ.get('EXTRACTION_TIMEOUT', 60))
+# bytes of memory each extraction process may use
+EXTRACTION_MEMORY_LIMIT = int(
+    os.environ.get('EXTRACTION_MEMORY_LIMIT', 512 * 1024 * 1024))
+
+# the status classifier is reloaded when the file or the version changes
+CLASSIFIER_PATH = os.environ.get(
+    'CLASSIFIER_PATH', os.path.join(SITE_ROOT, 'foia', 'classifier.pkl'))
+CLASSIFIER_VERSION = os.environ.get('CLASSIFIER_VERSION', '')
 
 PHAXIO_KEY = os.environ.get('PHAXIO_KEY')
 PHAXIO_SECRET = os.environ.get('PHAXIO_SECRET')
 PHAXIO_BATCH_DELAY = os.environ.get('PHAXIO_BATCH_DELAY', 300)
+# how many faxes all of the workers may send per minute
+PHAXIO_RATE_LIMIT = int(os.environ.get('PHAXIO_RATE_LIMIT', 15))
+# how long to wait to collect faxes to the same number into one batch
+FAX_BATCH_WINDOW = int(os.environ.get('FAX_BATCH_WINDOW', 60))
 PHAXIO_CALLBACK_TOKEN = os.environ.get('PHAXIO_CALLBACK_TOKEN')
 
 SLACK_WEBHOOK_URL = os.environ.get('SLACK_WEBHOOK_URL', '')
@@ -37,6 +37,9 @@ CELERY_EAGER_PROPAGATES_EXCEPTIONS = True
 
 DEFAULT_FILE_STORAGE = 'inmemorystorage.InMemoryStorage'
 
+# other connections can not see the data in a test's transaction
+STATISTICS_CONCURRENCY = 1
+
 LOGGING = {}
 
 TEMPLATES[0]['OPTIONS']['debug'] = True
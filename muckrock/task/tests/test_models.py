@@ -13,7 +13,8 @@ import nose
 
 from muckrock import factories, task
 from muckrock.communication.models import EmailAddress
-from muckrock.foia.models import FOIARequest, FOIANote
+from muckrock.foia.models import FOIACommunication, FOIARequest, FOIANote
+from muckrock.foia.tasks import submit_multi_request
 from muckrock.task.factories import FlaggedTaskFactory, ProjectReviewTaskFactory
 from muckrock.task.signals import domain_blacklist
 
@@ -510,6 +511,21 @@ class MultiRequestTaskTests(TestCase):
         self.multi.refresh_from_db()
         eq_(self.multi.status, 'filed')
         eq_(FOIARequest.objects.filter(multirequest=self.multi).count(), 4)
+        eq_(self.multi.num_agencies, 4)
+        eq_(self.multi.num_submitted, 4)
+
+    def test_resubmit(self):
+        """Submitting again should not create duplicate requests"""
+        agency_list = [str(a.pk) for a in self.agencies]
+        self.task.submit(agency_list)
+        submit_multi_request(self.multi.pk)
+        eq_(FOIARequest.objects.filter(multirequest=self.multi).count(), 6)
+        eq_(
+                FOIACommunication.objects
+                .filter(foia__multirequest=self.multi)
+                .count(),
+                6,
+                )
 
     def test_reject(self):
         """Test rejecting the request"""
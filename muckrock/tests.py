@@ -6,6 +6,7 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
 
 from actstream.models import Action
 from mock import Mock, patch
@@ -18,7 +19,7 @@ from muckrock.accounts.models import Notification
 from muckrock.factories import UserFactory, AnswerFactory
 from muckrock.fields import EmailsListField
 from muckrock.forms import NewsletterSignupForm, StripeForm
-from muckrock.utils import new_action, notify
+from muckrock.utils import new_action, notify, take_token
 from muckrock.test_utils import http_get_response, http_post_response
 from muckrock.views import NewsletterSignupView, DonationFormView
 
@@ -138,6 +139,20 @@ class TestUnit(TestCase):
         field.clean('a@example.com,an.email@foo.net', model_instance)
 
 
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TestTakeToken(TestCase):
+    """The shared rate limiter"""
+
+    @patch('muckrock.utils.time.time', Mock(return_value=1000.0))
+    def test_take_token(self):
+        """Tokens run out until the next period"""
+        eq_(take_token('test', 2), 0)
+        eq_(take_token('test', 2), 0)
+        eq_(take_token('test', 2), 21)
+        eq_(take_token('other', 2), 0)
+
+
 class TestNewsletterSignupView(TestCase):
     """By submitting an email, users can subscribe to our MailChimp newsletter list."""
     def setUp(self):
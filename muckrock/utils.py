@@ -9,6 +9,7 @@ import random
 import string
 import stripe
 import sys
+import time
 import uuid
 
 from django.conf import settings
@@ -124,6 +125,34 @@ def cache_get_or_set(key, update, timeout):
     return value
 
 
+def take_token(key, limit, period=60):
+    """
+    Take one of the `limit` tokens allowed every `period` seconds for the
+    key, from a limiter shared by all processes through the cache.  Returns
+    0 if a token was taken, otherwise how many seconds until there are more.
+    """
+    now = time.time()
+    window = int(now // period)
+    cache_key = 'rate_limit:%s:%d' % (key, window)
+    cache.add(cache_key, 0, period * 2)
+    try:
+        count = cache.incr(cache_key)
+    except ValueError:
+        # the cache could not count for us, so do not limit
+        return 0
+    if count <= limit:
+        return 0
+    return int((window + 1) * period - now) + 1
+
+
+def get_staff_user():
+    """Get the staff user which automated communications are sent from"""
+    return cache_get_or_set(
+            'muckrock:staff_user',
+            lambda: User.objects.get(username='MuckrockStaff'),
+            60 * 60)
+
+
 def get_image_storage():
     """Return the storage class to use for images we want optimized"""
     if settings.USE_QUEUED_STORAGE: